@@ -1,17 +1,86 @@
 from .x86_64 import interpret_pte as interpret_pte_x86
 from .arm64 import interpret_pte as interpret_pte_arm64
+from . import x86_64, arm64
+from .pte_utils import LevelDecoder, mmu_params
+from .ptdump import PageTableDump, print_dump_stats
+from .vatrace import trace_file, print_trace_stats
+from .tlbsim import simulate, simulate_all, print_tlb_stats, print_tlb_comparison
+from .ptbuild import TableBuilder, parse_spec, write_image, print_build_stats
+from .walker import PhysImage, Walker, print_translation, print_batch, print_mappings
 
 from .va_unpacker import unpack_ptep, unpack_vaddr
 
-from config import BinConfig, BinArch
-from utils import BinCalcException
+from config import BinConfig, BinArch, arch_preset
+from utils import BinCalcException, get_rawrep, is_array
 from function_base import BincalcFunctions
 from cmdbase import cmd
+from state import global_state
+from vector import IntOrArray
+
+# MmuParams -> LevelDecoder
+_level_decoders = {}
+
+
+def pte_decoder(level, config=None):
+    """
+        Decoder of the ptes at `level` for the translation scheme of
+        `config` (the current one by default), shared by all callers with
+        the same arch, granule, PA bits and level
+    """
+
+    if config is None:
+        config = global_state().config
+
+    if not 0 <= level < 4:
+        raise BinCalcException(f"invalid pte level: {level}, expect 0~3")
+
+    p = mmu_params(config, level)
+    dec = _level_decoders.get(p)
+    if dec is not None:
+        return dec
+
+    if p.arch == BinArch.X86_64:
+        dec = LevelDecoder(p, x86_64.classify, x86_64.classify_many,
+                           x86_64.check_many)
+    elif p.arch == BinArch.Arm64:
+        dec = LevelDecoder(p, arm64.classify, arm64.classify_many,
+                           arm64.check_many)
+    else:
+        raise BinCalcException(f"not supported for '{p.arch}'")
+
+    _level_decoders[p] = dec
+    return dec
+
+
+def decode_pte(val, level):
+    """
+        PteRecord of pte `val` at `level`, None if the entry is invalid
+    """
+
+    return pte_decoder(level).decode(get_rawrep(val))
 
 
 class PteFunctions(BincalcFunctions):
     def __init__(self):
         super().__init__()
+        self.__image = None
+        self.__walker = None
+        self.__walker_key = None
+
+    def __current_walker(self):
+        if self.__image is None:
+            raise BinCalcException("no page table image, load one with ptimg")
+
+        # the image endianness and the walk depend on the translation scheme
+        c = self.gs.config
+        key = (mmu_params(c, 0), BinConfig.MmuVABits[c], BinConfig.Endian[c])
+        if key != self.__walker_key:
+            path, base, root, root1 = self.__image
+            self.__walker = Walker(PhysImage(path, base, c), root, c,
+                                   lambda l: pte_decoder(l, c), root1)
+            self.__walker_key = key
+
+        return self.__walker
 
     @cmd("pte")
     def interpret_pte(self, pte: int, level: int):
@@ -40,3 +109,162 @@ class PteFunctions(BincalcFunctions):
             Unfold the structural information encoded in ptep (recursive page table scheme only)
         """
         return unpack_ptep(vaddr)
+
+    @cmd("ptdump")
+    def dump_page_tables(self, path: str, level: IntOrArray):
+        """
+            Decode a binary dump of page table pages (ptes in the configured
+            endianness) and report per level the count of each entry type,
+            histograms of the attribute fields and invalid encodings. LEVEL
+            is the level of all pages, or an array of the level of each page
+        """
+        dump = PageTableDump(path, self.gs.config)
+        print_dump_stats(dump, dump.scan(level, pte_decoder))
+
+    @cmd("va_trace")
+    def analyse_va_trace(self, path: str):
+        """
+            Break down every VA of the trace at PATH (a .npy, a .bin of 64
+            bit values or a text file of numbers) as the walks of the
+            current scheme do, and report the distinct tables and entries
+            each level would use, their fan-out, and the pages and leaf
+            tables needed per granule. The trace is streamed, it need not
+            fit in memory
+        """
+        print_trace_stats(path, trace_file(path, self.gs.config))
+
+    @cmd("tlbsim")
+    def simulate_tlb(self, path: str):
+        """
+            Replay the VA trace at PATH (as va_trace reads it) through the
+            TLBs and page walk caches sized by the tlb:* settings, for the
+            current translation scheme, and report their hit rates, the
+            memory accesses of the walks and the reach of the TLBs
+        """
+        print_tlb_stats(simulate(path, self.gs.config))
+
+    @cmd("tlbsim_all")
+    def simulate_tlb_presets(self, path: str, jobs: int = None):
+        """
+            Run tlbsim on the trace at PATH for every arch preset, in up to
+            JOBS worker processes (one per cpu by default), and compare them
+        """
+        presets = []
+        for name, preset in arch_preset().items():
+            if name == "mmu":
+                continue
+
+            # the base presets leave the translation scheme unset
+            config = preset()
+            if BinConfig.MmuVABits[config] is not None:
+                presets.append((name, { **self.gs.config, **config }))
+
+        print_tlb_comparison(simulate_all(path, presets, jobs))
+
+    @cmd("ptbuild")
+    def build_page_tables(self, spec: str, out: str, base: int = 0):
+        """
+            Build the page tables of the mappings listed in SPEC, one
+            'VA SIZE PA [ATTR ...]' per line (ATTR being raw pte bits or
+            FIELD=VALUE, e.g. AF=1), for the current translation scheme.
+            The tables are written to OUT as an image loaded at physical
+            BASE; gives the root table address, e.g. for ptimg
+        """
+        builder = TableBuilder(self.gs.config)
+        for mapping in parse_spec(spec):
+            builder.add(mapping)
+
+        img, root, stats = builder.build(base)
+        path = write_image(img, out, self.gs.config)
+
+        print_build_stats(path, img, root, stats, builder)
+        return root
+
+    @cmd("ptimg")
+    def load_page_table_image(self, path: str, root: int, base: int = 0,
+                              root1: int = None):
+        """
+            Use the file at PATH, holding the physical memory from BASE on,
+            as the page table image of xlate and ptmap. ROOT is the physical
+            address of the top level table (TTBR0/CR3), ROOT1 that of the
+            upper half of the VA space on arm64 (TTBR1)
+        """
+        self.__image = (path, base, root, root1)
+        self.__walker_key = None
+
+        walker = self.__current_walker()
+        image = walker.image
+
+        print(f"image {image.path}: PA {image.base:#x}-{image.end - 1:#x}")
+        print(f"root table {root:#x}, levels {walker.levels[0]}~{walker.levels[-1]}")
+        if walker.split and root1 is not None:
+            print(f"upper half root table {root1:#x}")
+
+    @cmd("xlate")
+    def translate(self, va: IntOrArray):
+        """
+            Translate VA (a number or an array) through the page table image
+            to a physical address. A single VA prints its walk and the leaf
+            attributes; an array gives the array of PAs, 0xffffffffffffffff
+            where the translation faults
+        """
+        walker = self.__current_walker()
+
+        if is_array(va):
+            tr = walker.translate_many(va)
+            print_batch(tr, walker)
+            return tr.pa
+
+        tr = walker.translate(va)
+        print_translation(tr)
+        if tr.fault:
+            raise BinCalcException(f"translation fault: {tr.fault}")
+        return tr.pa
+
+    @cmd("xlate_pte")
+    def translate_pte(self, va: IntOrArray):
+        """
+            Leaf pte (native) mapping VA, a number or an array, through the
+            page table image; 0 where the translation faults
+        """
+        walker = self.__current_walker()
+
+        if is_array(va):
+            return walker.translate_many(va).pte
+
+        tr = walker.translate(va)
+        if tr.fault:
+            raise BinCalcException(f"translation fault: {tr.fault}")
+        return tr.leaf.raw
+
+    @cmd("ptmap")
+    def dump_mappings(self):
+        """
+            List the mappings of the whole address space of the page table
+            image, coalescing the adjacent VA ranges mapped to contiguous PAs
+            with the same attributes
+        """
+        print_mappings(self.__current_walker())
+
+    @cmd("walk_cache")
+    def _walk_cache(self, action: str = None):
+        """
+            Show the hit/miss statistics of the walk cache of xlate, or drop
+            all cached tables if ACTION is 'clear'
+        """
+        walker = self.__current_walker()
+
+        if action == "clear":
+            walker.clear_cache()
+            return
+
+        if action is not None:
+            raise NameError(f"unknown action '{action}'")
+
+        total = walker.hits + walker.misses
+
+        print(f"{'cached tables':<20}{walker.cache_size()}")
+        print(f"{'hits':<20}{walker.hits}")
+        print(f"{'misses':<20}{walker.misses}")
+        if total:
+            print(f"{'hit ratio':<20}{walker.hits / total:.1%}")
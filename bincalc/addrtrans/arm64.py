@@ -24,18 +24,27 @@ class Granule:
 
 
 class Arm64PteFormatBase(PteFormatBase):
-    def __init__(self, val, pte_type, level=3):
-        super().__init__(val, pte_type, level)
+    def __init__(self, val, level=3):
+        super().__init__(val, level)
 
     def init(self):
         self._gran = BinConfig.MmuPgGran[self._config]
         self._oabits = BinConfig.MmuPABits[self._config]
 
-    def get_fields(self):
+    @classmethod
+    def type_name(cls):
+        return PteType.getstr(cls.pte_type)
+
+    @classmethod
+    def get_fields(cls, p):
         return [
             ("Type", 1, 0)
         ]
 
+    @classmethod
+    def get_oa_fields(cls, p):
+        return ["OA", "OA1", "OA2"]
+
     def _get_basic_info(self):
         infos = super()._get_basic_info()
         infos += [
@@ -60,27 +69,20 @@ class Arm64PteFormatBase(PteFormatBase):
         print()
         print("ADDTIONAL")
 
-        extracted = self.get_field_values()
-        oa1, oa2 = None, None
-        for e in extracted:
-            if e.name == "OA1" or e.name == "OA":
-                oa1 = e
-            elif e.name == "OA2":
-                oa2 = e
-
-        oa = oa1.value << oa1.l
-        if oa2:
-            oa |= oa2.value << (oa1.h + 1)
-
-        print("    Encoded Output Address (OA2 + OA1):", hex(oa))
+        print("    Encoded Output Address (OA2 + OA1):", hex(self.record.oa))
         print()
 
 
 class TableDescriptor(Arm64PteFormatBase):
+    pte_type = PteType.Table
+    table = True
+    type_bits = 0b11
+
     def __init__(self, val, level):
-        super().__init__(val, PteType.Table, level)
+        super().__init__(val, level)
 
-    def get_fields(self):
+    @classmethod
+    def get_fields(cls, p):
         fields = [
             ("NSTable", 63, 63),
             ("APTable", 62, 61),
@@ -88,18 +90,25 @@ class TableDescriptor(Arm64PteFormatBase):
             ("PXN", 59, 59)
         ]
 
-        fields.append(("OA", 48, self._gran))
-
-        if self._oabits == 52:
-            if self._gran == Granule.G64K:
+        if p.pabits == 52:
+            if p.gran == Granule.G64K:
+                fields.append(("OA", 47, p.gran))
                 fields.append(("TA", 15, 12))
             else:
+                fields.append(("OA", 49, p.gran))
                 fields.append(("TA", 9, 8))
+        else:
+            fields.append(("OA", 47, p.gran))
 
-        fields += super().get_fields()
+        fields += super().get_fields(p)
 
         return fields
 
+    @classmethod
+    def get_oa_fields(cls, p):
+        # TA holds the address bits above OA
+        return ["OA", "TA"]
+
 low_attributes = [
     ("NSE/nG", 11, 11),
     ("AF", 10, 10),
@@ -119,81 +128,164 @@ high_attributes = [
 ]
 
 class BlockDescriptor(Arm64PteFormatBase):
+    pte_type = PteType.Block
+    type_bits = 0b01
+
     def __init__(self, val, level):
-        super().__init__(val, PteType.Block, level)
+        super().__init__(val, level)
 
-    def get_fields(self):
+    @classmethod
+    def get_fields(cls, p):
         fields = [
             *high_attributes,
             *low_attributes,
             ("nT", 16, 16),
         ]
 
-        n = 9 * (3 - self._level) + self._gran
+        # every level resolves (granule - 3) bits of the address
+        n = (p.gran - 3) * (3 - p.level) + p.gran
 
-        if self._oabits == 48:
+        if p.pabits == 48:
             fields.append(("OA", 47, n))
 
-        if self._oabits == 52:
-            if self._gran == Granule.G64K:
+        if p.pabits == 52:
+            if p.gran == Granule.G64K:
                 fields.append(("OA1", 47, n))
                 fields.append(("OA2", 15, 12))
             else:
                 fields.append(("OA1", 49, n))
                 fields.append(("OA2", 9, 8))
 
-                for i in range(fields):
-                    n = fields[i][0]
-                    if n == "SH":
-                        fields.pop(i)
+                # bits 9:8 hold OA[51:50] instead of the shareability
+                fields = [x for x in fields if x[0] != "SH"]
 
-        fields += super().get_fields()
+        fields += super().get_fields(p)
 
         return fields
 
 
 class PageDescriptor(Arm64PteFormatBase):
+    pte_type = PteType.Page
+    type_bits = 0b11
+
     def __init__(self, val):
-        super().__init__(val, PteType.Page, 3)
+        super().__init__(val, 3)
 
-    def get_fields(self):
+    @classmethod
+    def get_fields(cls, p):
         fields = [
             *high_attributes,
             *low_attributes
         ]
 
-        if self._oabits == 48:
-            fields.append(("OA", 47, self._gran))
+        if p.pabits == 48:
+            fields.append(("OA", 47, p.gran))
 
-        if self._oabits == 52:
-            if self._gran == Granule.G64K:
-                fields.append(("OA1", 47, self._gran))
+        if p.pabits == 52:
+            if p.gran == Granule.G64K:
+                fields.append(("OA1", 47, p.gran))
                 fields.append(("OA2", 15, 12))
             else:
-                fields.append(("OA1", 49, self._gran))
+                fields.append(("OA1", 49, p.gran))
                 fields.append(("OA2", 9, 8))
 
-                for i in range(fields):
-                    n = fields[i][0]
-                    if n == "SH":
-                        fields.pop(i)
+                # bits 9:8 hold OA[51:50] instead of the shareability
+                fields = [x for x in fields if x[0] != "SH"]
 
-        fields += super().get_fields()
+        fields += super().get_fields(p)
 
         return fields
 
+def classify(raw, level):
+    """
+        Format of the native pte value `raw` at `level`, None if invalid
+    """
+
+    pte_type = raw & 0b11
+
+    if pte_type == 0b11 and level == 3:
+        return PageDescriptor
+
+    if pte_type == 0b01 and level < 3:
+        return BlockDescriptor
+
+    if pte_type == 0b11:
+        return TableDescriptor
+
+    return None
+
+
+def classify_many(raw, level):
+    """
+        Boolean masks of the entries of each format in the array of native
+        pte values `raw`, the vectorized `classify`
+    """
+
+    pte_type = raw & 0b11
+
+    if level == 3:
+        return { PageDescriptor: pte_type == 0b11 }
+
+    return {
+        BlockDescriptor: pte_type == 0b01,
+        TableDescriptor: pte_type == 0b11
+    }
+
+
+def _block_levels(p):
+    if p.gran == Granule.G4K:
+        # 512G blocks come with the 52 bits OA of LPA2
+        return (0, 1, 2) if p.pabits == 52 else (1, 2)
+    if p.pabits == 52:
+        return (1, 2)
+    return (2, )
+
+
+def leaf_format(level, p):
+    """
+        Format mapping memory at `level`, None if the level has no leaves
+    """
+
+    if level == 3:
+        return PageDescriptor
+    if level in _block_levels(p):
+        return BlockDescriptor
+    return None
+
+
+def table_format(level, p):
+    return TableDescriptor
+
+
+def check_many(raw, level, p):
+    """
+        (finding, mask) of every invalid encoding among the native pte
+        values `raw`
+    """
+
+    pte_type = raw & 0b11
+
+    if level == 3:
+        return [("reserved descriptor type 0b01 at level 3", pte_type == 0b01)]
+
+    if level not in _block_levels(p):
+        gran = f"{1 << (p.gran - 10)}K"
+        return [(f"block descriptor at level {level} with {gran} granule",
+                 pte_type == 0b01)]
+
+    return []
+
+
 def get_format(val, level):
-    pte_type = get_rawrep(val) & 0b11
+    fmt = classify(get_rawrep(val), level)
 
-    if pte_type == 0b01 and level == 3:
+    if fmt is PageDescriptor:
         return PageDescriptor(val)
-    
-    if pte_type == 0b01:
-        return BlockDescriptor(val, level)
-    
-    if pte_type == 0b11 and level < 3:
-        return TableDescriptor(val, level)
 
+    if fmt is not None:
+        return fmt(val, level)
+
+    pte_type = get_rawrep(val) & 0b11
     raise BinCalcException(f"invalid pte with type: {bin(pte_type)} with level: {level}")
 
 
@@ -0,0 +1,292 @@
+from pathlib import Path
+from collections import namedtuple
+
+from config import BinConfig, BinArch, BinEndian
+from utils import BinCalcException
+from vector import numpy, unique
+
+from shared.context import Context
+
+from . import arm64, x86_64
+from .pte_utils import mmu_params
+from .walker import ptw_geometry, size_str
+
+# a line of a mapping specification, attrs being (raw bits, {field: value})
+Mapping = namedtuple("Mapping", ["va", "size", "pa", "attrs", "line"])
+
+# leaves of consecutive VAs and PAs made by add
+_Piece = namedtuple("_Piece", ["va", "pa", "count", "attrs"])
+
+_size_suffixes = { "K": 10, "M": 20, "G": 30, "T": 40 }
+
+
+def _number(tok):
+    shift = _size_suffixes.get(tok[-1:].upper(), 0)
+    if shift:
+        tok = tok[:-1]
+    return int(tok, 0) << shift
+
+
+def parse_spec(path):
+    """
+        Mappings of a specification file, one per line:
+
+            VA SIZE PA [ATTR ...]
+
+        numbers in any python notation, SIZE may end with K, M, G or T.
+        An ATTR is either raw pte bits or NAME=VALUE setting a field of
+        the leaf formats, as the pte command names them. Anything after a
+        # is a comment.
+    """
+
+    path = Context.WorkingFiles[Path(path)]
+    try:
+        text = path.read_text()
+    except OSError as e:
+        raise BinCalcException(f"unable to open '{path}': {e}")
+
+    mappings = []
+    for lineno, line in enumerate(text.splitlines(), 1):
+        tokens = line.split("#", 1)[0].split()
+        if not tokens:
+            continue
+
+        if len(tokens) < 3:
+            raise BinCalcException(f"{path}:{lineno}: expect VA SIZE PA [ATTR ...]")
+
+        try:
+            va, size, pa = (_number(x) for x in tokens[:3])
+
+            raw = 0
+            fields = {}
+            for tok in tokens[3:]:
+                name, eq, val = tok.partition("=")
+                if eq:
+                    fields[name] = _number(val)
+                else:
+                    raw |= _number(tok)
+        except ValueError as e:
+            raise BinCalcException(f"{path}:{lineno}: {e}")
+
+        mappings.append(Mapping(va, size, pa, (raw, fields), f"{path}:{lineno}"))
+
+    return mappings
+
+
+def _arch_module(arch):
+    if arch == BinArch.X86_64:
+        return x86_64
+    if arch == BinArch.Arm64:
+        return arm64
+    raise BinCalcException(f"not supported for '{arch}'")
+
+
+class TableBuilder:
+    """
+        Page tables for the translation scheme of `config` mapping the
+        added ranges. Every range is made of the largest leaves the
+        alignment of its VA, PA and end allows; the table pages are laid
+        out level by level from the root, in VA order.
+    """
+
+    def __init__(self, config):
+        self.gran, self.stride, self.levels = ptw_geometry(config)
+        self.vabits = BinConfig.MmuVABits[config]
+        self.pabits = BinConfig.MmuPABits[config]
+
+        arch = _arch_module(BinConfig.Arch[config])
+
+        # 5 level schemes reuse the level 0 formats at level -1
+        def decoder(fmt, level):
+            return fmt.decoder(mmu_params(config, max(level, 0)))
+
+        self.tables = {}
+        self.leaves = {}
+        for l in self.levels:
+            p = mmu_params(config, max(l, 0))
+            self.tables[l] = decoder(arch.table_format(l, p), l)
+
+            fmt = arch.leaf_format(l, p)
+            if fmt is not None:
+                self.leaves[l] = decoder(fmt, l)
+
+        self.__pieces = { l: [] for l in self.leaves }
+        self.__attrs = {}
+
+    def shift(self, level):
+        return self.gran + (3 - level) * self.stride
+
+    def __bits(self, level, attrs, where):
+        key = (level, attrs[0], tuple(attrs[1].items()))
+        bits = self.__attrs.get(key)
+        if bits is not None:
+            return bits
+
+        dec = self.leaves[level]
+        raw, fields = attrs
+        if raw & (dec.oa_raw_mask | dec.format.type_bits):
+            raise BinCalcException(
+                f"{where}: attribute bits {raw:#x} overlap the " +
+                f"{dec.type_name} output address or type")
+
+        try:
+            bits = raw | dec.encode_fields(fields)
+        except BinCalcException as e:
+            raise BinCalcException(f"{where}: {e}")
+
+        self.__attrs[key] = bits
+        return bits
+
+    def add(self, m):
+        page = 1 << self.gran
+        va = m.va & ((1 << self.vabits) - 1)
+        end = va + m.size
+
+        if (va | m.size | m.pa) & (page - 1):
+            raise BinCalcException(f"{m.line}: VA, SIZE and PA must be {page} bytes aligned")
+        if m.size <= 0 or end > 1 << self.vabits:
+            raise BinCalcException(f"{m.line}: range outside of the {self.vabits} bits VA space")
+        if m.pa + m.size > 1 << self.pabits:
+            raise BinCalcException(f"{m.line}: PA outside of the {self.pabits} bits PA space")
+
+        delta = m.pa - va
+        todo = [(va, end)]
+
+        # from the largest leaves to the pages
+        for level in sorted(self.leaves):
+            size = 1 << self.shift(level)
+            if delta & (size - 1):
+                continue
+
+            left = []
+            for start, stop in todo:
+                lo = -(-start // size) * size
+                hi = stop // size * size
+                if lo >= hi:
+                    left.append((start, stop))
+                    continue
+
+                bits = self.__bits(level, m.attrs, m.line)
+                self.__pieces[level].append(_Piece(lo, lo + delta, (hi - lo) // size, bits))
+
+                if start < lo:
+                    left.append((start, lo))
+                if hi < stop:
+                    left.append((hi, stop))
+            todo = left
+
+    def __expand(self, np, level):
+        # VAs and ptes of the leaves at `level`
+        pieces = self.__pieces[level]
+        size = np.uint64(1 << self.shift(level))
+
+        counts = np.array([x.count for x in pieces], dtype=np.int64)
+        which = np.repeat(np.arange(len(pieces)), counts)
+        within = (np.arange(int(counts.sum())) -
+                  np.repeat(np.cumsum(counts) - counts, counts)).astype(np.uint64)
+
+        va = np.array([x.va for x in pieces], dtype=np.uint64)[which] + within * size
+        pa = np.array([x.pa for x in pieces], dtype=np.uint64)[which] + within * size
+        bits = np.array([x.attrs for x in pieces], dtype=np.uint64)[which]
+
+        return va, self.leaves[level].encode_many(pa, 0) | bits
+
+    def build(self, base):
+        """
+            (native entries of the image, root table address, [(level,
+            tables, leaves)]) with the image loaded at physical `base`
+        """
+
+        np = numpy()
+
+        entries = 1 << self.stride
+        page = entries * 8
+        if base & (page - 1):
+            raise BinCalcException(f"image base {base:#x} not {page} bytes aligned")
+
+        leaves = {}
+        for level, pieces in self.__pieces.items():
+            if pieces:
+                leaves[level] = self.__expand(np, level)
+
+        # the tables of each level, from the last one up: those holding a
+        # leaf or pointing to a table of the level below
+        empty = np.empty(0, dtype=np.uint64)
+        tables = {}
+        child_va = empty
+        for level in reversed(self.levels):
+            va = np.concatenate((leaves.get(level, (empty, ))[0], child_va))
+            slots = va >> np.uint64(self.shift(level))
+
+            if len(unique(slots)) != len(slots):
+                slots = np.sort(slots)
+                dup = int(slots[np.flatnonzero(slots[1:] == slots[:-1])[0]])
+                raise BinCalcException(
+                    f"mappings overlap at VA {dup << self.shift(level):#x}")
+
+            tables[level] = unique(slots >> np.uint64(self.stride))
+            child_va = tables[level] << np.uint64(self.shift(level) + self.stride)
+
+        # the root is always there, even with nothing mapped
+        top = self.levels[0]
+        if not len(tables[top]):
+            tables[top] = np.zeros(1, dtype=np.uint64)
+
+        first = {}
+        n = 0
+        for level in self.levels:
+            first[level] = n
+            n += len(tables[level])
+
+        if base + n * page > 1 << self.pabits:
+            raise BinCalcException(f"tables beyond the {self.pabits} bits PA space")
+
+        img = np.zeros(n * entries, dtype=np.uint64)
+
+        def put(level, va, raw):
+            slot = va >> np.uint64(self.shift(level))
+            table = first[level] + np.searchsorted(tables[level], slot >> np.uint64(self.stride))
+            img[table * entries + (slot & np.uint64(entries - 1)).astype(np.int64)] = raw
+
+        stats = []
+        for i, level in enumerate(self.levels):
+            va, raw = leaves.get(level, (empty, empty))
+            put(level, va, raw)
+
+            if i + 1 < len(self.levels):
+                below = self.levels[i + 1]
+                pa = (np.uint64(base) + np.uint64(page) *
+                      np.arange(first[below], first[below] + len(tables[below]),
+                                dtype=np.uint64))
+                child_va = tables[below] << np.uint64(self.shift(below) + self.stride)
+                put(level, child_va, self.tables[level].encode_many(pa, 0))
+
+            stats.append((level, len(tables[level]), len(va)))
+
+        return img, base + first[top] * page, stats
+
+
+def write_image(img, path, config):
+    np = numpy()
+
+    path = Context.WorkingFiles[Path(path)]
+    ed = "<" if BinConfig.Endian[config] == BinEndian.Little else ">"
+
+    try:
+        img.astype(np.dtype(f"{ed}u8")).tofile(path)
+    except OSError as e:
+        raise BinCalcException(f"unable to write '{path}': {e}")
+
+    return path
+
+
+def print_build_stats(path, img, root, stats, builder):
+    print(f"IMAGE {path}")
+    print(f"    {'size':<24}{len(img) * 8}")
+    print(f"    {'root':<24}{root:#x}")
+
+    print()
+    print(f"    {'':<8}{'tables':>10}{'leaves':>12}{'leaf size':>12}")
+    for level, tables, leaves in stats:
+        size = size_str(1 << builder.shift(level)) if level in builder.leaves else "-"
+        print(f"    {'L' + str(level):<8}{tables:>10}{leaves:>12}{size:>12}")
@@ -0,0 +1,228 @@
+from pathlib import Path
+from collections import Counter
+
+from config import BinConfig, BinEndian
+from utils import BinCalcException, is_array
+from vector import numpy
+
+from shared.context import Context
+
+# entries decoded at a time, bounds the memory used whatever the dump size
+CHUNK_ENTRIES = 1 << 20
+
+# fields up to this wide get a histogram of their values
+HISTOGRAM_MAX_BITS = 4
+
+# offsets kept as examples of each finding
+FINDING_EXAMPLES = 4
+
+
+class LevelStats:
+    def __init__(self, level):
+        self.level = level
+        self.pages = 0
+        self.entries = 0
+        self.empty = 0
+        self.invalid = 0
+
+        # type name -> count
+        self.formats = Counter()
+
+        # (type name, field) -> counts indexed by field value
+        self.histograms = {}
+
+        # finding -> [count, example offsets]
+        self.findings = {}
+
+    def add_histogram(self, key, counts):
+        hist = self.histograms.get(key)
+        if hist is None:
+            self.histograms[key] = counts
+        else:
+            hist += counts
+
+    def add_finding(self, finding, count, offsets):
+        entry = self.findings.setdefault(finding, [0, []])
+        entry[0] += count
+        entry[1] += offsets[:FINDING_EXAMPLES - len(entry[1])]
+
+
+class PageTableDump:
+    """
+        A binary dump of page table pages, each page being an array of 64
+        bit ptes stored in the configured endianness. The dump is memory
+        mapped and decoded a window of CHUNK_ENTRIES entries at a time.
+    """
+
+    def __init__(self, path, config):
+        np = numpy()
+
+        self.path = Context.WorkingFiles[Path(path)]
+
+        self.page_size = 1 << BinConfig.MmuPgGran[config]
+        self.page_entries = self.page_size // 8
+
+        try:
+            size = self.path.stat().st_size
+        except OSError as e:
+            raise BinCalcException(f"unable to open '{path}': {e}")
+
+        self.pages = size // self.page_size
+        self.trailing = size % self.page_size
+
+        ed = "<" if BinConfig.Endian[config] == BinEndian.Little else ">"
+        self.__dtype = np.dtype(f"{ed}u8")
+
+    def __page_levels(self, levels):
+        np = numpy()
+
+        if not is_array(levels):
+            return None
+
+        levels = np.asarray(levels).astype(np.int64)
+        if len(levels) != self.pages:
+            raise BinCalcException(
+                f"{len(levels)} levels given for {self.pages} pages")
+        return levels
+
+    def chunks(self, levels):
+        """
+            Yields (level, native ptes, file offset of each page) for every
+            chunk of pages at the same level. `levels` is the level of all
+            pages, or an array with the level of each page.
+        """
+
+        np = numpy()
+
+        page_levels = self.__page_levels(levels)
+        per_chunk = max(CHUNK_ENTRIES // self.page_entries, 1)
+
+        for start in range(0, self.pages, per_chunk):
+            end = min(start + per_chunk, self.pages)
+
+            # only the chunk is mapped at a time, and copied into native
+            # byte order; unmapping it releases the pages it faulted in
+            window = np.memmap(self.path, dtype=self.__dtype, mode="r",
+                               offset=start * self.page_size,
+                               shape=((end - start) * self.page_entries, ))
+            raw = window.astype(np.uint64).reshape(end - start, self.page_entries)
+            del window
+
+            pages = np.arange(start, end, dtype=np.int64) * self.page_size
+
+            if page_levels is None:
+                yield levels, raw.reshape(-1), pages
+                continue
+
+            chunk_levels = page_levels[start:end]
+            for level in np.unique(chunk_levels):
+                sel = chunk_levels == level
+                yield int(level), raw[sel].reshape(-1), pages[sel]
+
+    def offsets(self, pages, mask):
+        """
+            File offsets of the first entries selected by `mask`
+        """
+
+        np = numpy()
+
+        idx = np.flatnonzero(mask)[:FINDING_EXAMPLES]
+        return [int(pages[i // self.page_entries]) + (i % self.page_entries) * 8
+                for i in idx.tolist()]
+
+    def scan(self, levels, decoder_of):
+        """
+            LevelStats of every level found, `decoder_of(level)` gives the
+            LevelDecoder of a level
+        """
+
+        np = numpy()
+        stats = {}
+
+        for level, raw, pages in self.chunks(levels):
+            st = stats.get(level)
+            if st is None:
+                st = stats[level] = LevelStats(level)
+
+            dec = decoder_of(level)
+            pabits = dec.params.pabits
+
+            st.pages += len(pages)
+            st.entries += len(raw)
+            st.empty += int(np.count_nonzero(raw == 0))
+
+            valid = np.zeros(len(raw), dtype=bool)
+            for fdec, mask in dec.classify_many(raw).items():
+                valid |= mask
+
+                n = int(np.count_nonzero(mask))
+                if not n:
+                    continue
+
+                st.formats[fdec.type_name] += n
+                ptes = raw[mask]
+
+                for name, h, l in fdec.fields:
+                    width = h - l + 1
+                    if width > HISTOGRAM_MAX_BITS or name == "Type":
+                        continue
+
+                    vals = fdec.field_many(ptes, name).astype(np.int64)
+                    st.add_histogram((fdec.type_name, name),
+                                     np.bincount(vals, minlength=1 << width))
+
+                beyond = (fdec.oa_many(ptes) >> pabits) != 0
+                n = int(np.count_nonzero(beyond))
+                if n:
+                    sel = mask.copy()
+                    sel[mask] = beyond
+                    st.add_finding(f"{fdec.type_name} output address beyond " +
+                                   f"{pabits} bits PA", n, self.offsets(pages, sel))
+
+            st.invalid += int(np.count_nonzero(~valid & (raw != 0)))
+
+            for finding, mask in dec.check_many(raw):
+                n = int(np.count_nonzero(mask))
+                if n:
+                    st.add_finding(finding, n, self.offsets(pages, mask))
+
+        return stats
+
+
+def print_dump_stats(dump, stats):
+    print(f"DUMP {dump.path}")
+    print(f"    {dump.pages} pages of {dump.page_size} bytes, " +
+          f"{dump.pages * dump.page_entries} entries")
+    if dump.trailing:
+        print(f"    WARN: trailing {dump.trailing} bytes are not a full page, ignored")
+
+    for level in sorted(stats):
+        st = stats[level]
+
+        print()
+        print(f"LEVEL {level}")
+        print(f"    {'pages':<24}{st.pages}")
+        print(f"    {'entries':<24}{st.entries}")
+        print(f"    {'empty':<24}{st.empty}")
+        print(f"    {'invalid':<24}{st.invalid}")
+        for name, n in sorted(st.formats.items()):
+            print(f"    {name:<24}{n}")
+
+        if st.histograms:
+            print()
+            print("    ATTRIBUTES")
+            last = None
+            for (name, field), counts in st.histograms.items():
+                if name != last:
+                    print(f"        {name}")
+                    last = name
+
+                hist = "  ".join(f"{v:#x}: {n}" for v, n in enumerate(counts.tolist()) if n)
+                print(f"            {field:<12}{hist}")
+
+        if st.findings:
+            print()
+            print("    FINDINGS")
+            for finding, (n, offsets) in st.findings.items():
+                examples = ", ".join(hex(x) for x in offsets)
+                print(f"        {finding}: {n} (at {examples}{', ...' if n > len(offsets) else ''})")
@@ -1,27 +1,254 @@
-from utils import BitFieldExractor, get_rawrep, arrange
+from utils import BitFieldExractor, BinCalcException, get_rawrep, arrange
 from state import global_state
+from config import BinConfig
 
 from textwrap import indent
+from collections import namedtuple
+
+# everything a pte layout depends on
+MmuParams = namedtuple("MmuParams", ["arch", "gran", "pabits", "level"])
+
+
+def mmu_params(config, level):
+    return MmuParams(BinConfig.Arch[config], BinConfig.MmuPgGran[config],
+                     BinConfig.MmuPABits[config], level)
+
+
+class PteRecord:
+    """
+        A decoded pte: its raw value, output address and the value of each
+        field of its format, in the order of `decoder.names`
+    """
+
+    __slots__ = ("decoder", "raw", "values", "oa")
+
+    def __init__(self, decoder, raw, values, oa):
+        self.decoder = decoder
+        self.raw = raw
+        self.values = values
+        self.oa = oa
+
+    @property
+    def type(self):
+        return self.decoder.type
+
+    @property
+    def level(self):
+        return self.decoder.params.level
+
+    def __getitem__(self, name):
+        return self.values[self.decoder.index[name]]
+
+    def get(self, name, default=None):
+        i = self.decoder.index.get(name)
+        return default if i is None else self.values[i]
+
+    def fields(self):
+        return dict(zip(self.decoder.names, self.values))
+
+    def __repr__(self):
+        return f"<{self.decoder.type_name} L{self.level} oa={self.oa:#x}>"
+
+
+class PteDecoder:
+    """
+        A pte format compiled for one set of MmuParams. The output address
+        is made of the `fmt.get_oa_fields` in turn, the first one in place
+        and every next one above the previous.
+    """
+
+    def __init__(self, fmt, params):
+        self.format = fmt
+        self.params = params
+        self.type = fmt.pte_type
+        self.type_name = fmt.type_name()
+        self.table = fmt.table
+
+        self.fields = tuple(fmt.get_fields(params))
+        self.names = tuple(name for name, _, _ in self.fields)
+        self.index = { name: i for i, name in enumerate(self.names) }
+
+        self.oa_parts = []
+        top = None
+        for name in fmt.get_oa_fields(params):
+            if name not in self.index:
+                continue
+            _, h, l = self.fields[self.index[name]]
+            shift = l if top is None else top
+            self.oa_parts.append((l, (1 << (h - l + 1)) - 1, shift))
+            top = shift + h - l + 1
+
+        # bits of the raw pte holding the output address
+        self.oa_raw_mask = 0
+        for l, mask, _ in self.oa_parts:
+            self.oa_raw_mask |= mask << l
+
+        # the extraction is specialized into a single expression per layout
+        values = "".join(f"raw >> {l} & {(1 << (h - l + 1)) - 1:#x}, "
+                         for _, h, l in self.fields)
+        oa = " | ".join(f"(raw >> {l} & {mask:#x}) << {shift}"
+                        for l, mask, shift in self.oa_parts)
+
+        self.__values = eval(f"lambda raw: ({values})", {})
+        self.__oa = eval(f"lambda raw: {oa or 0}", {})
+
+    def decode(self, raw):
+        return PteRecord(self, raw, self.__values(raw), self.__oa(raw))
+
+    def encode_fields(self, values):
+        """
+            Raw bits of the field values `values`, {name: value}
+        """
+
+        raw = 0
+        for name, val in values.items():
+            i = self.index.get(name)
+            if i is None:
+                raise BinCalcException(f"{self.type_name} has no field '{name}'")
+
+            _, h, l = self.fields[i]
+            if val < 0 or val >> (h - l + 1):
+                raise BinCalcException(
+                    f"{val:#x} does not fit {self.type_name} field {name}[{h}:{l}]")
+            raw |= val << l
+
+        return raw
+
+    def encode_many(self, oa, bits):
+        """
+            Ptes of this format with the output addresses of the uint64
+            array `oa` and the raw bits `bits` (its type bits included)
+        """
+
+        raw = oa & 0
+        raw |= bits | self.format.type_bits
+        for l, mask, shift in self.oa_parts:
+            raw |= ((oa >> shift) & mask) << l
+        return raw
+
+    def field_many(self, raw, name):
+        """
+            Values of field `name` of the uint64 array `raw`
+        """
+
+        _, h, l = self.fields[self.index[name]]
+        return (raw >> l) & ((1 << (h - l + 1)) - 1)
+
+    def oa_many(self, raw):
+        """
+            Output addresses of the uint64 array `raw`
+        """
+
+        oa = raw & 0
+        for l, mask, shift in self.oa_parts:
+            oa |= ((raw >> l) & mask) << shift
+        return oa
+
+
+# (format, MmuParams) -> PteDecoder
+_decoders = {}
+
+
+class LevelDecoder:
+    """
+        Decoder of the entries of one translation level, `classify(raw,
+        level)` gives the format of an entry or None if it is invalid
+    """
+
+    def __init__(self, params, classify, classify_many, check_many):
+        self.params = params
+        self.__classify = classify
+        self.__classify_many = classify_many
+        self.__check_many = check_many
+        self.__by_format = {}
+
+    def decoder(self, fmt):
+        dec = self.__by_format.get(fmt)
+        if dec is None:
+            dec = fmt.decoder(self.params)
+            self.__by_format[fmt] = dec
+        return dec
+
+    def decode(self, raw):
+        """
+            PteRecord of the native pte value `raw`, None if invalid
+        """
+
+        fmt = self.__classify(raw, self.params.level)
+        if fmt is None:
+            return None
+
+        dec = self.__by_format.get(fmt)
+        if dec is None:
+            dec = self.decoder(fmt)
+
+        return dec.decode(raw)
+
+    def classify_many(self, raw):
+        """
+            {PteDecoder: mask} of the valid entries among the array of
+            native pte values `raw`
+        """
+
+        masks = self.__classify_many(raw, self.params.level)
+        return { self.decoder(fmt): mask for fmt, mask in masks.items() }
+
+    def check_many(self, raw):
+        """
+            [(finding, mask)] of the invalid encodings among `raw`
+        """
+
+        return self.__check_many(raw, self.params.level, self.params)
+
 
 class PteFormatBase:
-    def __init__(self, val, pte_type, level=3):
+    pte_type = None
+
+    # whether the output address is the next level table
+    table = False
+
+    # bits set in every pte of the format, those telling it apart
+    type_bits = 0
+
+    def __init__(self, val, level=3):
         self._config = global_state().config
         self._pteval = val
         self._rawval = get_rawrep(val)
         self._level  = level
-        self._type   = pte_type
+        self._type   = self.pte_type
 
         self.init()
 
-        fields = self.get_fields()
-        extractor = BitFieldExractor(fields)
+        self.record = self.decoder(mmu_params(self._config, level)).decode(self._rawval)
+
+        extractor = BitFieldExractor(self.record.decoder.fields)
         reslult = extractor.extract_colored(self._rawval, 64)
         self.__binstr, self.__field_map = reslult
-    
+
+    @classmethod
+    def decoder(cls, params):
+        key = (cls, params)
+
+        dec = _decoders.get(key)
+        if dec is None:
+            dec = PteDecoder(cls, params)
+            _decoders[key] = dec
+
+        return dec
+
     def init(self):
         pass
 
-    def get_fields(self):
+    @classmethod
+    def type_name(cls):
+        return cls.__name__
+
+    @classmethod
+    def get_fields(cls, p):
+        return []
+
+    @classmethod
+    def get_oa_fields(cls, p):
         return []
 
     def get_field_values(self):
@@ -55,4 +282,3 @@ class PteFormatBase:
         fields = arrange(self.__field_map)
         print(indent(fields, " " * 4))
 
-
@@ -0,0 +1,294 @@
+from config import BinConfig, TlbConfig
+from utils import BinCalcException
+from vector import numpy, stream_values
+
+from .walker import ptw_geometry
+
+
+def lru_hits(keys, sets, ways):
+    """
+        (hit mask, content left) of the uint64 array `keys` looked up in
+        order in an LRU cache of `sets` sets of `ways` entries, empty at
+        first. The content left, replayed first, restores the cache.
+
+        A key hits if fewer than `ways` other keys of its set were used
+        since its previous use, which only depends on the keys: it is
+        decided for all of them at once from the previous and next use of
+        each, scanning back in steps only those with a longer gap.
+    """
+
+    np = numpy()
+
+    n = len(keys)
+
+    # the sequences of each set, in order
+    if sets > 1:
+        set_of = keys % np.uint64(sets)
+        order = np.argsort(set_of, kind="stable")
+        keys = keys[order]
+        set_of = set_of[order]
+    else:
+        order = None
+        set_of = np.zeros(n, dtype=np.uint64)
+
+    # a key used again right after itself hits and leaves the order as is,
+    # only the first of each run is looked at
+    first = np.ones(n, dtype=bool)
+    first[1:] = keys[1:] != keys[:-1]
+    runs = np.flatnonzero(first)
+
+    hit_runs, content = _lru_runs(np, keys[runs], set_of[runs], ways)
+
+    hit = ~first
+    hit[runs] = hit_runs
+
+    if order is not None:
+        unsorted = np.empty(n, dtype=bool)
+        unsorted[order] = hit
+        hit = unsorted
+
+    return hit, content
+
+
+def _lru_runs(np, keys, set_of, ways):
+    # lru_hits of keys grouped by set, none repeated right after itself
+    n = len(keys)
+
+    by_key = np.argsort(keys, kind="stable")
+    same = keys[by_key[1:]] == keys[by_key[:-1]]
+    before, after = by_key[:-1][same], by_key[1:][same]
+
+    prev = np.full(n, -1, dtype=np.int64)
+    prev[after] = before
+    nxt = np.full(n, n, dtype=np.int64)
+    nxt[before] = after
+
+    gap = np.arange(n) - prev - 1
+    hit = (prev >= 0) & (gap < ways)
+
+    # a key between the previous use and `pending` is another distinct key
+    # if it is its last use before `pending`
+    pending = np.flatnonzero((prev >= 0) & (gap >= ways))
+    distinct = np.zeros(len(pending), dtype=np.int64)
+    step = 1
+    while len(pending):
+        distinct += nxt[pending - step] > pending
+
+        evicted = distinct >= ways
+        scanned = gap[pending] == step
+        hit[pending[scanned & ~evicted]] = True
+
+        keep = ~(evicted | scanned)
+        pending = pending[keep]
+        distinct = distinct[keep]
+        step += 1
+
+    # the last `ways` distinct keys of each set, least recent first
+    last = np.flatnonzero(nxt == n)
+    set_last = set_of[last]
+    ends = np.searchsorted(set_last, set_last, side="right") - 1
+    content = keys[last[ends - np.arange(len(last)) < ways]]
+
+    return hit, content
+
+
+class LruCache:
+    def __init__(self, name, entries, ways):
+        if ways <= 0 or entries <= 0 or entries % ways:
+            raise BinCalcException(
+                f"{name}: {entries} entries are not a multiple of {ways} ways")
+
+        self.name = name
+        self.entries = entries
+        self.ways = ways
+        self.sets = entries // ways
+
+        self.lookups = 0
+        self.hits = 0
+        self.__content = numpy().empty(0, dtype=numpy().uint64)
+
+    def access(self, keys):
+        """
+            Hit mask of the uint64 array `keys` looked up in order
+        """
+
+        np = numpy()
+
+        warm = len(self.__content)
+        hit, self.__content = lru_hits(np.concatenate((self.__content, keys)),
+                                       self.sets, self.ways)
+        hit = hit[warm:]
+
+        self.lookups += len(keys)
+        self.hits += int(np.count_nonzero(hit))
+        return hit
+
+
+class TlbSim:
+    """
+        Replay of VAs through a two level TLB, then for the misses a walk
+        of the tables of `ptw_geometry`, whose upper level entries are
+        kept by a page walk cache per level. A walk reads the entries
+        below the deepest level cached, i.e. one memory access per level
+        without a hit.
+    """
+
+    def __init__(self, config):
+        self.vabits = BinConfig.MmuVABits[config]
+        self.gran, self.stride, self.levels = ptw_geometry(config)
+
+        self.l1 = LruCache("L1 TLB", TlbConfig.L1Entries[config],
+                           TlbConfig.L1Ways[config])
+        self.l2 = LruCache("L2 TLB", TlbConfig.L2Entries[config],
+                           TlbConfig.L2Ways[config])
+
+        pwc = TlbConfig.PwcEntries[config]
+        self.pwc = [LruCache(f"PWC L{l}", pwc, pwc) for l in self.levels[:-1]]
+
+        self.accesses = 0
+        self.walks = 0
+        self.walk_reads = 0
+        self.__last = None
+
+    def add(self, va):
+        """
+            Replay the uint64 array of VAs `va`
+        """
+
+        np = numpy()
+
+        self.accesses += len(va)
+
+        vfn = (va & np.uint64((1 << self.vabits) - 1)) >> np.uint64(self.gran)
+        if not len(vfn):
+            return
+
+        # repeated pages always hit the L1 TLB, but still count as lookups
+        repeat = np.empty(len(vfn), dtype=bool)
+        repeat[0] = vfn[0] == self.__last
+        repeat[1:] = vfn[1:] == vfn[:-1]
+        self.__last = vfn[-1]
+
+        n = int(np.count_nonzero(repeat))
+        self.l1.lookups += n
+        self.l1.hits += n
+
+        vfn = vfn[~repeat]
+        vfn = vfn[~self.l1.access(vfn)]
+        vfn = vfn[~self.l2.access(vfn)]
+
+        nlevels = len(self.levels)
+        deepest = np.full(len(vfn), -1, dtype=np.int64)
+        for i, cache in enumerate(self.pwc):
+            # entries are identified by the VPNs down to their level
+            hit = cache.access(vfn >> np.uint64((nlevels - 1 - i) * self.stride))
+            deepest[hit] = i
+
+        self.walks += len(vfn)
+        self.walk_reads += int(np.sum(nlevels - 1 - deepest))
+
+    def stats(self):
+        return {
+            "accesses": self.accesses,
+            "page": 1 << self.gran,
+            "levels": len(self.levels),
+            "caches": [(c.name, c.lookups, c.hits, c.entries)
+                       for c in (self.l1, self.l2, *self.pwc)],
+            "walks": self.walks,
+            "walk_reads": self.walk_reads,
+            "reach": [(c.name, c.entries << self.gran) for c in (self.l1, self.l2)]
+        }
+
+
+def simulate(path, config):
+    """
+        stats of the trace at `path` replayed with `config`
+    """
+
+    sim = TlbSim(config)
+    for va in stream_values(path):
+        sim.add(va)
+    return sim.stats()
+
+
+def _simulate_preset(args):
+    # runs in a worker process
+    name, path, config = args
+    try:
+        return name, simulate(path, config), None
+    except BinCalcException as e:
+        return name, None, str(e)
+
+
+def simulate_all(path, presets, jobs=None):
+    """
+        Yields (name, stats, error) of the trace at `path` replayed with
+        each of the (name, config) of `presets`, in parallel worker
+        processes
+    """
+
+    import multiprocessing
+
+    work = [(name, path, config) for name, config in presets]
+
+    # workers must inherit the modules loaded through the pytool importer,
+    # which also lets them unpickle `_simulate_preset` by reference
+    ctx = multiprocessing.get_context("fork")
+    with ctx.Pool(min(jobs or ctx.cpu_count(), len(work))) as pool:
+        yield from pool.imap(_simulate_preset, work)
+
+
+def _ratio(n, total):
+    return f"{n / total:.2%}" if total else "-"
+
+
+def _size(n):
+    for unit, shift in (("G", 30), ("M", 20), ("K", 10)):
+        if n >= 1 << shift:
+            return f"{n / (1 << shift):g}{unit}"
+    return str(n)
+
+
+def print_tlb_stats(stats):
+    print(f"{stats['accesses']} accesses, {_size(stats['page'])} pages, " +
+          f"{stats['levels']} levels")
+
+    print()
+    print(f"    {'':<12}{'lookups':>12}{'hits':>12}{'hit rate':>10}{'entries':>10}")
+    for name, lookups, hits, entries in stats["caches"]:
+        print(f"    {name:<12}{lookups:>12}{hits:>12}" +
+              f"{_ratio(hits, lookups):>10}{entries:>10}")
+
+    walks = stats["walks"]
+    reads = stats["walk_reads"]
+
+    print()
+    print(f"    {'walks':<24}{walks}")
+    print(f"    {'walk memory accesses':<24}{reads}")
+    if walks:
+        print(f"    {'per walk':<24}{reads / walks:.2f}")
+    if stats["accesses"]:
+        print(f"    {'per 1000 accesses':<24}{reads * 1000 / stats['accesses']:.2f}")
+    for name, reach in stats["reach"]:
+        print(f"    {name + ' reach':<24}{_size(reach)}")
+
+
+def print_tlb_comparison(results):
+    print(f"{'preset':<26}{'page':>6}{'levels':>8}{'L1 hit':>9}{'L2 hit':>9}" +
+          f"{'walks':>10}{'reads/walk':>12}{'reads/1k':>10}{'L2 reach':>10}")
+
+    for name, stats, error in results:
+        if error is not None:
+            print(f"{name:<26}error: {error}")
+            continue
+
+        (_, l1_n, l1_hits, _), (_, l2_n, l2_hits, _) = stats["caches"][:2]
+        walks = stats["walks"]
+        reads = stats["walk_reads"]
+        per_walk = f"{reads / walks:.2f}" if walks else "-"
+        per_1k = reads * 1000 / stats["accesses"] if stats["accesses"] else 0
+
+        print(f"{name:<26}{_size(stats['page']):>6}{stats['levels']:>8}" +
+              f"{_ratio(l1_hits, l1_n):>9}{_ratio(l2_hits, l2_n):>9}" +
+              f"{walks:>10}{per_walk:>12}{per_1k:>10.2f}" +
+              f"{_size(stats['reach'][1][1]):>10}")
@@ -0,0 +1,179 @@
+from config import BinConfig
+from utils import BinCalcException
+from vector import numpy, stream_values, unique
+
+from .walker import ptw_geometry, va_halves
+
+# granules compared by the trace report, as page size orders
+GRANULES = (12, 14, 16)
+
+# set in the pages of the upper half when it has its own tables
+UPPER_PAGE = 1 << 63
+
+
+class VaTrace:
+    """
+        Aggregates of a stream of VAs. Only the distinct 4K pages touched
+        are kept, everything else is derived from them: the entries and
+        tables of each level walked for the current translation scheme (as
+        `ptw_geometry` splits it), and the pages and leaf tables of each
+        granule. The upper half of arm64 is walked from TTBR1, so its pages
+        are kept apart (UPPER_PAGE set) and its tables counted on their own.
+
+        The distinct pages of each chunk are merged into `pages` once they
+        outnumber it, which keeps the merging linear in the trace size.
+    """
+
+    def __init__(self, config):
+        self.vabits = BinConfig.MmuVABits[config]
+        self.gran, self.stride, self.levels = ptw_geometry(config)
+        self.upper, self.split = va_halves(config)
+
+        self.count = 0
+        self.__pages = numpy().empty(0, dtype=numpy().uint64)
+        self.__pending = []
+        self.__pending_len = 0
+
+    @property
+    def pages(self):
+        """
+            Sorted distinct 4K page numbers of the trace
+        """
+
+        self.__merge()
+        return self.__pages
+
+    def __merge(self):
+        if self.__pending:
+            self.__pages = unique(numpy().concatenate([self.__pages] + self.__pending))
+            self.__pending = []
+            self.__pending_len = 0
+
+    def add(self, va):
+        """
+            Account the uint64 array of VAs `va`
+        """
+
+        np = numpy()
+
+        # both halves are sign extended from the VA width in use
+        high = va & np.uint64(self.upper)
+        bad = (high != 0) & (high != np.uint64(self.upper))
+        if bad.any():
+            raise BinCalcException(
+                f"non-canonical VA in trace: {int(va[np.argmax(bad)]):#x}")
+
+        self.count += len(va)
+
+        pages = (va & np.uint64((1 << self.vabits) - 1)) >> np.uint64(GRANULES[0])
+        if self.split:
+            pages |= np.where(high != 0, np.uint64(UPPER_PAGE), np.uint64(0))
+
+        pages = unique(pages)
+        self.__pending.append(pages)
+        self.__pending_len += len(pages)
+        if self.__pending_len >= len(self.__pages):
+            self.__merge()
+
+    def halves(self):
+        """
+            [lower half pages, upper half pages] of the trace, the latter
+            only when the upper half has its own tables and is used
+        """
+
+        np = numpy()
+
+        pages = self.pages
+        cut = np.searchsorted(pages, np.uint64(UPPER_PAGE))
+        if cut == len(pages):
+            return [pages]
+        return [pages[:cut], pages[cut:] & np.uint64(UPPER_PAGE - 1)]
+
+    def level_stats(self):
+        """
+            [(level, tables, entries, max entries of a table)] in the
+            current scheme
+        """
+
+        stats = [self.__level_stats(pages) for pages in self.halves()]
+
+        # the tables of both halves add up, the fan-out is the largest one
+        return [(level, sum(x[1] for x in half), sum(x[2] for x in half),
+                 max(x[3] for x in half)) for level, *half in
+                zip(self.levels, *stats)]
+
+    def __level_stats(self, pages):
+        np = numpy()
+
+        vfn = unique(pages >> np.uint64(self.gran - GRANULES[0]))
+
+        stats = []
+        for level in self.levels:
+            # an entry is identified by the VA bits down to its level, its
+            # table by those above
+            below = (3 - level) * self.stride
+            entries = unique(vfn >> np.uint64(below))
+
+            # entries are sorted, so those of a table are adjacent
+            tables = entries >> np.uint64(self.stride)
+            starts = np.flatnonzero(np.append(True, tables[1:] != tables[:-1]))
+            fanout = np.diff(np.append(starts, len(tables)))
+            stats.append((level, len(fanout), len(entries),
+                          int(fanout.max()) if len(fanout) else 0))
+
+        return stats
+
+    def granule_stats(self):
+        """
+            [(granule order, pages, leaf tables)] of every GRANULES
+        """
+
+        np = numpy()
+
+        stats = []
+        for g in GRANULES:
+            npages = ntables = 0
+            for half in self.halves():
+                pages = unique(half >> np.uint64(g - GRANULES[0]))
+
+                # a leaf table maps 2^(g - 3) pages
+                npages += len(pages)
+                ntables += len(unique(pages >> np.uint64(g - 3)))
+            stats.append((g, npages, ntables))
+
+        return stats
+
+
+def trace_file(path, config):
+    trace = VaTrace(config)
+    for va in stream_values(path):
+        trace.add(va)
+    return trace
+
+
+def _size(order, n):
+    return f"{(n << order) / 2**20:.1f}M"
+
+
+def print_trace_stats(path, trace):
+    print(f"TRACE {path}")
+    print(f"    {'addresses':<24}{trace.count}")
+    print(f"    {'distinct 4K pages':<24}{len(trace.pages)}")
+    halves = trace.halves()
+    if len(halves) > 1:
+        print(f"    {'in the upper half':<24}{len(halves[1])}")
+
+    print()
+    print(f"LEVELS ({len(trace.levels)} levels, {trace.stride} bits per level, " +
+          f"{1 << trace.gran} bytes page)")
+    print(f"    {'':<8}{'tables':>12}{'entries':>12}{'fan-out':>12}{'max':>8}")
+    for level, tables, entries, fanout in trace.level_stats():
+        avg = entries / tables if tables else 0
+        print(f"    {'L' + str(level):<8}{tables:>12}{entries:>12}{avg:>12.1f}{fanout:>8}")
+
+    print()
+    print("GRANULES")
+    print(f"    {'':<8}{'pages':>12}{'footprint':>12}{'leaf tables':>14}{'in tables':>12}")
+    for g, pages, tables in trace.granule_stats():
+        print(f"    {str(1 << (g - 10)) + 'K':<8}{pages:>12}{_size(g, pages):>12}" +
+              f"{tables:>14}{_size(g, tables):>12}")
@@ -0,0 +1,574 @@
+from pathlib import Path
+from collections import namedtuple, OrderedDict
+
+from config import BinConfig, BinArch, BinEndian
+from utils import BinCalcException
+from vector import numpy, array_type, MASK64
+
+from shared.context import Context
+
+# last level tables remembered by the walk cache
+WALK_CACHE_ENTRIES = 1 << 16
+
+# marks the physical address and the leaf level of an untranslated VA in
+# a batch, -1 is a level of 5 level schemes
+FAULT_PA = MASK64
+FAULT_LEVEL = -128
+
+# a step of a walk: the table read, the index in it, the entry and its
+# PteRecord (None if invalid)
+WalkStep = namedtuple("WalkStep", ["level", "table", "index", "raw", "record"])
+
+# result of a batch walk, element-wise over the translated VAs; faulting
+# VAs have pa FAULT_PA, pte 0 and level FAULT_LEVEL
+BatchTranslation = namedtuple("BatchTranslation", ["pa", "pte", "level", "fault"])
+
+# a range of VAs mapped to contiguous PAs by leaves of the same level and
+# attributes (the entry with its output address cleared)
+MappedRange = namedtuple("MappedRange", ["va", "pa", "size", "level", "attrs"])
+
+
+def ptw_geometry(config):
+    """
+        (granule order, bits resolved per level, levels) of the walks of
+        `config`. Each level resolves `page_granule - 3` bits, the number
+        of levels is the one needed to cover `va_bits` as hardware does,
+        counting down to 3, the last one
+    """
+
+    gran = BinConfig.MmuPgGran[config]
+    vabits = BinConfig.MmuVABits[config]
+    if gran is None or vabits is None:
+        raise BinCalcException("no translation scheme configured, see arch")
+
+    stride = gran - 3
+    nlevels = max(-(-(vabits - gran) // stride), 1)
+
+    return gran, stride, list(range(4 - nlevels, 4))
+
+
+def va_halves(config):
+    """
+        (bits set in the VAs of the upper half, whether that half has its
+        own tables) of `config`. A VA is canonical if these bits are
+        either all clear or all set: arm64 translates the upper half
+        through TTBR1, x86_64 sign extends bit `va_bits - 1` and walks
+        both halves from CR3
+    """
+
+    vabits = BinConfig.MmuVABits[config]
+    if BinConfig.Arch[config] == BinArch.Arm64:
+        return MASK64 ^ ((1 << vabits) - 1), True
+    return MASK64 ^ ((1 << (vabits - 1)) - 1), False
+
+
+class PhysImage:
+    """
+        A file holding the physical memory from `base` on, read as 64 bit
+        entries in the configured endianness
+    """
+
+    def __init__(self, path, base, config):
+        np = numpy()
+
+        if base & 7:
+            raise BinCalcException(f"image base {base:#x} not 8 bytes aligned")
+
+        self.path = Context.WorkingFiles[Path(path)]
+        self.base = base
+
+        try:
+            self.size = self.path.stat().st_size
+        except OSError as e:
+            raise BinCalcException(f"unable to open '{path}': {e}")
+
+        if self.size < 8:
+            raise BinCalcException(f"image '{path}' holds no entry")
+
+        ed = "<" if BinConfig.Endian[config] == BinEndian.Little else ">"
+        self.__entries = np.memmap(self.path, dtype=np.dtype(f"{ed}u8"),
+                                   mode="r", shape=(self.size // 8, ))
+
+    @property
+    def end(self):
+        return self.base + len(self.__entries) * 8
+
+    def read(self, pa):
+        """
+            Native entry at `pa`, None if outside of the image
+        """
+
+        if pa & 7 or not self.base <= pa < self.end:
+            return None
+        return int(self.__entries[(pa - self.base) >> 3])
+
+    def read_many(self, pa):
+        """
+            (native entries, mask of those inside the image) at the
+            physical addresses of the uint64 array `pa`
+        """
+
+        np = numpy()
+
+        # below the base wraps around, so a single bound check is enough
+        idx = (pa - np.uint64(self.base)) >> np.uint64(3)
+        ok = (idx < len(self.__entries)) & ((pa & np.uint64(7)) == 0)
+
+        raw = np.zeros(len(pa), dtype=np.uint64)
+        raw[ok] = self.__entries[idx[ok]]
+        return raw, ok
+
+    def read_table(self, pa, entries):
+        """
+            The native entries of the table at `pa`, None if it is not
+            entirely inside the image
+        """
+
+        np = numpy()
+
+        if pa & 7 or not self.base <= pa or pa + entries * 8 > self.end:
+            return None
+
+        start = (pa - self.base) >> 3
+        return self.__entries[start:start + entries].astype(np.uint64)
+
+
+class Translation:
+    __slots__ = ("va", "pa", "steps", "cached", "fault")
+
+    def __init__(self, va, pa, steps, cached, fault=None):
+        self.va = va
+        self.pa = pa
+        self.steps = steps
+        self.cached = cached
+        self.fault = fault
+
+    @property
+    def leaf(self):
+        return None if self.fault else self.steps[-1].record
+
+
+class Walker:
+    """
+        Translation of VAs through the tables of a PhysImage rooted at
+        `root` (TTBR0/CR3 table address), for the `arch:mmu:*` parameters
+        of `config`, with the levels of `ptw_geometry`. On arm64 the upper
+        half of the VA space is walked from `root1` (TTBR1), and faults
+        without it; non-canonical VAs always fault.
+
+        The walk cache maps the VA prefix covered by a last level table to
+        that table, so the VAs sharing a table (the usual case in a trace)
+        only read their leaf entry.
+    """
+
+    def __init__(self, image, root, config, decoder_of, root1=None):
+        self.image = image
+        self.root = root
+        self.root1 = root1
+
+        self.gran, self.stride, self.levels = ptw_geometry(config)
+        self.vabits = BinConfig.MmuVABits[config]
+
+        # the root of each half
+        self.upper, self.split = va_halves(config)
+        self.roots = (root, root1 if self.split else root)
+
+        # 5 level schemes reuse the level 0 format at level -1
+        self.decoders = { l: decoder_of(max(l, 0)) for l in self.levels }
+
+        self.__cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def shift(self, level):
+        return self.gran + (3 - level) * self.stride
+
+    def entries(self, level):
+        """
+            Number of entries in the tables of `level`
+        """
+
+        if level == self.levels[0]:
+            return 1 << min(self.vabits - self.shift(level), self.stride)
+        return 1 << self.stride
+
+    def index(self, va, level):
+        return (va >> self.shift(level)) & (self.entries(level) - 1)
+
+    @property
+    def cache_shift(self):
+        """
+            Shift of the VA prefix covered by a last level table
+        """
+
+        return self.shift(self.levels[-1]) + self.stride
+
+    def cache_size(self):
+        return len(self.__cache)
+
+    def clear_cache(self):
+        self.__cache.clear()
+        self.hits = self.misses = 0
+
+    def __cache_put(self, prefix, table):
+        self.__cache[prefix] = table
+        if len(self.__cache) > WALK_CACHE_ENTRIES:
+            self.__cache.popitem(last=False)
+
+    def __root_of(self, va):
+        # (root table, None) of the half of `va`, or (None, fault)
+        high = va & self.upper
+        if high and high != self.upper:
+            return None, "non-canonical VA"
+
+        root = self.roots[1 if high else 0]
+        if root is None:
+            return None, "upper half VA, no TTBR1 table"
+        return root, None
+
+    def translate(self, va):
+        """
+            Translation of the VA `va`, with the steps of the walk
+        """
+
+        va &= MASK64
+        root, fault = self.__root_of(va)
+        if fault:
+            return Translation(va, None, [], False, fault)
+
+        # the whole VA, the halves have tables of their own
+        levels = self.levels
+        prefix = va >> self.cache_shift
+
+        table = self.__cache.get(prefix)
+        cached = table is not None
+        if cached:
+            self.hits += 1
+            self.__cache.move_to_end(prefix)
+            levels = levels[-1:]
+        else:
+            self.misses += 1
+            table = root
+
+        steps = []
+        for level in levels:
+            index = self.index(va, level)
+            raw = self.image.read(table + index * 8)
+            if raw is None:
+                return Translation(va, None, steps, cached,
+                                   f"level {level} table {table:#x} outside of image")
+
+            record = self.decoders[level].decode(raw)
+            steps.append(WalkStep(level, table, index, raw, record))
+
+            if record is None:
+                return Translation(va, None, steps, cached,
+                                   f"invalid entry at level {level}")
+
+            if record.decoder.table:
+                table = record.oa
+                if len(self.levels) > 1 and level == self.levels[-2]:
+                    self.__cache_put(prefix, table)
+                continue
+
+            size = 1 << self.shift(level)
+            pa = (record.oa & ~(size - 1)) | (va & (size - 1))
+            return Translation(va, pa, steps, cached)
+
+        return Translation(va, None, steps, cached,
+                           f"table entry at last level {self.levels[-1]}")
+
+    def __walk_upper(self, np, va):
+        """
+            Walk the levels above the last one for the uint64 array `va`,
+            gives (last level table, leaf pte, leaf level, indices of the VAs
+            reaching the last level) where the table is 0 for leaves and
+            faults, and the level FAULT_LEVEL for faults
+        """
+
+        n = len(va)
+        upper = np.uint64(self.upper)
+        table = np.where((va & upper) == upper, np.uint64(self.roots[1] or 0),
+                         np.uint64(self.roots[0]))
+        pte = np.zeros(n, dtype=np.uint64)
+        level_of = np.full(n, FAULT_LEVEL, dtype=np.int8)
+
+        active = np.arange(n)
+        for level in self.levels[:-1]:
+            if not len(active):
+                break
+
+            idx = self.index(va[active], level)
+            raw, ok = self.image.read_many(table[active] + idx * np.uint64(8))
+
+            nxt = np.zeros(len(active), dtype=bool)
+            for dec, mask in self.decoders[level].classify_many(raw).items():
+                mask &= ok
+                sel = active[mask]
+                if dec.table:
+                    table[sel] = dec.oa_many(raw[mask])
+                    nxt |= mask
+                else:
+                    pte[sel] = raw[mask]
+                    level_of[sel] = level
+
+            table[active[~nxt]] = 0
+            active = active[nxt]
+
+        return table, pte, level_of, active
+
+    def translate_many(self, va):
+        """
+            BatchTranslation of the array of VAs `va`
+        """
+
+        np = numpy()
+
+        va = np.asarray(va).astype(np.uint64)
+        last = self.levels[-1]
+
+        prefixes, inverse = np.unique(va >> np.uint64(self.cache_shift),
+                                      return_inverse=True)
+
+        # a prefix keeps the bits telling the half, those of non-canonical
+        # VAs and of a half without tables fault
+        upper = np.uint64(self.upper)
+        high = (prefixes << np.uint64(self.cache_shift)) & upper
+        walkable = (high == 0) | (high == upper)
+        if self.roots[1] is None:
+            walkable &= high == 0
+
+        # only the prefixes missing in the walk cache walk the upper levels
+        n = len(prefixes)
+        table = np.zeros(n, dtype=np.uint64)
+        cached = np.zeros(n, dtype=bool)
+        for i in np.flatnonzero(walkable).tolist():
+            prefix = int(prefixes[i])
+            t = self.__cache.get(prefix)
+            if t is not None:
+                table[i] = t
+                cached[i] = True
+
+        hits = int(np.count_nonzero(cached))
+        self.hits += hits
+        self.misses += int(np.count_nonzero(walkable)) - hits
+
+        upper_pte = np.zeros(n, dtype=np.uint64)
+        upper_level = np.full(n, FAULT_LEVEL, dtype=np.int8)
+        reached = np.flatnonzero(cached)
+
+        missed = np.flatnonzero(~cached & walkable)
+        if len(missed):
+            base = prefixes[missed] << np.uint64(self.cache_shift)
+            t, p, l, walked = self.__walk_upper(np, base)
+            table[missed] = t
+            upper_pte[missed] = p
+            upper_level[missed] = l
+
+            for prefix, t in zip(prefixes[missed[walked]].tolist(),
+                                 t[walked].tolist()):
+                self.__cache_put(prefix, t)
+            reached = np.concatenate((reached, missed[walked]))
+
+        pa = np.full(len(va), FAULT_PA, dtype=np.uint64)
+        pte = upper_pte[inverse]
+        level_of = upper_level[inverse]
+
+        # leaves above the last level
+        for level in self.levels[:-1]:
+            sel = level_of == level
+            if not np.any(sel):
+                continue
+            dec_many = self.decoders[level].classify_many(pte[sel])
+            size = np.uint64(1 << self.shift(level))
+            oa = np.zeros(int(np.count_nonzero(sel)), dtype=np.uint64)
+            for dec, mask in dec_many.items():
+                oa[mask] = dec.oa_many(pte[sel][mask])
+            pa[sel] = (oa & ~(size - np.uint64(1))) | (va[sel] & (size - np.uint64(1)))
+
+        # leaf entries of the VAs whose last level table is known
+        has_table = np.zeros(n, dtype=bool)
+        has_table[reached] = True
+        at_last = np.flatnonzero(has_table[inverse])
+        if len(at_last):
+            v = va[at_last]
+            raw, ok = self.image.read_many(
+                table[inverse[at_last]] + self.index(v, last) * np.uint64(8))
+
+            size = np.uint64(1 << self.shift(last))
+            for dec, mask in self.decoders[last].classify_many(raw).items():
+                mask &= ok
+                if dec.table:
+                    continue
+                sel = at_last[mask]
+                pte[sel] = raw[mask]
+                level_of[sel] = last
+                pa[sel] = ((dec.oa_many(raw[mask]) & ~(size - np.uint64(1))) |
+                           (v[mask] & (size - np.uint64(1))))
+
+        fault = level_of == FAULT_LEVEL
+        pte[fault] = 0
+
+        arr = array_type()
+        return BatchTranslation(pa.view(arr), pte.view(arr), level_of, fault)
+
+    def __table_ranges(self, np, level, table, va_base):
+        """
+            Yields the MappedRange of the leaves of the table at `table` and
+            of the tables below it, in VA order
+        """
+
+        raw = self.image.read_table(table, self.entries(level))
+        if raw is None:
+            return
+
+        shift = self.shift(level)
+        size = 1 << shift
+
+        tables = []
+        leaves = []
+        for dec, mask in self.decoders[level].classify_many(raw).items():
+            idx = np.flatnonzero(mask)
+            if dec.table:
+                tables += zip(idx.tolist(), dec.oa_many(raw[idx]).tolist())
+                continue
+
+            oa = dec.oa_many(raw[idx]) & np.uint64(~(size - 1) & MASK64)
+            attrs = raw[idx] & np.uint64(~dec.oa_raw_mask & MASK64)
+            leaves.append((idx, oa, attrs))
+
+        runs = []
+        if leaves:
+            idx = np.concatenate([x[0] for x in leaves])
+            order = np.argsort(idx, kind="stable")
+            idx = idx[order]
+            oa = np.concatenate([x[1] for x in leaves])[order]
+            attrs = np.concatenate([x[2] for x in leaves])[order]
+
+            # a run breaks where the VA, the PA or the attributes do not follow
+            brk = np.ones(len(idx), dtype=bool)
+            brk[1:] = ((idx[1:] != idx[:-1] + 1) |
+                       (oa[1:] != oa[:-1] + np.uint64(size)) |
+                       (attrs[1:] != attrs[:-1]))
+            starts = np.flatnonzero(brk)
+            counts = np.diff(np.append(starts, len(idx)))
+
+            runs = [(i, MappedRange(va_base + i * size, p, c * size, level, a))
+                    for i, p, c, a in zip(idx[starts].tolist(), oa[starts].tolist(),
+                                          counts.tolist(), attrs[starts].tolist())]
+
+        tables.sort()
+        ti = 0
+        for i, rng in runs:
+            while ti < len(tables) and tables[ti][0] < i:
+                t_idx, t = tables[ti]
+                yield from self.__table_ranges(np, level + 1, t, va_base + t_idx * size)
+                ti += 1
+            yield rng
+
+        for t_idx, t in tables[ti:]:
+            yield from self.__table_ranges(np, level + 1, t, va_base + t_idx * size)
+
+    def __ranges(self, np):
+        if self.split:
+            yield from self.__table_ranges(np, self.levels[0], self.roots[0], 0)
+            if self.roots[1] is not None:
+                yield from self.__table_ranges(np, self.levels[0], self.roots[1],
+                                               self.upper)
+            return
+
+        # the upper half is the top of the tables, sign extended
+        sign = 1 << (self.vabits - 1)
+        for rng in self.__table_ranges(np, self.levels[0], self.roots[0], 0):
+            if rng.va & sign:
+                rng = rng._replace(va=rng.va | self.upper)
+            yield rng
+
+    def mappings(self):
+        """
+            Yields the MappedRange of the whole address space in VA order,
+            coalescing the adjacent ranges across tables
+        """
+
+        np = numpy()
+
+        last = None
+        for rng in self.__ranges(np):
+            if (last is not None and last.va + last.size == rng.va and
+                    last.pa + last.size == rng.pa and
+                    last.level == rng.level and last.attrs == rng.attrs):
+                last = last._replace(size=last.size + rng.size)
+                continue
+
+            if last is not None:
+                yield last
+            last = rng
+
+        if last is not None:
+            yield last
+
+
+def size_str(size):
+    """
+        `size` in bytes folded into the largest units it holds, e.g.
+        1G+2M+12K, exact
+    """
+
+    parts = []
+    for unit, shift in (("T", 40), ("G", 30), ("M", 20), ("K", 10), ("", 0)):
+        n = size >> shift
+        if n:
+            parts.append(f"{n}{unit}")
+            size -= n << shift
+
+    return "+".join(parts) or "0"
+
+
+def print_translation(tr):
+    if tr.fault:
+        print(f"VA {tr.va:#x} -> FAULT: {tr.fault}")
+    else:
+        print(f"VA {tr.va:#x} -> PA {tr.pa:#x}")
+
+    print()
+    print("WALK" + (" (last level table from walk cache)" if tr.cached else ""))
+    for st in tr.steps:
+        name = "invalid" if st.record is None else st.record.decoder.type_name
+        print(f"    L{st.level:<3}table {st.table:#x}  [{st.index:>4}]  " +
+              f"{st.raw:#018x}  {name}")
+
+    leaf = tr.leaf
+    if leaf is None:
+        return
+
+    print()
+    print(f"LEAF ATTRIBUTES ({leaf.decoder.type_name})")
+    for name, val in leaf.fields().items():
+        print(f"    {name:<12}{val:#x}")
+
+
+def print_batch(tr, walker):
+    np = numpy()
+
+    n = len(tr.pa)
+    faults = int(np.count_nonzero(tr.fault))
+    levels = ", ".join(f"L{l}: {int(np.count_nonzero(tr.level == l))}"
+                       for l in walker.levels
+                       if np.any(tr.level == l))
+
+    print(f"{n} VAs, {n - faults} translated ({levels or 'none'}), {faults} faults")
+
+
+def print_mappings(walker):
+    count = 0
+    total = 0
+
+    for rng in walker.mappings():
+        end = rng.va + rng.size - 1
+        print(f"{rng.va:#018x}-{end:#018x} -> {rng.pa:#014x}  " +
+              f"{size_str(rng.size):>6}  L{rng.level}  attrs {rng.attrs:#x}")
+        count += 1
+        total += rng.size
+
+    print()
+    print(f"{count} ranges, {size_str(total)} mapped")
@@ -1,5 +1,4 @@
 from utils import BinCalcException, get_rawrep
-from config import BinConfig
 
 from .pte_utils import PteFormatBase
 
@@ -28,18 +27,31 @@ class PteType:
         return "Huge Page"
 
 class x86PteFormatBase(PteFormatBase):
-    def __init__(self, val, pte_type, level=3):
-        super().__init__(val, pte_type, level)
+    def __init__(self, val, level=3):
+        super().__init__(val, level)
 
-    def get_fields(self):
+    @classmethod
+    def type_name(cls):
+        return PteType.getstr(cls.pte_type)
+
+    @classmethod
+    def get_fields(cls, p):
         return x86_64_pte_common_fields
 
+    @classmethod
+    def get_oa_fields(cls, p):
+        return ["PA"]
+
     @staticmethod
     def get_pte_type(val, level):
+        return x86PteFormatBase.get_raw_type(get_rawrep(val), level)
+
+    @staticmethod
+    def get_raw_type(raw, level):
         if level == 3:
             return PteType.Page
 
-        maybe_huge = (get_rawrep(val) & (1 << 7)) != 0
+        maybe_huge = (raw & (1 << 7)) != 0
         if not maybe_huge or level == 0:
             return PteType.Table
 
@@ -73,34 +85,44 @@ class x86PteFormatBase(PteFormatBase):
 
 
 class PagePte(x86PteFormatBase):
+    pte_type = PteType.Page
+    type_bits = 0x1
+
     def __init__(self, val):
-        super().__init__(val, PteType.Page, 3)
+        super().__init__(val, 3)
 
-    def get_fields(self):
-        f = super().get_fields()
-        bits = BinConfig.MmuPABits[self._config]
+    @classmethod
+    def get_fields(cls, p):
+        f = super().get_fields(p)
+        bits = p.pabits
 
         return [
             *f,
             ("Dirty", 6, 6),
             ("Global", 8, 8),
             ("PAT", 7, 7),
-            ("PA", bits, 12)
+            ("PA", bits - 1, 12)
         ]
 
 class HugePte(x86PteFormatBase):
+    pte_type = PteType.Huge
+
+    # present, page size
+    type_bits = 0x81
+
     def __init__(self, val, level):
-        super().__init__(val, PteType.Huge, level)
+        super().__init__(val, level)
 
-    def get_fields(self):
-        f = super().get_fields()
-        bits = BinConfig.MmuPABits[self._config]
+    @classmethod
+    def get_fields(cls, p):
+        f = super().get_fields(p)
+        bits = p.pabits
 
         return [
             *f,
             ("PAT", 12, 12),
             ("Prot.Key", 62, 59),
-            ("PA", bits, 13)
+            ("PA", bits - 1, 13)
         ]
 
     def get_field_comment(self, f):
@@ -114,19 +136,100 @@ class HugePte(x86PteFormatBase):
 
 
 class TablePage(x86PteFormatBase):
+    pte_type = PteType.Table
+    table = True
+
+    # present, writable and user, the leaves decide the access
+    type_bits = 0x7
+
     def __init__(self, val, level):
-        super().__init__(val, PteType.Table, level)
+        super().__init__(val, level)
 
-    def get_fields(self):
-        f = super().get_fields()
-        bits = BinConfig.MmuPABits[self._config]
+    @classmethod
+    def get_fields(cls, p):
+        f = super().get_fields(p)
+        bits = p.pabits
 
         return [
             *f,
-            ("PA", bits, 12)
+            ("PA", bits - 1, 12)
         ]
 
 
+_formats = {
+    PteType.Page: PagePte,
+    PteType.Huge: HugePte,
+    PteType.Table: TablePage
+}
+
+
+def classify(raw, level):
+    """
+        Format of the native pte value `raw` at `level`, None if not present
+    """
+
+    if not raw & 1:
+        return None
+
+    return _formats[x86PteFormatBase.get_raw_type(raw, level)]
+
+
+def classify_many(raw, level):
+    """
+        Boolean masks of the entries of each format in the array of native
+        pte values `raw`, the vectorized `classify`
+    """
+
+    present = (raw & 1) != 0
+    if level == 3:
+        return { PagePte: present }
+
+    huge = (raw & (1 << 7)) != 0
+    if level == 0:
+        return { TablePage: present }
+
+    return {
+        HugePte: present & huge,
+        TablePage: present & ~huge
+    }
+
+
+def leaf_format(level, p):
+    """
+        Format mapping memory at `level`, None if the level has no leaves
+    """
+
+    if level == 3:
+        return PagePte
+    if level in (1, 2):
+        return HugePte
+    return None
+
+
+def table_format(level, p):
+    return TablePage
+
+
+def check_many(raw, level, p):
+    """
+        (finding, mask) of every invalid encoding among the native pte
+        values `raw`
+    """
+
+    present = (raw & 1) != 0
+    findings = []
+
+    if level == 0:
+        findings.append(("PS set at level 0", present & ((raw & (1 << 7)) != 0)))
+
+    reserved = ((1 << 52) - 1) ^ ((1 << p.pabits) - 1)
+    if reserved:
+        findings.append((f"reserved address bits [51:{p.pabits}] set",
+                         present & ((raw & reserved) != 0)))
+
+    return findings
+
+
 def get_format(val, level):
     ptype = x86PteFormatBase.get_pte_type(val, level)
 
@@ -0,0 +1,105 @@
+import io
+import sys
+import json
+import contextlib
+
+from calc import BinaryCalculator, BinCalcException
+
+
+def eval_stream(calculator, stream, lines):
+    """
+        Evaluate the expressions of one stream in order, sharing the state
+        and the records (A#) of `calculator`. Yields a result per
+        expression, anything printed by commands is captured along.
+    """
+
+    for lineno, line in enumerate(lines, 1):
+        expr = line.strip()
+        if not expr or expr.startswith("#"):
+            continue
+
+        result = {
+            "stream": stream,
+            "line": lineno,
+            "id": calculator.get_id(),
+            "expr": expr,
+            "value": None,
+            "output": "",
+            "error": None
+        }
+
+        out = io.StringIO()
+        try:
+            with contextlib.redirect_stdout(out):
+                result["value"] = calculator.eval(expr)
+        except BinCalcException as e:
+            result["id"] = None
+            result["error"] = str(e)
+        except Exception as e:
+            result["id"] = None
+            result["error"] = f"internal error: {e!r}"
+
+        result["output"] = out.getvalue()
+        yield result
+
+
+def format_result(result, ndjson):
+    if ndjson:
+        return json.dumps(result, ensure_ascii=False) + "\n"
+
+    if result["error"] is not None:
+        return f"{result['stream']}:{result['line']}: {result['error']}\n"
+
+    text = result["output"]
+    if result["value"]:
+        text += result["value"] + "\n"
+
+    return text
+
+
+def open_stream(stream):
+    if stream == "-":
+        return contextlib.nullcontext(sys.stdin)
+    return open(stream, 'r')
+
+
+def batch_stream(stream, ndjson):
+    # runs in a worker, one fresh calculator per stream
+    failed = False
+    text = []
+
+    with open_stream(stream) as f:
+        for result in eval_stream(BinaryCalculator(), stream, f):
+            failed |= result["error"] is not None
+            text.append(format_result(result, ndjson))
+
+    return "".join(text), failed
+
+
+def batch(streams, ndjson, jobs):
+    failed = False
+
+    if jobs <= 1 or len(streams) <= 1:
+        for stream in streams:
+            with open_stream(stream) as f:
+                for result in eval_stream(BinaryCalculator(), stream, f):
+                    failed |= result["error"] is not None
+                    sys.stdout.write(format_result(result, ndjson))
+                    sys.stdout.flush()
+
+        return 1 if failed else 0
+
+    import functools
+    import multiprocessing
+
+    # workers must inherit the modules loaded through the pytool importer,
+    # which also lets them unpickle `batch_stream` by reference
+    ctx = multiprocessing.get_context("fork")
+    with ctx.Pool(min(jobs, len(streams))) as pool:
+        work = functools.partial(batch_stream, ndjson=ndjson)
+        for text, stream_failed in pool.imap(work, streams):
+            failed |= stream_failed
+            sys.stdout.write(text)
+            sys.stdout.flush()
+
+    return 1 if failed else 0
@@ -1,11 +1,13 @@
 from parser import parse_expr, BuiltinConversion
 from state import global_state
-from utils import get_converter, BinCalcException 
+from utils import get_converter, BinCalcException, is_array
 from cmds import AllFunctions
+from vector import to_array, unwrap
 
 from config import preset_x86_64_LA48, preset_arm64_le_va48_4k
 
 from lib.accessor import AccessorException
+from shared.context import Context
 
 
 class BinaryCalculator:
@@ -37,26 +39,36 @@ class BinaryCalculator:
         return {
             BuiltinConversion.InvokeCommand: invoke_cmd,
             BuiltinConversion.GetRecord: get_record,
+            BuiltinConversion.MakeArray: to_array,
             "__builtins__": {}
         }
 
     def eval(self, line):
-        co = parse_expr(line)
+        tracer = Context.Tracer
 
-        env = self.__get_exec_env()
+        with tracer.span("eval", cat="bincalc", expr=line):
+            with tracer.span("parse", cat="bincalc"):
+                co, literals = parse_expr(line)
 
-        try:
-            result = eval(co, env)
-        except AccessorException as e:
-            raise BinCalcException(str(e))
-        except Exception as e:
-            raise e
+            env = self.__get_exec_env()
+            env.update(literals)
 
-        if type(result) in [int, float]:
-            self.__save_records[self.__record_id] = result
+            with tracer.span("exec", cat="bincalc"):
+                try:
+                    result = eval(co, env)
+                except AccessorException as e:
+                    raise BinCalcException(str(e))
+                except Exception as e:
+                    raise e
 
-        self.__record_id += 1
-        return self.__convert_printable(result)
+            result = unwrap(result)
+            if type(result) in [int, float] or is_array(result):
+                self.__save_records[self.__record_id] = result
+
+            self.__record_id += 1
+
+            with tracer.span("convert", cat="bincalc"):
+                return self.__convert_printable(result)
 
     def __convert_printable(self, result):
         if result is None:
@@ -68,5 +80,8 @@ class BinaryCalculator:
         conv = get_converter(self.__gs.config)
         return conv.convert(result)
 
+    def complete(self, line, text):
+        return self.__all_fns.complete(line, text)
+
     def get_id(self):
         return self.__record_id
@@ -49,20 +49,25 @@ class Executor:
             [f'<{n.upper()}: {SchemaBase.get_name(t)}>' for n, t in args])
 
         self.__fn = body
-        self.__argtype = schema
+        self.__check_args = schema.compile()
 
     def match_name(self, name):
         return self.name == name or name in self.alias
 
+    def names(self):
+        return [self.name, *self.alias]
+
     def try_invoke(self, *args):
         t_args = [self.__type_mapper(x) for x in args]
-        if self.__argtype != t_args:
+        if not self.__check_args(t_args):
             raise TypeError(
                 f"invalid parameter ({t_args}), expect: ({self.argstr})")
 
         return self.__fn(*t_args)
 
     def __type_mapper(self, strtype):
+        if not isinstance(strtype, str):
+            return strtype
         if strtype in ['True', 'False']:
             return bool(strtype)
         if strtype in ['y', 'n']:
@@ -86,6 +91,7 @@ class Executor:
 class CmdTable:
     def __init__(self):
         self._cmd_map = []
+        self._cmd_index = {}
 
         fns = inspect.getmembers(self, 
                                  lambda p: isinstance(p, Callable))
@@ -95,15 +101,32 @@ class CmdTable:
             if "__CMD__" not in fn.__annotations__:
                 continue
 
-            self._cmd_map.append(Executor(fn))
+            self._register(Executor(fn))
+
+    def _register(self, exe):
+        for name in exe.names():
+            other = self._cmd_index.get(name)
+            if other is not None:
+                raise NameError(
+                    f"command '{name}' of '{exe.name}' is already taken by '{other.name}'")
+
+        for name in exe.names():
+            self._cmd_index[name] = exe
+
+        self._cmd_map.append(exe)
+
+    def executors(self):
+        return self._cmd_map
+
+    def lookup(self, name):
+        return self._cmd_index.get(name)
 
     def call(self, name, *args):
-        for exe in self._cmd_map:
-            if exe.match_name(name):
-                retv = exe.try_invoke(*args)
-                return True, retv
+        exe = self.lookup(name)
+        if exe is None:
+            return False, None
 
-        return False, None
+        return True, exe.try_invoke(*args)
 
     def help_text(self):
         ls = []
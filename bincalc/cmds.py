@@ -2,15 +2,19 @@ from utils import HexConvert, DecConvert, BinConvert
 from function_base import BincalcFunctions
 from cmdbase import cmd, Executor
 from config import arch_preset, GeneralConfig, accessors
+from parser import expr_cache
+from vector import ArrayFunctions, IntOrArray
 
 from lib.advprinter import AdvPrinter, _fmt_bold
+from shared.lazy import lazy_import
 
-import pydoc
 import json
 
 from addrtrans import PteFunctions
 from sysregs import SysRegFunctions
 
+pydoc = lazy_import("pydoc")
+
 
 class GeneralFunctions(BincalcFunctions):
     def __init__(self):
@@ -47,21 +51,21 @@ class GeneralFunctions(BincalcFunctions):
         GeneralConfig.DisplyType[self.gs.config] = choice
     
     @cmd("hex", "h")
-    def _hex(self, val: int):
+    def _hex(self, val: IntOrArray):
         """
             Print the value in hexadecimal
         """
         return HexConvert().convert(val)
 
     @cmd("bin", "b")
-    def _bin(self, val: int):
+    def _bin(self, val: IntOrArray):
         """
             Print the value in binary
         """
         return BinConvert().convert(val)
 
     @cmd("dec", "d")
-    def _dec(self, val: int):
+    def _dec(self, val: IntOrArray):
         """
             Print the value in decimal
         """
@@ -88,6 +92,31 @@ class GeneralFunctions(BincalcFunctions):
             val = acc[self.gs.config]
             print(f"{k:^20}{val}")
 
+    @cmd("expr_cache")
+    def _expr_cache(self, action: str = None):
+        """
+            Show the hit/miss statistics of the compiled expression cache,
+            or drop all cached expressions if ACTION is 'clear'
+        """
+        if action == "clear":
+            expr_cache.clear()
+            return
+
+        if action is not None:
+            raise NameError(f"unknown action '{action}'")
+
+        stats = expr_cache.stats()
+        total = stats["text_hits"] + stats["template_hits"] + stats["misses"]
+
+        print(f"{'cached expressions':<20}{stats['texts']}")
+        print(f"{'cached templates':<20}{stats['templates']}")
+        print(f"{'text hits':<20}{stats['text_hits']}")
+        print(f"{'template hits':<20}{stats['template_hits']}")
+        print(f"{'misses':<20}{stats['misses']}")
+        if total:
+            hits = stats["text_hits"] + stats["template_hits"]
+            print(f"{'hit ratio':<20}{hits / total:.1%}")
+
     @cmd("all_cfgs")
     def _configs(self):
         """
@@ -106,22 +135,59 @@ class AllFunctions(BincalcFunctions):
         self.__scoped_fns = {
             "general": GeneralFunctions(),
             "address transaltion": PteFunctions(),
-            "system register": SysRegFunctions()
+            "system register": SysRegFunctions(),
+            "array": ArrayFunctions()
             # More...
         }
 
-    def call(self, name, *args):
-        for fn_scope in self.__scoped_fns.values():
-            ok, retv = fn_scope.call(name, *args)
-            if ok:
-                return True, retv
+        # every name and alias across all scopes, resolved in one lookup
+        self.__dispatch = {}
+        self.__scope_of = {}
+        for fn_scope in [*self.__scoped_fns.values(), self]:
+            for exe in fn_scope.executors():
+                self.__index(exe, fn_scope)
+
+    def __index(self, exe, fn_scope):
+        for name in exe.names():
+            other = self.__dispatch.get(name)
+            if other is not None:
+                raise NameError(
+                    f"command '{name}' of '{exe.name}' is already taken by '{other.name}'")
 
-        return super().call(name, *args)
+        for name in exe.names():
+            self.__dispatch[name] = exe
+            self.__scope_of[name] = fn_scope
+
+    def lookup(self, name):
+        return self.__dispatch.get(name)
 
     def register_fn(self, fn_cmd):
-        self._cmd_map.append(Executor(fn_cmd))
+        exe = Executor(fn_cmd)
+
+        self.__index(exe, self)
+        self._register(exe)
+
+    def complete(self, line, text):
+        """
+            Candidates for `text` ending `line`, the input so far: command
+            names, or what the command takes as argument there
+        """
+
+        # only the innermost invocation matters
+        line = line[line.rfind("(") + 1:]
+        parts = line.split(",")
+
+        if len(parts) == 1:
+            return sorted(x for x in self.__dispatch if x.startswith(text))
+
+        name = parts[0].strip().strip("\"'")
+        exe = self.__dispatch.get(name)
+        if exe is None:
+            return []
+
+        return self.__scope_of[name].complete_arg(exe.name, len(parts) - 2, text)
 
-    @cmd("help", "h")
+    @cmd("help")
     def _help(self):
         buf = AdvPrinter.Buffer()
 
@@ -183,7 +249,7 @@ class AllFunctions(BincalcFunctions):
             scope_name = k.upper()
             pp.printb(scope_name)
 
-            for v in fns._cmd_map:
+            for v in fns.executors():
                 ppp.printb(v.synopsis())
                 pppp.printblk(v.description())
 
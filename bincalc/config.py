@@ -24,6 +24,27 @@ class GeneralConfig:
                         expect_oneof(DisplyType.Dec, DisplyType.Bin, DisplyType.Hex),
                         default_val="hex")
 
+    # arrays longer than twice this are printed as their head and tail
+    ArrayEdgeItems = accessors().dict_access("array:edge_items", expect_int(),
+                        default_val=8)
+
+
+class TlbConfig:
+    # set associative TLBs looked up by tlbsim, entries must be a multiple
+    # of ways; the second level only sees the misses of the first
+    L1Entries = accessors().dict_access("tlb:l1:entries", expect_int(),
+                        default_val=64)
+    L1Ways = accessors().dict_access("tlb:l1:ways", expect_int(),
+                        default_val=4)
+    L2Entries = accessors().dict_access("tlb:l2:entries", expect_int(),
+                        default_val=1536)
+    L2Ways = accessors().dict_access("tlb:l2:ways", expect_int(),
+                        default_val=12)
+
+    # fully associative page walk cache of each level above the last
+    PwcEntries = accessors().dict_access("tlb:pwc:entries", expect_int(),
+                        default_val=32)
+
 
 #### Arch dependent binary config
 
@@ -15,3 +15,10 @@ class BincalcFunctions(CmdTable):
             return super().call(name, *args)
         except TypeError as e:
             raise BinCalcException(str(e))
+
+    def complete_arg(self, name, index, text):
+        """
+            Candidates for the argument `index` of the command `name` of
+            this scope, starting with `text`
+        """
+        return []
@@ -1,12 +1,40 @@
-import readline
 import traceback
 
+from argparse import ArgumentParser
+
 from calc import BinaryCalculator, BinCalcException
+from batch import batch
 
 
-def main():
+def _completer(calculator):
+    import readline
+
+    matches = []
+
+    def complete(text, state):
+        nonlocal matches
+
+        if state == 0:
+            line = readline.get_line_buffer()[:readline.get_begidx()]
+            try:
+                matches = calculator.complete(line, text)
+            except Exception:
+                matches = []
+
+        return matches[state] if state < len(matches) else None
+
+    return complete
+
+
+def repl():
+    import readline
+
     calculator = BinaryCalculator()
 
+    readline.set_completer(_completer(calculator))
+    readline.set_completer_delims(" \t\n,()\"'")
+    readline.parse_and_bind("tab: complete")
+
     while True:
         idn = calculator.get_id()
 
@@ -31,6 +59,30 @@ def main():
             traceback.print_exception(e)
 
 
+def main():
+    ap = ArgumentParser(prog=__pytool__,
+                        description="binary calculator, interactive unless " +
+                                    "FILES or --batch are given")
+    ap.add_argument("files", nargs="*",
+                    help="expression files evaluated in batch mode, " +
+                         "one expression per line ('-' for stdin)")
+    ap.add_argument("-b", "--batch", action="store_true",
+                    help="evaluate expressions from FILES, or stdin if none")
+    ap.add_argument("--ndjson", action="store_true",
+                    help="emit one json object per expression with its " +
+                         "id, expression, value, printed output and error")
+    ap.add_argument("-j", "--jobs", type=int, default=1,
+                    help="evaluate up to JOBS files in parallel, each file " +
+                         "with its own state and records")
+
+    args = ap.parse_args()
+
+    if not args.batch and not args.files:
+        repl()
+        return
+
+    exit(batch(args.files or ["-"], args.ndjson, args.jobs))
+
+
 if __name__ == "__pytool__":
     main()
-
@@ -1,5 +1,5 @@
 from ast import (
-    NodeTransformer, Tuple,
+    NodeTransformer, Tuple, List,
     Call, Name, Constant,
     parse, dump
 )
@@ -14,20 +14,91 @@ from lib.schmea import (
 )
 import re
 
+from collections import OrderedDict
+
 class AstTypes:
+    # compiled, these are matched against every visited node
     Function = ObjectSchema(Tuple, 
                     elts=PartialList(
-                        ElementAt(0, Name)))
+                        ElementAt(0, Name))).compile()
 
-    DirectCall = ObjectSchema(Call, func=Name)
+    DirectCall = ObjectSchema(Call, func=Name).compile()
     
-    NameRef = ObjectSchema(Name, id=str)
+    NameRef = ObjectSchema(Name, id=str).compile()
 
     result_ref = re.compile(r"^(?:A|Ans)([0-9]+)$")
 
 class BuiltinConversion:
     InvokeCommand = "__invoke_cmd"
     GetRecord = "__get_record"
+    Literal = "__literal"
+    MakeArray = "__make_array"
+
+# placeholder of a record reference (A#) whose number went into a slot,
+# never a valid identifier in the input
+RecordSlot = "A#"
+
+class Slot:
+    """
+        Stands in for a numeric literal (or record number) of the
+        expression until it is compiled into a load of its slot.
+    """
+
+    def __init__(self, index):
+        self.index = index
+
+    def __repr__(self):
+        return f"Slot({self.index})"
+
+class LiteralSlotter(NodeTransformer):
+    def __init__(self):
+        super().__init__()
+        self.literals = {}
+
+    def __slot(self, value):
+        i = len(self.literals)
+        self.literals[f"{BuiltinConversion.Literal}{i}"] = value
+        return i
+
+    def visit_Constant(self, node: Constant):
+        if type(node.value) not in (int, float):
+            return node
+
+        return Constant(Slot(self.__slot(node.value)))
+
+    def visit_Name(self, node: Name):
+        g = AstTypes.result_ref.match(node.id)
+        if not g:
+            return node
+
+        i = self.__slot(int(g.group(1)))
+        return Name(f"{RecordSlot}{i}", ctx=node.ctx)
+
+    # the callee of an invocation is a command name, even if it looks like
+    # a record reference
+
+    def visit_Tuple(self, node: Tuple):
+        if not AstTypes.Function(node):
+            return self.generic_visit(node)
+
+        node.elts[1:] = [self.visit(e) for e in node.elts[1:]]
+        return node
+
+    def visit_Call(self, node: Call):
+        if not AstTypes.DirectCall(node):
+            return self.generic_visit(node)
+
+        node.args = [self.visit(e) for e in node.args]
+        node.keywords = [self.visit(e) for e in node.keywords]
+        return node
+
+class SlotLoader(NodeTransformer):
+    def visit_Constant(self, node: Constant):
+        if not isinstance(node.value, Slot):
+            return node
+
+        name = f"{BuiltinConversion.Literal}{node.value.index}"
+        return Name(name, ctx=ast.Load())
 
 class ExpressionTransformer(NodeTransformer):
     def __init__(self):
@@ -46,7 +117,7 @@ class ExpressionTransformer(NodeTransformer):
         return Call(n,  args, [], lineno=0)
 
     def visit_Tuple(self, node: Tuple):
-        if not AstTypes.Function.match(node):
+        if not AstTypes.Function(node):
             return node
 
         func_name = node.elts[0].id
@@ -54,21 +125,30 @@ class ExpressionTransformer(NodeTransformer):
         return self.__to_invoke(func_name, node.elts[1:])
 
     def visit_Name(self, node: Name):
-        if AstTypes.NameRef != node:
+        if not AstTypes.NameRef(node):
             return Constant(node.id)
 
         id_ = node.id
-        g = AstTypes.result_ref.match(id_)
-        if not g:
-            return Constant(node.id)
+        if id_.startswith(RecordSlot):
+            num = Slot(int(id_[len(RecordSlot):]))
+        else:
+            g = AstTypes.result_ref.match(id_)
+            if not g:
+                return Constant(node.id)
 
-        num = int(g.group(1))
+            num = int(g.group(1))
         
         n = Name(BuiltinConversion.GetRecord, ctx=ast.Load())
         return Call(n, [Constant(num)], [])
 
+    def visit_List(self, node: List):
+        self.generic_visit(node)
+
+        n = Name(BuiltinConversion.MakeArray, ctx=ast.Load())
+        return Call(n, [node], [])
+
     def visit_Call(self, node : Call):
-        if not AstTypes.DirectCall.match(node):
+        if not AstTypes.DirectCall(node):
             return None
 
         return self.__to_invoke(node.func.id, node.args)
@@ -80,17 +160,116 @@ class ExpressionTransformer(NodeTransformer):
         return None
 
 
-def parse_expr(expr):
+class ExprCache:
+    """
+        Compiled expressions, first by expression text and then by
+        template, i.e. the syntax tree with all numeric literals and record
+        numbers taken out into slots. Both are bounded LRUs.
+    """
+
+    def __init__(self, text_size=1024, template_size=256):
+        self.__texts = OrderedDict()
+        self.__templates = OrderedDict()
+        self.__text_size = text_size
+        self.__template_size = template_size
+
+        self.text_hits = 0
+        self.template_hits = 0
+        self.misses = 0
+
+    def __get(self, lru, key):
+        val = lru.get(key)
+        if val is not None:
+            lru.move_to_end(key)
+        return val
+
+    def __put(self, lru, key, val, limit):
+        lru[key] = val
+        if len(lru) > limit:
+            lru.popitem(last=False)
+
+    def get_text(self, text):
+        val = self.__get(self.__texts, text)
+        if val is not None:
+            self.text_hits += 1
+        return val
+
+    def put_text(self, text, val):
+        self.__put(self.__texts, text, val, self.__text_size)
+
+    def get_template(self, template):
+        co = self.__get(self.__templates, template)
+        if co is not None:
+            self.template_hits += 1
+        else:
+            self.misses += 1
+        return co
+
+    def put_template(self, template, co):
+        self.__put(self.__templates, template, co, self.__template_size)
+
+    def clear(self):
+        self.__texts.clear()
+        self.__templates.clear()
+        self.text_hits = self.template_hits = self.misses = 0
+
+    def stats(self):
+        return {
+            "texts": len(self.__texts),
+            "templates": len(self.__templates),
+            "text_hits": self.text_hits,
+            "template_hits": self.template_hits,
+            "misses": self.misses
+        }
+
+expr_cache = ExprCache()
+
+
+def normalize_expr(expr):
+    expr = expr.strip()
+    if '"' in expr or "'" in expr:
+        return expr
+
+    return " ".join(expr.split())
+
+
+def compile_template(T):
     transform = ExpressionTransformer()
-    
-    try:
-        T = parse(expr, mode='eval', filename=f"expr:'{expr}'")
-        T = transform.visit(T)
-        T = ast.fix_missing_locations(T)
-    except SyntaxError as e:
-        raise BinCalcException(f"syntax error: {e.filename} (1:{e.offset})")
+
+    T = transform.visit(T)
+    T = SlotLoader().visit(T)
+    T = ast.fix_missing_locations(T)
 
     #print(dump(T, indent=4))
     #print(ast.unparse(T))
     return compile(T, "<expr>", mode='eval')
 
+
+def parse_expr(expr):
+    """
+        Compile `expr` into (code, literals), the code is to be evaluated
+        with `literals` added to its globals.
+    """
+
+    text = normalize_expr(expr)
+    compiled = expr_cache.get_text(text)
+    if compiled is not None:
+        return compiled
+
+    slotter = LiteralSlotter()
+    try:
+        T = parse(text, mode='eval', filename=f"expr:'{text}'")
+        T = slotter.visit(T)
+    except SyntaxError as e:
+        raise BinCalcException(f"syntax error: {e.filename} (1:{e.offset})")
+
+    template = dump(T)
+    co = expr_cache.get_template(template)
+    if co is None:
+        co = compile_template(T)
+        expr_cache.put_template(template, co)
+
+    compiled = (co, slotter.literals)
+    expr_cache.put_text(text, compiled)
+
+    return compiled
@@ -27,6 +27,16 @@ class SysRegFunctions(BincalcFunctions):
 
         raise BinCalcException(f"not supported for '{arch}'")
     
+    def complete_arg(self, name, index, text):
+        if index != 0 or BinConfig.Arch[self.gs.config] != BinArch.Arm64:
+            return []
+
+        if name == "sysreg":
+            return self.__arm64i.complete(text)
+        if name == "sysfeat":
+            return self.__arm64f.complete(text)
+        return []
+
     @cmd("sysfeat")
     def system_feature(self, name: str):
         """
@@ -1,25 +1,22 @@
 
-import gzip
-import json
-
 from lib.advprinter import PydocAdvPrinter
 
 from shared.context import Context
-from difflib import get_close_matches
 
+# the FEAT_ prefix every feature shares scores 0.5 on its own against short
+# names, suggestions need more than that in common
+_similar_cutoff = 0.6
 
-def _load_sysfeat_db():
-    path = Context.LocalFiles["sysregs/arm64-features.json.gz"]
 
-    with gzip.open(path.absolute(), 'r') as f:
-        return json.load(f)
+def _load_sysfeat_db():
+    return Context.LocalFiles.json_index("sysregs/arm64-features.json.gz")
 
 
 def _get_feature(db, name):
     if name in db:
         return db[name]
 
-    return get_close_matches(name, list(db.keys()), n=20)
+    return db.names().similar(name, n=20, cutoff=_similar_cutoff)
 
 
 def print_desc(p, desc):
@@ -58,10 +55,19 @@ def print_feature(name, feat):
 
 class Arm64Features:
     def __init__(self):
-        self.__regfile = _load_sysfeat_db()
+        # opened on first query, not at every calculator start
+        self.__regfile = None
+
+    def __db(self):
+        if self.__regfile is None:
+            self.__regfile = _load_sysfeat_db()
+        return self.__regfile
+
+    def complete(self, prefix):
+        return self.__db().names().complete(prefix)
 
     def query(self, name):
-        maybereg = _get_feature(self.__regfile, name)
+        maybereg = _get_feature(self.__db(), name)
 
         if not isinstance(maybereg, list):
             print_feature(name, maybereg)
@@ -1,26 +1,164 @@
-import gzip
-import json
+import re
 
 from lib.advprinter import PydocAdvPrinter
 
 from utils import BitFieldValue, BitFieldExractor, arrange
 
 from shared.context import Context
-from difflib import get_close_matches
+
+from .templates import NameTemplates
 
 
 def _load_sysreg_db():
-    path = Context.LocalFiles["sysregs/arm-sysregs.json.gz"]
+    return Context.LocalFiles.json_index("sysregs/arm-sysregs.json.gz")
+
+
+# System registers the database leaves without encoding, as (register it
+# encodes next to, fields that differ in its notation). The Arm ARM puts
+# the breakpoint and watchpoint control registers at op2 + 1 of their
+# value registers, and the event type registers at CRm 0b11xx where the
+# event counters have 0b10xx
+_missing_enc = {
+    "DBGBCR<n>_EL1": ("DBGBVR<n>_EL1", { "op2": "0b101" }),
+    "DBGWCR<n>_EL1": ("DBGWVR<n>_EL1", { "op2": "0b111" }),
+    "PMEVTYPER<n>_EL0": ("PMEVCNTR<n>_EL0", { "CRm": "0b11:m[4:3]" }),
+}
+
+# bits of each encoding field
+_enc_widths = { "op0": 2, "op1": 3, "CRn": 4, "CRm": 4, "op2": 3 }
 
-    with gzip.open(path.absolute(), 'r') as f:
-        return json.load(f)
+# placeholders of the templated names giving each encoding field
+_enc_placeholders = {
+    "op0": None, "op1": "op1", "CRn": "Cn", "CRm": "Cm", "op2": "op2"
+}
 
+# the range of the register index, or some of its bits
+_index_range = re.compile(r"(\d+)-(\d+)")
+_index_bits = re.compile(r"m\[(\d+)(?::(\d+))?\]")
+_enc_parts = re.compile(r"m\[[^]]*\]|[^:]+")
 
-def _get_register(db, name):
+
+def _get_register(db, templates_of, name):
+    # (register, values of its placeholders, encoding of the instance) or
+    # the suggestions
     if name in db:
-        return db[name]
+        return db[name], {}, None
+
+    match = templates_of().match(name)
+    if match is not None:
+        key, binding = match
+        reg = db[key]
+
+        enc = _encoding_of(db, reg)
+        if enc is None:
+            # memory mapped, nothing tells the valid indices
+            return reg, binding, None
 
-    return get_close_matches(name, list(db.keys()), n=20)
+        enc = _instance_encoding(enc, binding)
+        if enc is not None:
+            return reg, binding, enc
+
+    return db.names().similar(name, n=20), None, None
+
+
+def _encoding_of(db, reg):
+    if reg.get("enc") or reg["name"] not in _missing_enc:
+        return reg.get("enc")
+
+    sibling, fields = _missing_enc[reg["name"]]
+    return { **db[sibling]["enc"], **fields }
+
+
+def _parse_encoding(enc):
+    fields = {}
+    for key in _enc_widths:
+        try:
+            fields[key] = int(enc[key], 2)
+        except Exception:
+            fields[key] = enc[key]
+    return fields
+
+
+def _fits_pattern(bits, val):
+    # `val` matches the binary digits `bits`, x being either
+    if val >> len(bits):
+        return False
+
+    for i, b in enumerate(reversed(bits)):
+        if b != "x" and int(b) != (val >> i) & 1:
+            return False
+    return True
+
+
+def _instance_encoding(enc, binding):
+    """
+        {field: value} of the encoding of the instance of a templated
+        register with the placeholder values `binding`, the fields it
+        does not tell left as text. None if there is no such instance.
+    """
+
+    index = binding.get("n", binding.get("m"))
+
+    fields = {}
+    used = 0        # bits of the index placed by m[] parts
+    rest = []       # fields holding the other bits of the index
+
+    for key, width in _enc_widths.items():
+        text = enc[key].strip()
+
+        holder = _enc_placeholders[key]
+        if holder in binding:
+            val = binding[holder]
+            if val >> width:
+                return None
+            if text.startswith("0b") and not _fits_pattern(text[2:], val):
+                return None
+
+            fields[key] = val
+            continue
+
+        r = _index_range.fullmatch(text)
+        if r is not None:
+            if index is None or not int(r[1]) <= index <= int(r[2]):
+                return None
+
+            rest.append(key)
+            continue
+
+        # concatenated binary digits and index bits
+        val = 0
+        for part in _enc_parts.findall(text):
+            m = _index_bits.fullmatch(part)
+            if m is not None and index is not None:
+                h, l = int(m[1]), int(m[2] or m[1])
+                mask = (1 << (h - l + 1)) - 1
+                val = val << (h - l + 1) | (index >> l) & mask
+                used |= mask << l
+            elif part[:2] == "0b" and part[2:] and not part[2:].strip("01"):
+                val = val << (len(part) - 2) | int(part[2:], 2)
+            else:
+                val = text
+                break
+
+        fields[key] = val
+
+    if index is None:
+        return fields
+
+    left = index & ~used
+    if len(rest) == 1:
+        if left >> _enc_widths[rest[0]]:
+            return None
+        fields[rest[0]] = left
+    elif rest:
+        # which bits go where is not told
+        for key in rest:
+            fields[key] = enc[key].strip()
+    elif left:
+        # beyond the bits encoding the index
+        return None
+
+    return fields
 
 
 def _get_bitfield_val(field_alt):
@@ -55,40 +193,36 @@ def _print_field(p, field, val):
             pppp.printblk(val["desc"])
 
 
-def _print_encoding(p, reg):
-    enc = reg["enc"]
+def _print_encoding(p, enc):
     pp = p >> 1
 
-    def parse(key):
-        nonlocal enc
-        try:
-            return int(enc[key], 2)
-        except Exception as e:
-            return enc[key]
-
     p.printb("ENCODING")
     p.print()
 
-    op0 = parse("op0")
-    op1 = parse("op1")
-    crn = parse("CRn")
-    crm = parse("CRm")
-    op2 = parse("op2")
+    op0 = enc["op0"]
+    op1 = enc["op1"]
+    crn = enc["CRn"]
+    crm = enc["CRm"]
+    op2 = enc["op2"]
 
     pp.print(f"s{op0}_{op1}_c{crn}_c{crm}_{op2}")
 
 
-def interpret_fields(reg, val):
+def interpret_fields(reg, val, binding=None, enc=None):
+    binding = binding or {}
+
     with PydocAdvPrinter() as p:
         pp = p >> 1
         ppp = p >> 2
 
         p.printb(reg["name"])
         pp.print(reg["desc"])
+        if binding:
+            pp.print(", ".join(f"<{k}> = {v}" for k, v in binding.items()))
 
         p.print()
-        if reg.get("enc", None):
-            _print_encoding(p, reg)
+        if enc:
+            _print_encoding(p, enc)
         else:
             p.printb("MEMORY MAPPED")
 
@@ -123,13 +257,30 @@ def interpret_fields(reg, val):
 
 class Arm64SysRegInterpreter:
     def __init__(self):
-        self.__regfile = _load_sysreg_db()
+        # opened on first query, not at every calculator start
+        self.__regfile = None
+        self.__templates = None
+
+    def __db(self):
+        if self.__regfile is None:
+            self.__regfile = _load_sysreg_db()
+        return self.__regfile
+
+    def __name_templates(self):
+        if self.__templates is None:
+            self.__templates = NameTemplates(self.__db().keys())
+        return self.__templates
+
+    def complete(self, prefix):
+        return self.__db().names().complete(prefix)
 
     def interprete(self, name, val):
-        maybereg = _get_register(self.__regfile, name)
+        maybereg, binding, enc = _get_register(self.__db(), self.__name_templates, name)
 
         if not isinstance(maybereg, list):
-            interpret_fields(maybereg, val)
+            if enc is None and _encoding_of(self.__db(), maybereg):
+                enc = _parse_encoding(_encoding_of(self.__db(), maybereg))
+            interpret_fields(maybereg, val, binding, enc)
             return
 
         with PydocAdvPrinter() as p:
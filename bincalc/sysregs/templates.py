@@ -0,0 +1,69 @@
+import re
+
+_placeholder = re.compile(r"<(\w+)>")
+
+
+class NameTemplates:
+    """
+        Resolves concrete instances of templated names, such as
+        DBGBCR5_EL1 of DBGBCR<n>_EL1 or S3_0_C15_C2_0 of
+        S3_<op1>_<Cn>_<Cm>_<op2>. A placeholder stands for a decimal
+        number, those of CRn and CRm optionally written with their C.
+
+        Every template is compiled into a single regex, with a group per
+        template, so that a name is matched against all of them at once.
+    """
+
+    def __init__(self, names):
+        # (name, placeholders) of each group
+        self.__templates = []
+
+        alts = []
+        for name in names:
+            # some entries name several instructions
+            for alt in name.split(", "):
+                parts = _placeholder.split(alt)
+                if len(parts) == 1:
+                    continue
+
+                i = len(self.__templates)
+                holders = parts[1::2]
+
+                pat = re.escape(parts[0])
+                for j, holder in enumerate(holders):
+                    # no leading zeros, an instance is named one way
+                    num = r"(?:0|[1-9]\d*)"
+                    if holder.startswith("C"):
+                        num = "C?" + num
+                    pat += f"(?P<t{i}_{j}>{num})" + re.escape(parts[2 * j + 2])
+
+                alts.append(f"(?P<t{i}>{pat})")
+                self.__templates.append((name, holders))
+
+        self.__re = re.compile("|".join(alts)) if alts else None
+
+    def __len__(self):
+        return len(self.__templates)
+
+    def match(self, name):
+        """
+            (templated name, {placeholder: value}) of the template `name`
+            is an instance of, or None
+        """
+
+        if self.__re is None:
+            return None
+
+        m = self.__re.fullmatch(name)
+        if m is None:
+            return None
+
+        # the group of the template closes after those of its placeholders
+        i = int(m.lastgroup[1:])
+        key, holders = self.__templates[i]
+
+        binding = {}
+        for j, holder in enumerate(holders):
+            binding[holder] = int(m.group(f"t{i}_{j}").lstrip("C"))
+
+        return key, binding
@@ -3,6 +3,8 @@ from state import global_state
 from config import BinConfig, BinEndian, GeneralConfig, DisplyType
 import struct
 import math
+import sys
+import re
 
 
 class BinCalcException(Exception):
@@ -15,6 +17,12 @@ class BinCalcException(Exception):
         return self.__msg
 
 
+def is_array(val):
+    # arrays only exist once an expression imported numpy
+    np = sys.modules.get("numpy")
+    return np is not None and isinstance(val, np.ndarray)
+
+
 def get_rawrep(val):
     assert type(val) in [int, float]
 
@@ -54,30 +62,32 @@ def fixhex(v, bits = None):
     return "0x" + "0" * (max(digits - len(h), 0)) + h
 
 
-def pretty_binary(val, bits, bits_per_group=32, transform_cb=None):
-    assert bits % bits_per_group == 0
+# "mmmm llll" of every byte value
+_BYTE_BITS = [f"{b >> 4:04b} {b & 0xf:04b}" for b in range(256)]
 
-    rawv = get_rawrep(val)
+# (bits, bits_per_group) -> %-template of the rows, a slot per byte
+_binary_layouts = {}
+
+
+def _bit_string(rawv, bits):
     binstr = bin(rawv)[2:]
+    return "0" * (bits - len(binstr)) + binstr
+
 
-    padlen = bits - len(binstr)
-    binstr = "0" * padlen + binstr
+def _binary_rows(bits, bits_per_group, group):
+    """
+        Arrange the 8 bit groups of a BITS wide value, `group(i)` gives the
+        text of the group starting at bit string offset i
+    """
 
-    i = 0
     groups_per_row = bits_per_group // 8
     result = []
     line = []
 
-    while i < bits:
-        group = binstr[i:i+8]
-        msb4, lsb4 = group[:4], group[4:]
+    for i in range(0, bits, 8):
+        valstr = group(i)
         bitpos_hint = bits - i
 
-        if transform_cb:
-            msb4 = transform_cb(msb4, bitpos_hint - 4)
-            lsb4 = transform_cb(lsb4, bitpos_hint - 8)
-
-        valstr = f"{msb4} {lsb4}"
         if i % bits_per_group == 0:
             # msb
             valstr = f"{bitpos_hint - 1:>2} | {valstr}"
@@ -88,10 +98,8 @@ def pretty_binary(val, bits, bits_per_group=32, transform_cb=None):
             result.append(" ".join(line))
 
             line.clear()
-            i += 8
             continue
 
-        i += 8
         line.append(valstr)
 
     if len(line) != 0:
@@ -100,6 +108,23 @@ def pretty_binary(val, bits, bits_per_group=32, transform_cb=None):
     return "\n".join(result)
 
 
+def pretty_binary(val, bits, bits_per_group=32):
+    assert bits % bits_per_group == 0
+
+    layout = _binary_layouts.get((bits, bits_per_group))
+    if layout is None:
+        layout = _binary_rows(bits, bits_per_group, lambda i: "%s")
+        _binary_layouts[(bits, bits_per_group)] = layout
+
+    rawv = get_rawrep(val)
+    if rawv.bit_length() > bits:
+        # only the leading bits fit
+        rawv >>= rawv.bit_length() - bits
+
+    data = rawv.to_bytes(bits // 8, "big")
+    return layout % tuple([_BYTE_BITS[b] for b in data])
+
+
 class IntConverterBase:
     def __init__(self):
         pass
@@ -110,11 +135,16 @@ class IntConverterBase:
     def _do_float(self, val):
         pass
 
+    def _do_array(self, val):
+        pass
+
     def convert(self, val):
         if isinstance(val, int):
             return self._do_int(val)
         if isinstance(val, float):
             return self._do_float(val)
+        if is_array(val):
+            return self._do_array(val)
         return str(val)
 
 
@@ -130,6 +160,10 @@ class HexConvert(IntConverterBase):
         v = get_rawrep(val)
         return hex(v)
 
+    def _do_array(self, val):
+        from vector import format_array
+        return format_array(val, hex)
+
 
 class DecConvert(IntConverterBase):
     def __init__(self):
@@ -143,6 +177,10 @@ class DecConvert(IntConverterBase):
         v = get_rawrep(val)
         return str(v)
 
+    def _do_array(self, val):
+        from vector import format_array
+        return format_array(val, str)
+
 
 class BinConvert(IntConverterBase):
     def __init__(self):
@@ -157,6 +195,10 @@ class BinConvert(IntConverterBase):
     def _do_float(self, val):
         return pretty_binary(val, self.__bits)
 
+    def _do_array(self, val):
+        from vector import format_array
+        return format_array(val, self._do_int, raw=False)
+
 
 def get_converter(config):
     disp_mode = GeneralConfig.DisplyType[config]
@@ -200,109 +242,134 @@ class BitFieldValue:
         s = f"{field} {name} {val} {comment}"
         return self.__color_str % (s)
 
-class BitFieldExractor:
-    def __init__(self, fields, color_palette=None):
-        # sort in descending order, based on MSB position
-        self.__fields = sorted(fields, key=lambda x: x[1], reverse=True)
+def _color_code(color):
+    return f"\x1b[{color};49m"
 
-        if not color_palette:
-            self.__palette = [
-                BitFieldColor.Magenta,
-                BitFieldColor.Cyan,
-                BitFieldColor.Green,
-                BitFieldColor.Yellow
-            ]
-        else:
-            self.__palette = color_palette
 
-        # (assigned_color, field)
-        self.__current_fields = None
-        self.__current_pos = None
+class BitFieldLayout:
+    """
+        Colored bit map of a field layout, compiled once into a %-template
+        with a slot per run of bits sharing a field. Fields are matched in
+        descending MSB order and colored from `palette` in turn.
+    """
 
-        self.__color_acc = 0
+    # placeholder of the bit at string offset i while compiling
+    _SLOT = 0xE000
 
-    def __get_color(self):
-        i = self.__color_acc % len(self.__palette)
+    def __init__(self, fields, bits, palette):
+        # bit position -> first field covering it
+        owner = [None] * bits
+        for field in reversed(fields):
+            _, h, l = field
+            for pos in range(max(l, 0), min(h, bits - 1) + 1):
+                owner[pos] = field
 
-        self.__color_acc += 1
-        return self.__palette[i]
+        # bit position -> (color, field) being colored, or None
+        active = [None] * (bits + 1)
+        collected = []
+        current = None
+        n = 0
 
-    def __check_in_range(self, field, pos):
-        _, h, l = field
+        for pos in range(bits - 1, -1, -1):
+            if current is None or not current[1][2] <= pos <= current[1][1]:
+                if current is not None:
+                    collected.append(current)
 
-        return l <= pos <= h
+                current = None
+                if owner[pos] is not None:
+                    current = (palette[n % len(palette)], owner[pos])
+                    n += 1
 
-    def __get_field(self, pos):
-        if self.__current_fields is not None:
-            if self.__check_in_range(self.__current_fields[1], pos):
-                return (self.__current_fields, self.__current_fields)
+            active[pos] = current
 
-        old_field = self.__current_fields
-        for field in self.__fields:
-            if not self.__check_in_range(field, pos):
-                continue
+        if current is not None:
+            collected.append(current)
 
-            color = self.__get_color()
-            self.__current_fields = (color, field)
-            return (self.__current_fields, old_field)
+        def nibble(lsb_pos):
+            prev = active[lsb_pos + 4] if lsb_pos + 4 < bits else None
+            s = [] if prev is None else [_color_code(prev[0])]
 
-        self.__current_fields = None
-        return None, old_field
+            for pos in range(lsb_pos + 3, lsb_pos - 1, -1):
+                if active[pos] != prev:
+                    s.append("\x1b[0m")
+                    if active[pos] is not None:
+                        s.append(_color_code(active[pos][0]))
+                    prev = active[pos]
 
-    def __extract_and_color(self, collected, bitgroup, lsb_pos):
-        pos = lsb_pos + len(bitgroup) - 1
-        colored = []
+                s.append(chr(self._SLOT + bits - 1 - pos))
 
-        if self.__current_fields is not None:
-            color, _ = self.__current_fields
-            colored.append(f"\x1b[{color};49m")
+            s.append("\x1b[0m")
+            return "".join(s)
 
-        for i in range(len(bitgroup)):
-            bit = bitgroup[i]
-            field, old_field = self.__get_field(pos)
+        def group(i):
+            return f"{nibble(bits - i - 4)} {nibble(bits - i - 8)}"
 
-            pos -= 1
-            if field != old_field:
-                colored.append("\x1b[0m")
-                if field is not None:
-                    color, field_ = field
-                    colored.append(f"\x1b[{color};49m")
-                if old_field:
-                    collected.append(old_field)
-            
-            colored.append(bit)
+        rows = _binary_rows(bits, 32, group).replace("%", "%%")
 
-        colored.append("\x1b[0m")
-        if lsb_pos == 0 and self.__current_fields:
-            collected.append(self.__current_fields)
+        # each run of consecutive bits becomes one slot
+        slices = []
 
-        return "".join(colored)
+        def slot(m):
+            a = ord(m.group(0)[0]) - self._SLOT
+            slices.append((a, a + len(m.group(0))))
+            return "%s"
 
-    def __extract_internal(self, val, bit):
-        extracted = []
+        self.__template = re.sub(f"[{chr(self._SLOT)}-{chr(self._SLOT + bits - 1)}]+",
+                                 slot, rows)
+        self.__slices = slices
+        self.__bits = bits
 
-        def on_transform(val, lsb_pos):
-            nonlocal extracted
-            return self.__extract_and_color(extracted, val, lsb_pos)
+        self.__fields = []
+        for color, (name, h, l) in collected:
+            mask = (-1 << (h + 1)) ^ (-1 << l)
+            self.__fields.append((name, h, l, mask, color))
 
-        if bit is None:
-            cfg = global_state().config
-            bit = BinConfig.Bits[cfg]
+    def format(self, raw_rep):
+        binstr = _bit_string(get_rawrep(raw_rep), self.__bits)
+        printed = self.__template % tuple([binstr[a:b] for a, b in self.__slices])
 
-        raw_rep = get_rawrep(val)
-        printed_field = pretty_binary(raw_rep, bit, transform_cb=on_transform)
+        extracted = [BitFieldValue(name, h, l, (raw_rep & mask) >> l, color)
+                     for name, h, l, mask, color in self.__fields]
 
-        extracted_val = []
-        for color, (name, h, l) in extracted:
-            mask = (-1 << (h + 1)) ^ (-1 << l)
-            field_val = (raw_rep & mask) >> l
-            field_obj = BitFieldValue(name, h, l, field_val, color)
-            extracted_val.append(field_obj)
+        return printed, extracted
 
-        return printed_field, extracted_val
+
+# (fields, bits, palette) -> BitFieldLayout
+_field_layouts = {}
+
+
+class BitFieldExractor:
+    def __init__(self, fields, color_palette=None):
+        # sort in descending order, based on MSB position
+        self.__fields = tuple(sorted([tuple(x) for x in fields],
+                                     key=lambda x: x[1], reverse=True))
+
+        if not color_palette:
+            self.__palette = (
+                BitFieldColor.Magenta,
+                BitFieldColor.Cyan,
+                BitFieldColor.Green,
+                BitFieldColor.Yellow
+            )
+        else:
+            self.__palette = tuple(color_palette)
+
+    def __layout(self, bits):
+        key = (self.__fields, bits, self.__palette)
+
+        layout = _field_layouts.get(key)
+        if layout is None:
+            layout = BitFieldLayout(self.__fields, bits, self.__palette)
+            _field_layouts[key] = layout
+
+        return layout
 
     def extract_colored(self, val, bit=None):
-        return self.__extract_internal(val, bit)
+        if bit is None:
+            cfg = global_state().config
+            bit = BinConfig.Bits[cfg]
+
+        return self.__layout(bit).format(get_rawrep(val))
 
 
 def arrange(values, cols=2, seq_number=True):
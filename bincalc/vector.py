@@ -0,0 +1,385 @@
+import re
+import sys
+
+from pathlib import Path
+
+from state import global_state
+from config import BinConfig, BinEndian, GeneralConfig
+from utils import BinCalcException, is_array
+from function_base import BincalcFunctions
+from cmdbase import cmd
+
+from lib.schmea import SchemaBase, UnionSchema
+from shared.context import Context
+
+MASK64 = (1 << 64) - 1
+
+# values read at a time by stream_values
+STREAM_CHUNK = 1 << 20
+
+# the last blank of a text block and the partial number after it
+_last_blank = re.compile(r"\s\S*\Z")
+
+_np = None
+_array_type = None
+
+
+def numpy():
+    """
+        numpy, imported on first use of an array expression
+    """
+
+    global _np
+
+    if _np is None:
+        try:
+            import numpy as np
+        except ImportError:
+            raise BinCalcException(
+                "array expressions require numpy, which is not installed")
+        _np = np
+
+    return _np
+
+
+def array_type():
+    """
+        ndarray subclass of all arrays handed out to expressions. Python
+        ints combined with unsigned arrays are taken as uint64 (masked), so
+        that e.g. `A3 & ~0xfff` keeps the uint64 semantic of the scalar
+        case instead of being rejected or promoted to float.
+    """
+
+    global _array_type
+
+    if _array_type is not None:
+        return _array_type
+
+    np = numpy()
+
+    def operand(x, unsigned):
+        if isinstance(x, np.ndarray):
+            return x.view(np.ndarray)
+        if unsigned and type(x) is int:
+            return np.uint64(x & MASK64)
+        return x
+
+    class ArrayValue(np.ndarray):
+        def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+            unsigned = all(x.dtype.kind in "ub" for x in inputs
+                           if isinstance(x, np.ndarray))
+            inputs = [operand(x, unsigned) for x in inputs]
+            if "out" in kwargs:
+                kwargs["out"] = tuple(operand(x, False) for x in kwargs["out"])
+
+            result = getattr(ufunc, method)(*inputs, **kwargs)
+            if isinstance(result, tuple):
+                return tuple(_wrap(x) for x in result)
+            return _wrap(result)
+
+    def _wrap(x):
+        if isinstance(x, np.ndarray):
+            return x.view(ArrayValue)
+        return x
+
+    _array_type = ArrayValue
+    return _array_type
+
+
+class ArraySchema(SchemaBase):
+    def match(self, val):
+        return is_array(val)
+
+    def _compile(self):
+        return is_array
+
+    def __str__(self):
+        return "array"
+
+
+IntOrArray = UnionSchema(int, ArraySchema())
+
+
+def unwrap(val):
+    """
+        Python scalar of a numpy scalar (e.g. an element of an array),
+        anything else is returned as is
+    """
+
+    np = sys.modules.get("numpy")
+    if np is not None and isinstance(val, np.generic):
+        return val.item()
+    return val
+
+
+def _part(np, val):
+    if is_array(val):
+        return np.ravel(val)
+
+    if isinstance(val, (list, tuple)):
+        return np.asarray(to_array(val))
+
+    val = unwrap(val)
+    if type(val) is int or type(val) is bool:
+        return np.array([int(val) & MASK64], dtype=np.uint64)
+    if type(val) is float:
+        return np.array([val], dtype=np.float64)
+
+    raise BinCalcException(f"not a number: {val!r}")
+
+
+def to_array(values):
+    """
+        Flatten `values` (numbers, arrays or lists of them) into a one
+        dimensional uint64 array, or float64 if any of them is a float
+    """
+
+    np = numpy()
+
+    parts = [_part(np, x) for x in values]
+    if not parts:
+        arr = np.empty(0, dtype=np.uint64)
+    else:
+        arr = np.concatenate(parts)
+
+    if arr.dtype.kind in "bi":
+        arr = arr.astype(np.uint64)
+
+    return arr.view(array_type())
+
+
+def arange(start, stop=None, step=1):
+    """
+        uint64 array of the values of `range(start, stop, step)`, wrapped
+        to 64 bits
+    """
+
+    np = numpy()
+
+    if stop is None:
+        start, stop = 0, start
+
+    n = len(range(start, stop, step))
+    index = np.arange(n, dtype=np.uint64)
+
+    # modulo 2^64, so negative steps and start wrap as in the scalar case
+    arr = np.uint64(start & MASK64) + index * np.uint64(step & MASK64)
+    return arr.view(array_type())
+
+
+def load_values(path):
+    """
+        Array from a .npy file, or a text file of numbers in any python
+        notation separated by blanks, commas or newlines
+    """
+
+    np = numpy()
+    path = Context.WorkingFiles[Path(path)]
+
+    try:
+        if path.suffix == ".npy":
+            return to_array([np.load(path, allow_pickle=False)])
+
+        text = path.read_text()
+    except (OSError, ValueError) as e:
+        raise BinCalcException(f"unable to load '{path}': {e}")
+
+    tokens = text.replace(",", " ").split()
+    try:
+        arr = np.fromiter((int(x, 0) & MASK64 for x in tokens),
+                          dtype=np.uint64, count=len(tokens))
+    except ValueError:
+        try:
+            arr = np.array([float(x) for x in tokens])
+        except ValueError as e:
+            raise BinCalcException(f"unable to load '{path}': {e}")
+
+    return arr.view(array_type())
+
+
+def unique(arr):
+    """
+        Sorted distinct values of `arr`. Sorting then dropping the repeats
+        is much faster than np.unique on large integer arrays, whose hash
+        based path dominates otherwise
+    """
+
+    np = numpy()
+
+    arr = np.sort(arr, kind="stable")
+    if len(arr) < 2:
+        return arr
+
+    keep = np.empty(len(arr), dtype=bool)
+    keep[0] = True
+    np.not_equal(arr[1:], arr[:-1], out=keep[1:])
+    return arr[keep]
+
+
+def _parse_ints(np, path, tokens):
+    try:
+        return np.fromiter((int(x, 0) & MASK64 for x in tokens),
+                           dtype=np.uint64, count=len(tokens))
+    except ValueError as e:
+        raise BinCalcException(f"unable to load '{path}': {e}")
+
+
+def _stream_text(np, path, count):
+    # about `count` numbers per block, cut after the last separator
+    block = count * 16
+    with open(path, "r") as f:
+        rest = ""
+        while True:
+            text = f.read(block)
+            if not text:
+                break
+
+            text = rest + text.replace(",", " ")
+            last = _last_blank.search(text)
+            if last is None:
+                rest = text
+                continue
+
+            text, rest = text[:last.start()], text[last.start():]
+            tokens = text.split()
+            if tokens:
+                yield _parse_ints(np, path, tokens)
+
+        tokens = rest.split()
+        if tokens:
+            yield _parse_ints(np, path, tokens)
+
+
+def _stream_binary(np, path, count):
+    config = global_state().config
+    ed = "<" if BinConfig.Endian[config] == BinEndian.Little else ">"
+
+    n = path.stat().st_size // 8
+    for start in range(0, n, count):
+        # map a window at a time, so the pages read are released
+        window = np.memmap(path, dtype=f"{ed}u8", mode="r", offset=start * 8,
+                           shape=(min(count, n - start), ))
+        yield window.astype(np.uint64)
+        del window
+
+
+def _stream_npy(np, path, count):
+    arr = np.load(path, mmap_mode="r", allow_pickle=False).reshape(-1)
+    for start in range(0, len(arr), count):
+        yield _part(np, np.asarray(arr[start:start + count])).astype(np.uint64)
+
+
+def stream_values(path, count=STREAM_CHUNK):
+    """
+        Yields the integers of a file as uint64 arrays of up to `count`
+        values, so files larger than memory can be processed. A .npy file
+        is memory mapped, a .bin file is taken as 64 bit values in the
+        configured endianness, anything else as text like `load_values`
+    """
+
+    np = numpy()
+    path = Context.WorkingFiles[Path(path)]
+
+    if path.suffix == ".npy":
+        reader = _stream_npy
+    elif path.suffix == ".bin":
+        reader = _stream_binary
+    else:
+        reader = _stream_text
+
+    try:
+        yield from reader(np, path, count)
+    except (OSError, ValueError) as e:
+        raise BinCalcException(f"unable to load '{path}': {e}")
+
+
+def rawrep(arr):
+    """
+        Bulk `utils.get_rawrep`: each value stored with the configured
+        width and endianness, then read back as a native unsigned integer
+    """
+
+    np = numpy()
+
+    config = global_state().config
+    bits = BinConfig.Bits[config]
+    ed = "<" if BinConfig.Endian[config] == BinEndian.Little else ">"
+
+    size = 8 if bits == 64 else 4
+    arr = np.asarray(arr)
+
+    if arr.dtype.kind == "f":
+        stored = arr.astype(f"{ed}f{size}")
+    else:
+        # integer casts truncate, i.e. mask to the width as in the scalar case
+        stored = arr.astype(np.uint64).astype(f"{ed}u{size}")
+
+    return stored.view(f"=u{size}")
+
+
+def format_array(arr, fmt, raw=True):
+    """
+        Summarized listing of `arr`, formatting the raw representation (or
+        the value itself if `raw` is False) of the shown elements with `fmt`
+    """
+
+    np = numpy()
+
+    arr = np.asarray(arr)
+    n = len(arr)
+    edge = GeneralConfig.ArrayEdgeItems[global_state().config]
+
+    if n > 2 * edge:
+        shown = [*range(edge), *range(n - edge, n)]
+    else:
+        shown = list(range(n))
+
+    vals = rawrep(arr[shown]) if raw else arr[shown]
+    width = len(str(max(n - 1, 0)))
+
+    lines = [f"{arr.dtype}[{n}]"]
+    for i, val in zip(shown, vals.tolist()):
+        if n > 2 * edge and i == n - edge:
+            lines.append(f"{'':{width + 2}} ... {n - 2 * edge} more")
+
+        s = fmt(val)
+        if "\n" in s:
+            lines.append(f"[{i:>{width}}]")
+            lines.append(s)
+        else:
+            lines.append(f"[{i:>{width}}] {s}")
+
+    return "\n".join(lines)
+
+
+class ArrayFunctions(BincalcFunctions):
+    def __init__(self):
+        super().__init__()
+
+    @cmd("range")
+    def _range(self, start: int, stop: int = None, step: int = 1):
+        """
+            Array of the values from START (inclusive) to STOP (exclusive)
+            in steps of STEP, same as python range. A single argument is
+            taken as STOP.
+        """
+        if step == 0:
+            raise BinCalcException("range step must not be zero")
+        return arange(start, stop, step)
+
+    @cmd("array")
+    def _array(self, *values):
+        """
+            Array of VALUES in order, each a number or an array whose
+            elements are taken over. Same as the list literal [VALUES].
+        """
+        return to_array(values)
+
+    @cmd("load")
+    def _load(self, path: str):
+        """
+            Load an array from a .npy file or from a text file of numbers
+            (any python notation, e.g. 0x1000) separated by blanks, commas
+            or newlines. PATH is relative to the working directory.
+        """
+        return load_values(path)
@@ -3,44 +3,78 @@ import os.path
 import os
 import json
 import textwrap
+import importlib
 
-from importlib.abc import Loader, MetaPathFinder
-from importlib.util import spec_from_file_location
-
-from shared.resource import ResourceScope
+from shared.resource import ResourceScope, json_index
 from shared.importer import ExtendableImporter
+from shared.codecache import compile_file
+from shared.cachedir import cache_dir
 
 from pathlib import Path
 from argparse import ArgumentParser
 
 resource = ResourceScope(os.environ.get("PYTOOL_DIR", __file__))
 
+# modules imported ahead of time by the daemon, inherited by every
+# forked invocation
+PRELOAD_MODULES = [
+    "argparse", "ast", "code", "difflib", "fnmatch", "gzip", "inspect",
+    "pydoc", "readline", "shlex", "textwrap", "traceback", "typing",
+    "unicodedata", "xml.dom.minidom", "git", "shared.trace", "shared.kvcache"
+]
+
+# resources served through json_index, whose indexed stores the daemon
+# builds ahead of time
+INDEXED_RESOURCES = [
+    "bincalc/sysregs/arm-sysregs.json.gz",
+    "bincalc/sysregs/arm64-features.json.gz"
+]
+
+# what goes into a bundle besides the tools, and which files of the
+# bundled directories are taken along
+BUNDLE_DIRS = ["shared", "lib"]
+BUNDLE_FILES = ["gateway.py", "tool_map.json", "import_defs.json"]
+BUNDLE_PATTERNS = ["*.py", "*.json", "*.json.gz"]
+
+_json_files = {}
+
+
+def load_json(name):
+    if name not in _json_files:
+        with resource[name].open('r') as f:
+            _json_files[name] = json.load(f)
+
+    return _json_files[name]
+
 
 class PyToolImporter(ExtendableImporter):
     def __init__(self, rel_path, common_global):
         super().__init__(common_global, rel_path)
         self.__base = resource.base()
-
-        with resource["import_defs.json"].open('r') as f:
-            self.__map = json.load(f)
+        self.__map = load_json("import_defs.json")
 
     def search_paths(self):
         return [self.__base]
 
-    def resolve(self, fullname, path, target):
-        if fullname in self.__map:
-            path = [os.path.join(self.__base, self.__map[fullname])]
-            return (path, "")
+    def __alias_def(self, name):
+        target = self.__map[name]
+        if isinstance(target, str):
+            return {"path": target}
+        return target
+
+    def aliases(self):
+        return {
+            name: os.path.join(self.__base, self.__alias_def(name)["path"])
+            for name in self.__map
+        }
 
-        return super().resolve(fullname, path, target)
+    def lazy_modules(self):
+        return [x for x in self.__map if self.__alias_def(x).get("lazy")]
 
 
 class ToolMap:
     def __init__(self):
-        map_file = resource["tool_map.json"]
-
-        with map_file.open('r') as f:
-            self.__maps = json.load(f)
+        self.__maps = load_json("tool_map.json")
 
     def get(self, scope, name):
         if not scope:
@@ -80,6 +114,16 @@ class ToolMap:
         s = "\n".join(strs)
         print(textwrap.indent(s, "    "))
 
+    def tool_paths(self):
+        for scope in self.__maps.values():
+            for tool in scope.get("map", {}).values():
+                yield tool["path"]
+
+    def scripts(self):
+        for scope_name, scope in self.__maps.items():
+            for tool_name in scope.get("map", {}):
+                yield f"{scope_name}::{tool_name}"
+
 
 class ScriptName:
     def __init__(self, toolmap, name, scope="", cwdRelative=False):
@@ -116,21 +160,32 @@ def install_import_hook(rel_path, common_global):
     sys.meta_path.insert(0, PyToolImporter(rel_path, common_global))
 
 
-def execute(name, *args):
+def tool_globals(script_path, tracer=None):
+    from shared.trace import Tracer
+    from shared.kvcache import default_cache
+
+    return {
+        "_localRes_": ResourceScope(script_path.parent),
+        "_cwdRes_": ResourceScope(os.getcwd()),
+        "_gvt_": dict(),
+        "_tracer_": tracer or Tracer(),
+        "_cache_": default_cache()
+    }
+
+
+def execute(name, *args, profiler=None, trace=None):
     script_path = name.path()
 
     if not script_path.exists():
-        print(f"unable to locate '{script}' ({script_path})")
+        print(f"unable to locate '{name}' ({script_path})")
         exit(1)
 
-    with script_path.open('r') as f:
-        co = compile(f.read(), script_path.absolute(), 'exec')
+    co = compile_file(script_path.absolute())
 
-    _extras = {
-        "_localRes_": ResourceScope(script_path.parent),
-        "_cwdRes_": ResourceScope(os.getcwd()),
-        "_gvt_": dict()
-    }
+    from shared.trace import Tracer
+
+    tracer = Tracer(trace is not None, str(name))
+    _extras = tool_globals(script_path, tracer)
 
     _tool_global = {
         "__name__": "__pytool__",
@@ -140,7 +195,241 @@ def execute(name, *args):
     sys.argv = [script_path.absolute(), *args]
 
     install_import_hook(script_path.parent, _extras)
-    exec(co, _tool_global)
+
+    if profiler is not None:
+        profiler.start()
+
+    try:
+        with tracer.span(str(name), cat="tool", argv=list(args)):
+            exec(co, _tool_global)
+    finally:
+        _extras["_cache_"].flush()
+
+        if profiler is not None:
+            profiler.stop()
+            profiler.report()
+
+        if trace is not None:
+            tracer.dump(trace)
+            print(f"[trace] {len(tracer.events())} events written to {trace}",
+                  file=sys.stderr)
+
+
+def make_profiler(name, args):
+    from shared import profiler
+
+    try:
+        modes = profiler.parse_modes(args.profile)
+    except ValueError as e:
+        print(e)
+        exit(1)
+
+    out = args.profile_out
+    if not out:
+        out = profiler.default_output(cache_dir("profiles"), name)
+
+    return profiler.Profiler(modes, out,
+                             interval=args.profile_interval,
+                             top=args.profile_top)
+
+
+def warm_up(maps):
+    for name in PRELOAD_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+
+    # compile every tool and its sibling modules so forked children
+    # inherit them
+    tool_dirs = set()
+    for path in maps.tool_paths():
+        tool_dirs.add(resource[path].parent)
+
+    for tool_dir in tool_dirs:
+        for source in tool_dir.rglob("*.py"):
+            try:
+                compile_file(source)
+            except (OSError, SyntaxError):
+                pass
+
+    # builds the indexed stores once, rather than keeping the decoded
+    # objects resident in the daemon; every child opens its own
+    # connection to them
+    for path in INDEXED_RESOURCES:
+        try:
+            json_index(resource[path])
+        except (OSError, ValueError):
+            pass
+
+
+def serve(maps):
+    from shared import forkserver
+
+    def run_request(argv):
+        sys.argv = [__file__, *argv]
+        main()
+
+    warm_up(maps)
+    forkserver.ForkServer(forkserver.socket_path(), run_request).serve_forever()
+
+
+def daemon_control(action, maps):
+    import subprocess
+    import time
+    from shared import forkserver
+
+    path = forkserver.socket_path()
+
+    if action == "serve":
+        serve(maps)
+        return 0
+
+    if action == "start":
+        try:
+            return forkserver.request(path, "ping")
+        except OSError:
+            pass
+
+        log = cache_dir() / "daemon.log"
+        with open(log, 'ab') as f:
+            subprocess.Popen([sys.executable, __file__, "--daemon", "serve"],
+                             stdin=subprocess.DEVNULL, stdout=f, stderr=f,
+                             start_new_session=True)
+
+        for _ in range(100):
+            time.sleep(0.05)
+            try:
+                return forkserver.request(path, "ping")
+            except OSError:
+                pass
+
+        print(f"daemon failed to start, see {log}")
+        return 1
+
+    try:
+        return forkserver.request(path, "ping" if action == "status" else "stop")
+    except OSError:
+        print("pytools daemon not running")
+        return 1 if action == "status" else 0
+
+
+def import_profile(script_str, args, min_ms):
+    import subprocess
+    from shared.importprof import ImportProfile
+
+    proc = subprocess.Popen(
+            [sys.executable, "-X", "importtime", __file__, script_str, "--", *args],
+            stderr=subprocess.PIPE, text=True)
+
+    profile = ImportProfile()
+    for line in proc.stderr:
+        if not profile.feed(line):
+            sys.stderr.write(line)
+
+    proc.wait()
+
+    print()
+    print(f"import profile of '{script_str}'")
+    print()
+    print(textwrap.indent(profile.report(min_ms), "    "))
+
+    return proc.returncode
+
+
+def cache_control(action):
+    import sqlite3
+    from shared.kvcache import default_cache
+
+    cache = default_cache()
+
+    try:
+        if action == "clear":
+            cache.clear()
+            print("tool result cache cleared")
+            return 0
+
+        stats = cache.stats()
+    except (sqlite3.Error, OSError) as e:
+        print(f"tool result cache unavailable: {e}")
+        return 1
+
+    if not stats:
+        print("tool result cache is empty")
+        return 0
+
+    print(f"{'namespace':<24} {'entries':>8} {'KiB':>10} {'hits':>8} {'misses':>8}")
+    for ns, s in sorted(stats.items()):
+        print(f"{ns:<24} {s['entries']:>8} {s['bytes'] / 1024:>10.1f} " +
+              f"{s['hits']:>8} {s['misses']:>8}")
+
+    return 0
+
+
+def bundle(maps, out):
+    from shared.archive import write_bundle
+
+    base = Path(resource.base())
+    if not base.is_dir():
+        print("a bundle can only be made from the source tree")
+        return 1
+
+    dirs = set(BUNDLE_DIRS)
+    for path in maps.tool_paths():
+        parts = Path(path).parts
+        if len(parts) > 1:
+            dirs.add(parts[0])
+
+    for alias in load_json("import_defs.json").values():
+        target = alias if isinstance(alias, str) else alias["path"]
+        dirs.add(Path(target).parts[0])
+
+    files = [Path(x) for x in BUNDLE_FILES]
+    for d in dirs:
+        for pattern in BUNDLE_PATTERNS:
+            for f in (base / d).rglob(pattern):
+                if "__pycache__" not in f.parts:
+                    files.append(f.relative_to(base))
+
+    write_bundle(out, base, files)
+    print(f"{len(set(files))} files bundled into {out}")
+
+    return 0
+
+
+def bench(maps, args):
+    from shared import bench as _bench
+
+    hooked = {}
+
+    def load_module(tool_path, module):
+        script_path = resource[tool_path]
+        if script_path.parent not in hooked:
+            install_import_hook(script_path.parent, tool_globals(script_path))
+            hooked[script_path.parent] = True
+        return importlib.import_module(module)
+
+    scripts = [str(x) for x in maps.scripts()]
+    runner = _bench.Bench(__file__, scripts, load_module,
+                          repeat=args.bench_repeat, pattern=args.bench_filter)
+    results = runner.run()
+
+    if args.bench_out:
+        _bench.save(results, args.bench_out)
+
+    baseline = args.bench_baseline
+    if not baseline:
+        return 0
+
+    if args.bench_update_baseline or not os.path.exists(baseline):
+        _bench.save(results, baseline)
+        print(f"baseline written to {baseline}")
+        return 0
+
+    threshold_of = _bench.parse_thresholds(args.bench_threshold)
+    regressions = _bench.compare(results, _bench.load(baseline), threshold_of)
+
+    return 1 if regressions else 0
 
 
 def main():
@@ -150,6 +439,67 @@ def main():
                     required=False,
                     action="store_true",
                     help="list all scopes and tools")
+    ap.add_argument("--daemon",
+                    required=False,
+                    choices=["start", "stop", "status", "serve"],
+                    help="control the pre-initialised fork server")
+    ap.add_argument("--import-profile",
+                    required=False,
+                    action="store_true",
+                    help="run the tool and report its import time as a tree")
+    ap.add_argument("--import-min",
+                    required=False, type=float, default=0.5,
+                    help="hide imports cheaper than this many ms (default: 0.5)")
+    ap.add_argument("--profile",
+                    required=False, nargs='?', const="cpu",
+                    metavar="cpu|mem|sample",
+                    help="run the tool under cProfile (cpu), tracemalloc (mem) " +
+                         "or a stack sampler (sample), comma separated for " +
+                         "more than one (default: cpu)")
+    ap.add_argument("--profile-out",
+                    required=False,
+                    help="path prefix of the pstats/snapshot/folded stack " +
+                         "files (default: under the pytools cache)")
+    ap.add_argument("--profile-interval",
+                    required=False, type=float,
+                    help="seconds between samples in the sample mode, " +
+                         "otherwise between intermediate dumps")
+    ap.add_argument("--profile-top",
+                    required=False, type=int, default=25,
+                    help="entries shown in the report (default: 25)")
+    ap.add_argument("--trace",
+                    required=False, metavar="OUT",
+                    help="record the tool's spans into the chrome trace OUT " +
+                         "(default: $PYTOOL_TRACE)")
+    ap.add_argument("--cache",
+                    required=False, choices=["stats", "clear"],
+                    help="show statistics of or clear the tool result cache")
+    ap.add_argument("--bundle",
+                    required=False, metavar="OUT",
+                    help="pack all tools into the single executable zip OUT")
+    ap.add_argument("--bench",
+                    required=False,
+                    action="store_true",
+                    help="benchmark start-up of all tools and canned workloads")
+    ap.add_argument("--bench-repeat",
+                    required=False, type=int, default=5,
+                    help="samples per benchmark (default: 5)")
+    ap.add_argument("--bench-filter",
+                    required=False, default="*",
+                    help="only run benchmarks matching this glob")
+    ap.add_argument("--bench-out",
+                    required=False,
+                    help="write results as json to this file")
+    ap.add_argument("--bench-baseline",
+                    required=False,
+                    help="compare against (or create) this baseline json")
+    ap.add_argument("--bench-update-baseline",
+                    required=False, action="store_true",
+                    help="overwrite the baseline with this run")
+    ap.add_argument("--bench-threshold",
+                    required=False, action="append",
+                    help="allowed slowdown as FRACTION or PATTERN=FRACTION " +
+                         "(default: 0.10), may be repeated")
 
     argv = sys.argv
     additional_start = len(argv)
@@ -166,12 +516,37 @@ def main():
         maps.get_help()
         exit(0)
 
+    if args.daemon:
+        exit(daemon_control(args.daemon, maps))
+
+    if args.cache:
+        exit(cache_control(args.cache))
+
+    if args.bundle:
+        exit(bundle(maps, args.bundle))
+
+    if args.bench:
+        exit(bench(maps, args))
+
     if not args.script_str:
         print("must provide a target to run")
         exit(1)
 
+    tool_args = argv[additional_start + 1:]
+
+    if args.import_profile:
+        exit(import_profile(args.script_str, tool_args, args.import_min))
+
     name = ScriptName.from_name(args.script_str, maps)
-    execute(name, *argv[additional_start + 1:])
+
+    profiler = None
+    if args.profile:
+        profiler = make_profiler(name, args)
+
+    from shared.trace import trace_output
+
+    execute(name, *tool_args,
+            profiler=profiler, trace=args.trace or trace_output())
 
 
 if __name__ == "__main__":
@@ -88,8 +88,10 @@ class ObjectAccessor(AccessorBase):
 
 
 def schema_checker(schema):
+    match = schema.compile()
+
     def __check(val):
-        if schema.match(val):
+        if match(val):
             return
         raise AccessorException("expect type: " + str(schema) + ", got " + val)
 
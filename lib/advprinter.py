@@ -1,5 +1,8 @@
 import textwrap
-import pydoc
+
+from shared.lazy import lazy_import
+
+pydoc = lazy_import("pydoc")
 
 
 def _fmt_bold(x):
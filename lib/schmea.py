@@ -8,6 +8,61 @@ class SchemaBase:
     def match(self, val):
         return False
 
+    def compile(self):
+        """
+            Specialize this schema into a predicate equivalent to match(),
+            without re-interpreting the schema tree on every call
+        """
+        compiled = getattr(self, "_compiled", None)
+        if compiled is None:
+            compiled = self._compile()
+            self._compiled = compiled
+
+        return compiled
+
+    def _compile(self):
+        return self.match
+
+    @staticmethod
+    def compile_generic(ref):
+        """
+            Predicate equivalent to `match_generic(val, ref)`, the branches
+            depending on `ref` only are taken once here
+        """
+
+        if ref == typing.Any:
+            return lambda val: True
+
+        t = type(ref)
+
+        if issubclass(t, SchemaBase):
+            return ref.compile()
+
+        if isinstance(ref, type):
+            def match_type(val):
+                if isinstance(val, ref):
+                    return True
+                return type(val) is t and val == ref
+            return match_type
+
+        if t == list or t == tuple:
+            # elements of ref that compare equal to None are never checked
+            checks = [(i, SchemaBase.compile_generic(r))
+                      for i, r in enumerate(ref) if not r == None]
+
+            def match_seq(val):
+                if type(val) is not t:
+                    return False
+
+                n = len(val)
+                for i, check in checks:
+                    if not check(val[i] if i < n else None):
+                        return False
+                return True
+            return match_seq
+
+        return lambda val: type(val) is t and val == ref
+
     @staticmethod
     def match_generic(val, ref):
         t = type(ref)
@@ -62,6 +117,10 @@ class Optional(SchemaBase):
             return True
         return SchemaBase.match_generic(v, self.__schema)
 
+    def _compile(self):
+        check = SchemaBase.compile_generic(self.__schema)
+        return lambda v: v is None or check(v)
+
     def __str__(self):
         v = SchemaBase.get_name(self.__schema)
         return f"{v}?"
@@ -76,6 +135,9 @@ class Schema(SchemaBase):
     def match(self, val):
         return SchemaBase.match_generic(val, self.__ref)
 
+    def _compile(self):
+        return SchemaBase.compile_generic(self.__ref)
+
     def __str__(self):
         v = SchemaBase.get_name(self.__ref)
         return v
@@ -101,6 +163,24 @@ class ObjectSchema(SchemaBase):
 
         return True
 
+    def _compile(self):
+        type_ = self.__type
+        members = [(k, SchemaBase.compile_generic(ref))
+                   for k, ref in self.__members.items()]
+
+        def match(val):
+            if not isinstance(val, type_):
+                return False
+
+            for k, check in members:
+                v = getattr(val, k, None)
+                if v is None or not check(v):
+                    return False
+
+            return True
+
+        return match
+
     def __str__(self):
         v = SchemaBase.get_name(self.__schema)
         members = [f"{k}{SchemaBase.get_name(v)}" for k, v in self.__members.items()]
@@ -117,6 +197,17 @@ class UnionSchema(SchemaBase):
                 return True
         return False
 
+    def _compile(self):
+        checks = [SchemaBase.compile_generic(c) for c in self.__choices]
+
+        def match(val):
+            for check in checks:
+                if check(val):
+                    return True
+            return False
+
+        return match
+
     def __str__(self):
         members = [f"{SchemaBase.get_name(c)}" for c in self.__choices]
         return f"({' | '.join(members)})"
@@ -139,6 +230,22 @@ class ElementAt(SchemaBase):
         pos = val[self.__index]
         return SchemaBase.match_generic(pos, self.__schema)
 
+    def _compile(self):
+        index = self.__index
+        check = SchemaBase.compile_generic(self.__schema)
+
+        def match(val):
+            t = type(val)
+            if t is not list and t is not tuple:
+                return False
+
+            if index >= len(val):
+                return False
+
+            return check(val[index])
+
+        return match
+
     def __str__(self):
         v = SchemaBase.get_name(self.__schema)
         return f"[{self.__index}] = {v}"
@@ -160,6 +267,17 @@ class PartialList(SchemaBase):
 
         return True
 
+    def _compile(self):
+        checks = [pos.compile() for pos in self.__positions]
+
+        def match(val):
+            for check in checks:
+                if not check(val):
+                    return False
+            return True
+
+        return match
+
     def __str__(self):
         v = [SchemaBase.get_name(x) for x in self.__positions]
         return f"{{ {', '.join(v)} }}"
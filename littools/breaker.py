@@ -126,7 +126,8 @@ def break_oneline(blist, pos, max_width):
 
         pos += 1
 
-        if b.permitted():
+        # breaking before the first box would not make progress
+        if b.permitted() and len(cur_lines) > 1:
             brkpoint.append(len(cur_lines) - 1)
 
         if isinstance(b, Penalty) and b.p < -1000:
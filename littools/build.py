@@ -39,7 +39,9 @@ class StageBase:
             name = f"[{self.get_name()} {i + 1}/{self.__nr_repeat}] {self.get_desc()}"
             print(name)
 
-            self._execute()
+            with Context.Tracer.span(self.get_name(), cat="stage",
+                                     desc=self.get_desc(), index=i):
+                self._execute()
 
     def _execute(self, index):
         pass
@@ -147,8 +149,9 @@ class Pipeline:
         merged  = self.__pre_actions
         merged += self.__stages[target]
         merged += self.__post_actions
-        for stage in merged:
-            stage.run()
+        with Context.Tracer.span(target, cat="target"):
+            for stage in merged:
+                stage.run()
 
 
 def get_environment(pipeline):
@@ -1,13 +1,17 @@
-import git
 import os
 import fnmatch
 
 from difflib import ndiff, SequenceMatcher
-from pydoc import pager
 from argparse import ArgumentParser
 from pathlib import Path
 from breaker import wrap_lines, wrap_text, pad_right
 
+from Shared.lazy import lazy_import
+from Shared.context import Context
+
+git = lazy_import("git")
+pydoc = lazy_import("pydoc")
+
 Pathes = [
     "*.tex"
 ]
@@ -124,9 +128,10 @@ def render_line_diff(a, b):
     return (a_, b_)
 
 
-def diffblob(blob_a, blob_b, width):
-    a = blobstr(blob_a).splitlines()
-    b = blobstr(blob_b).splitlines()
+@Context.Cache.memoize("texdiff")
+def difftext(text_a, text_b, width):
+    a = text_a.splitlines()
+    b = text_b.splitlines()
 
     la = []
     lb = []
@@ -155,8 +160,12 @@ def diffblob(blob_a, blob_b, width):
     return (la, lb)
 
 
+def diffblob(blob_a, blob_b, width):
+    return difftext(blobstr(blob_a), blobstr(blob_b), width)
+
+
 class DiffEntry:
-    def __init__(self, diff_obj: git.Diff, accessor):
+    def __init__(self, diff_obj: "git.Diff", accessor):
         self.__do = diff_obj
         self.mode = getattr(diff_obj, f"{accessor}_mode", None)
         self.path = getattr(diff_obj, f"{accessor}_path", None)
@@ -256,14 +265,15 @@ class Diff:
 
             path = DiffEntry.get_attr_union(diffed, reference, "path")
 
-            lines += [
-                f"#### {path} ####",
-                "  " + colHeader,
-                "",
-                *reference.comparef(diffed, width),
-                "",
-                ""
-            ]
+            with Context.Tracer.span("format", cat="diff", path=path):
+                lines += [
+                    f"#### {path} ####",
+                    "  " + colHeader,
+                    "",
+                    *reference.comparef(diffed, width),
+                    "",
+                    ""
+                ]
 
         return "\n".join(lines)
 
@@ -310,7 +320,7 @@ def main():
     out = []
     out.append(diff.format(args.width))
 
-    pager("\n".join(out))
+    pydoc.pager("\n".join(out))
 
 
 if __name__ == "__pytool__":
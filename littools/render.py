@@ -1,4 +1,3 @@
-from xml.dom.minidom import Node, Text, parse
 from pathlib import Path
 from argparse import ArgumentParser
 import textwrap
@@ -6,6 +5,11 @@ import unicodedata
 
 from breaker import wrap_text, get_width, update_length_data, sticky, non_sticky
 
+from Shared.lazy import lazy_import
+from Shared.context import Context
+
+minidom = lazy_import("xml.dom.minidom")
+
 
 def center_justify(text, width):
     w_ = sum([get_width(c) for c in text])
@@ -35,7 +39,7 @@ class TagBinding:
         while len(q) > 0:
             child = q.pop()
 
-            if isinstance(child, Text):
+            if isinstance(child, minidom.Text):
                 self.emit(writer, child.nodeValue)
                 continue
 
@@ -462,11 +466,19 @@ def render(docobj, args):
     # if not args.split:
     #    out_path = args.out.parent
 
-    binder.process(wr, docobj)
-    trn.render(wr)
-    trn.flush_and_export(out_path)
+    tracer = Context.Tracer
+
+    with tracer.span("bind", cat="render"):
+        binder.process(wr, docobj)
+
+    with tracer.span("transform", cat="render", fmt=args.fmt):
+        trn.render(wr)
+
+    with tracer.span("export", cat="render"):
+        trn.flush_and_export(out_path)
 
-    counter.count(wr, 2)
+    with tracer.span("count", cat="render"):
+        counter.count(wr, 2)
 
 
 def main():
@@ -485,7 +497,7 @@ def main():
         "—": 1,
         "…": 1
     })
-    do = parse(opt.xml_file).documentElement
+    do = minidom.parse(opt.xml_file).documentElement
     render(do, opt)
 
 
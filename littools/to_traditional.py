@@ -1,6 +1,3 @@
-import gzip
-import json
-
 from pathlib import Path
 from argparse import ArgumentParser
 
@@ -17,11 +14,8 @@ suppliment = {
 
 def get_stmap():
     global suppliment
-    p = Context.LocalFiles["stcharmap.json.gz"]
-    with gzip.open(p.absolute(), 'rt') as f:
-        d = json.load(f)
-        d.update(suppliment)
-        return d
+    d = Context.LocalFiles.load_json("stcharmap.json.gz")
+    return { **d, **suppliment }
 
 
 def convert(stmap, file):
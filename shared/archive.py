@@ -0,0 +1,152 @@
+import os
+import stat
+import struct
+import marshal
+import fnmatch
+import zipfile
+import importlib.util
+
+from types import SimpleNamespace
+
+# flags field of a hash based pyc whose source is never checked, see PEP 552
+_PYC_UNCHECKED_HASH = 0b01
+
+_SHEBANG = b"#!/usr/bin/env python3\n"
+
+_MAIN = """\
+import os
+import gateway
+
+# resources are located relative to the archive
+os.environ.pop("PYTOOL_DIR", None)
+gateway.main()
+"""
+
+# archive file -> root ArchivePath, every path into an archive shares
+# the one opened zip
+_archives = {}
+
+
+class ArchivePath(zipfile.Path):
+    """
+        A member of a bundle archive that can stand in for a pathlib.Path
+        wherever pytools locates resources and modules
+    """
+
+    def absolute(self):
+        return self
+
+    def is_absolute(self):
+        return True
+
+    def __fspath__(self):
+        return str(self)
+
+    def __eq__(self, other):
+        if not isinstance(other, ArchivePath):
+            return NotImplemented
+        return (self.root.filename, self.at) == (other.root.filename, other.at)
+
+    def __hash__(self):
+        return hash((self.root.filename, self.at))
+
+    def stat(self):
+        archive = os.stat(self.root.filename)
+        info = self.root.getinfo(self.at)
+        return SimpleNamespace(st_mtime_ns=archive.st_mtime_ns,
+                               st_size=info.file_size)
+
+    def rglob(self, pattern):
+        for name in self.root.namelist():
+            if not name.startswith(self.at) or name.endswith("/"):
+                continue
+            if fnmatch.fnmatch(name.rpartition("/")[2], pattern):
+                yield self._next(name)
+
+    def precompiled(self):
+        """
+            Code object of this module, from the bytecode bundled next to
+            it if there is one
+        """
+
+        pyc = self.parent / (self.stem + ".pyc")
+        if pyc.exists():
+            data = pyc.read_bytes()
+            if data[:4] == importlib.util.MAGIC_NUMBER:
+                return marshal.loads(data[16:])
+
+        return compile(self.read_bytes(), str(self), 'exec')
+
+
+def _open_archive(archive):
+    root = _archives.get(archive)
+    if root is None:
+        root = ArchivePath(archive)
+        _archives[archive] = root
+    return root
+
+
+def archive_path(path):
+    """
+        Translate a path pointing into a bundle archive (e.g.
+        /opt/pytools.pyz/bincalc/calc.py) into an ArchivePath, returns None
+        if `path` is not within an archive.
+    """
+
+    archive = os.path.abspath(path)
+    inner = []
+
+    while archive not in _archives and not os.path.exists(archive):
+        archive, tail = os.path.split(archive)
+        if not tail:
+            return None
+        inner.insert(0, tail)
+
+    if archive not in _archives:
+        if not os.path.isfile(archive):
+            return None
+        if not zipfile.is_zipfile(archive):
+            return None
+
+    root = _open_archive(archive)
+    if not inner:
+        return root
+
+    return root.joinpath(*inner)
+
+
+def _pyc(source, filename):
+    code = compile(source, filename, 'exec', dont_inherit=True)
+    header = struct.pack("<4sI8s", importlib.util.MAGIC_NUMBER,
+                         _PYC_UNCHECKED_HASH, importlib.util.source_hash(source))
+    return header + marshal.dumps(code)
+
+
+def write_bundle(out, base, files):
+    """
+        Pack `files` (relative to `base`) into the executable zip archive
+        `out`. Every python source is accompanied by its unchecked hash
+        based bytecode, which both zipimport and MyLoader use as is.
+    """
+
+    with open(out, 'wb') as f:
+        f.write(_SHEBANG)
+
+        with zipfile.ZipFile(f, 'w', compression=zipfile.ZIP_DEFLATED) as z:
+            z.writestr("__main__.py", _MAIN)
+            z.writestr("__main__.pyc", _pyc(_MAIN.encode(), "__main__.py"))
+
+            for rel in sorted(set(files)):
+                name = rel.as_posix()
+                source = (base / rel).read_bytes()
+
+                if name.endswith(".gz"):
+                    z.writestr(name, source, compress_type=zipfile.ZIP_STORED)
+                    continue
+
+                z.writestr(name, source)
+                if name.endswith(".py"):
+                    z.writestr(name[:-3] + ".pyc", _pyc(source, name))
+
+    mode = os.stat(out).st_mode
+    os.chmod(out, mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
@@ -0,0 +1,514 @@
+import io
+import os
+import sys
+import json
+import time
+import fnmatch
+import platform
+import tempfile
+import statistics
+import subprocess
+import contextlib
+import importlib.util
+
+from pathlib import Path
+from argparse import Namespace
+
+
+class BenchEnv:
+    """
+        What a workload gets to work with: tool modules loaded through the
+        pytool importer and a scratch directory.
+    """
+
+    def __init__(self, module_loader, tmpdir):
+        self.__loader = module_loader
+        self.tmpdir = Path(tmpdir)
+
+    def module(self, tool_path, name):
+        return self.__loader(tool_path, name)
+
+
+class Workload:
+    def __init__(self, name, setup):
+        self.name = name
+        self.__setup = setup
+
+    def prepare(self, env):
+        # returns the callable being timed
+        return self.__setup(env)
+
+
+def _cjk_text(n_chars):
+    seed = ("天地玄黄，宇宙洪荒。日月盈昃，辰宿列张。寒来暑往，秋收冬藏。"
+            "“闰余成岁”——律吕调阳…… 云腾致雨（露结为霜）；金生丽水、玉出昆冈！"
+            "Mixed latin words, numbers 1234 and punctuation. ")
+    return (seed * (n_chars // len(seed) + 1))[:n_chars]
+
+
+def _setup_bincalc(env):
+    calc = env.module("bincalc/main.py", "calc")
+
+    exprs = [
+        "0xffff000000001000 & 0xfff",
+        "hex, 0xffff000000001000",
+        "dec, (0x1 << 48) - 1",
+        "(0xdeadbeef >> 4) | 0xf0000000",
+        "A0 + A3",
+        "bin, 0x40000000000701",
+        "va, 0xffff800012345678",
+    ] * 50
+
+    def run():
+        with contextlib.redirect_stdout(None):
+            c = calc.BinaryCalculator()
+            for e in exprs:
+                c.eval(e)
+
+    return run
+
+
+def _setup_bincalc_sweep(vectorized):
+    # the same page table index formula over 4096 addresses, typed once per
+    # address or once over an array of all of them
+    formula = "(({}) >> 21) & 0x1ff"
+    base, n = 0xffff800000000000, 4096
+
+    def setup(env):
+        if vectorized and importlib.util.find_spec("numpy") is None:
+            return None
+
+        calc = env.module("bincalc/main.py", "calc")
+
+        if vectorized:
+            exprs = [f"range({base:#x}, {base + n * 0x200000:#x}, 0x200000)",
+                     formula.format("A0")]
+        else:
+            exprs = [formula.format(f"{base + i * 0x200000:#x}")
+                     for i in range(n)]
+
+        def run():
+            with contextlib.redirect_stdout(None):
+                c = calc.BinaryCalculator()
+                for e in exprs:
+                    c.eval(e)
+
+        return run
+
+    return setup
+
+
+def _setup_ptdump(env):
+    if importlib.util.find_spec("numpy") is None:
+        return None
+
+    import numpy as np
+
+    # 16 MiB of arm64 level 3 pages, one in seven entries empty
+    rng = np.random.default_rng(0)
+    ptes = rng.integers(0, 1 << 40, size=2 << 20, dtype=np.uint64)
+    ptes = (ptes & np.uint64(0xfffffffff000)) | np.uint64(0x0060000000000703)
+    ptes[::7] = 0
+
+    dump = env.tmpdir / "ptdump.bin"
+    ptes.astype("<u8").tofile(dump)
+
+    calc = env.module("bincalc/main.py", "calc")
+
+    def run():
+        with contextlib.redirect_stdout(None):
+            calc.BinaryCalculator().eval(f"ptdump, '{dump}', 3")
+
+    return run
+
+
+def _setup_xlate(env):
+    if importlib.util.find_spec("numpy") is None:
+        return None
+
+    import numpy as np
+
+    # arm64 4k tables mapping 256 MiB of pages from VA 0, and a trace of
+    # 1M addresses in it
+    base = 0x40000000
+    l3 = 128
+    img = np.zeros((3 + l3) * 512, dtype=np.uint64)
+    img[0] = (base + 0x1000) | 3
+    img[512] = (base + 0x2000) | 3
+    img[1024:1024 + l3] = (base + 0x3000 + np.arange(l3, dtype=np.uint64) * 0x1000) | 3
+    img[1536:] = (np.uint64(0x80000000) + np.arange(l3 * 512, dtype=np.uint64) * 0x1000) | 0x403
+
+    image = env.tmpdir / "ptimg.bin"
+    img.astype("<u8").tofile(image)
+
+    rng = np.random.default_rng(0)
+    trace = env.tmpdir / "trace.npy"
+    np.save(trace, rng.integers(0, l3 << 21, size=1 << 20, dtype=np.uint64))
+
+    calc = env.module("bincalc/main.py", "calc")
+
+    def run():
+        with contextlib.redirect_stdout(None):
+            c = calc.BinaryCalculator()
+            c.eval(f"ptimg, '{image}', {base:#x}, {base:#x}")
+            c.eval(f"load, '{trace}'")
+            c.eval("xlate, A1")
+
+    return run
+
+
+def _setup_va_trace(env):
+    if importlib.util.find_spec("numpy") is None:
+        return None
+
+    import numpy as np
+
+    # 2M addresses spread over 64 GiB, as a text trace
+    rng = np.random.default_rng(0)
+    trace = env.tmpdir / "va_trace.txt"
+    trace.write_text("\n".join(hex(x) for x in
+                                rng.integers(0, 1 << 36, size=2 << 20).tolist()))
+
+    calc = env.module("bincalc/main.py", "calc")
+
+    def run():
+        with contextlib.redirect_stdout(None):
+            calc.BinaryCalculator().eval(f"va_trace, '{trace}'")
+
+    return run
+
+
+def _setup_tlbsim(env):
+    if importlib.util.find_spec("numpy") is None:
+        return None
+
+    import numpy as np
+
+    # 4M accesses wandering over a 2 GiB heap
+    rng = np.random.default_rng(0)
+    steps = rng.integers(-4096, 8192, size=4 << 20)
+    trace = env.tmpdir / "tlbsim.npy"
+    np.save(trace, (np.cumsum(steps) % (2 << 30)).astype(np.uint64))
+
+    calc = env.module("bincalc/main.py", "calc")
+
+    def run():
+        with contextlib.redirect_stdout(None):
+            calc.BinaryCalculator().eval(f"tlbsim, '{trace}'")
+
+    return run
+
+
+def _setup_ptbuild(env):
+    if importlib.util.find_spec("numpy") is None:
+        return None
+
+    # 4 TiB in 2M blocks, the PAs not aligned enough for 1G ones
+    spec = env.tmpdir / "ptbuild.txt"
+    spec.write_text("\n".join(f"{(1 + i) << 40:#x} 1T {(i << 40) + (2 << 20):#x} AF=1"
+                               for i in range(4)))
+    image = env.tmpdir / "ptbuild.bin"
+
+    calc = env.module("bincalc/main.py", "calc")
+
+    def run():
+        with contextlib.redirect_stdout(None):
+            calc.BinaryCalculator().eval(f"ptbuild, '{spec}', '{image}'")
+
+    return run
+
+
+def _setup_sysreg_suggest(env):
+    calc = env.module("bincalc/main.py", "calc")
+
+    # misses, answered with suggestions
+    exprs = [f"sysreg, '{x}'" for x in
+             ("SCTLR_EL9", "TCR", "DBGBCR5_EL1", "GICD_ICFGR3", "ERR3MISC3")] * 20
+    exprs += [f"sysfeat, '{x}'" for x in ("FEAT_LPA3", "FEAT_XX")] * 20
+
+    c = calc.BinaryCalculator()
+
+    # printed through the pydoc pager, which needs a real stream
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            for e in exprs:
+                c.eval(e)
+
+    return run
+
+
+def _setup_wrap(env):
+    breaker = env.module("littools/diff.py", "breaker")
+    text = _cjk_text(100000)
+
+    return lambda: breaker.wrap_text(text, 24)
+
+
+def _setup_sc2tc(env):
+    tt = env.module("littools/to_traditional.py", "to_traditional")
+
+    files = []
+    for i in range(20):
+        p = env.tmpdir / "sc2tc" / f"chapter{i}.tex"
+        p.parent.mkdir(parents=True, exist_ok=True)
+        p.write_text(_cjk_text(20000), encoding="utf-8")
+        files.append(p)
+
+    def run():
+        stmap = tt.get_stmap()
+        for f in files:
+            tt.convert(stmap, f)
+
+    return run
+
+
+def _synthetic_latexml(chapters=8, sections=6, paras=10):
+    body = []
+    text = _cjk_text(400)
+
+    for c in range(chapters):
+        body.append(f'<chapter xml:id="C{c}"><title>Chapter {c}</title>')
+        for s in range(sections):
+            body.append(f'<section xml:id="S{c}.{s}"><title>Section {s}</title>')
+            for _ in range(paras):
+                body.append(f'<para><p>{text}<text font="italic">{text[:20]}</text>'
+                            f'{text}</p></para>')
+            body.append('</section>')
+        body.append('</chapter>')
+
+    return "<document><title>Synthetic</title>" + "".join(body) + "</document>"
+
+
+def _setup_render(env):
+    render = env.module("littools/render.py", "render")
+
+    from xml.dom.minidom import parseString
+    doc = parseString(_synthetic_latexml()).documentElement
+
+    args = Namespace(fmt="txt", width=24, out=env.tmpdir / "render.txt")
+
+    def run():
+        with contextlib.redirect_stdout(None):
+            render.render(doc, args)
+
+    return run
+
+
+def _schema_checks(env):
+    import ast
+    import typing
+
+    schmea = env.module("bincalc/main.py", "lib.schmea")
+    Schema, Optional = schmea.Schema, schmea.Optional
+    ObjectSchema, UnionSchema = schmea.ObjectSchema, schmea.UnionSchema
+    PartialList, ElementAt = schmea.PartialList, schmea.ElementAt
+
+    nodes = []
+    for expr in ["pte, A3, 3", "hex, (0x1 << 48) - 1", "va, f(0x1000) + A0",
+                 "set, 'arch:va_bits', 39", "sysreg, 'TTBR0_EL1'"]:
+        nodes += ast.walk(ast.parse(expr, mode='eval'))
+
+    # shaped after the command arguments, config values and syntax trees
+    # checked by bincalc
+    return [
+        (Schema([int, str, Optional(Schema(int))]), [[1, "a"], [1, 2], ["x"]]),
+        (Schema([typing.Any, int]), [[None, 3], [1, "a"]]),
+        (UnionSchema("hex", "bin", "dec"), ["dec", "oct"]),
+        (Schema(int), [48, "48"]),
+        (ObjectSchema(ast.Tuple, elts=PartialList(ElementAt(0, ast.Name))), nodes),
+        (ObjectSchema(ast.Call, func=ast.Name), nodes),
+        (ObjectSchema(ast.Name, id=str), nodes),
+    ]
+
+
+def _setup_schema(compiled):
+    def setup(env):
+        checks = []
+        for schema, values in _schema_checks(env):
+            match = schema.compile() if compiled else schema.match
+            checks += [(match, v) for v in values]
+
+        def run():
+            for _ in range(200):
+                for match, v in checks:
+                    match(v)
+
+        return run
+
+    return setup
+
+
+WORKLOADS = [
+    Workload("bincalc-exprs", _setup_bincalc),
+    Workload("bincalc-sweep-scalar", _setup_bincalc_sweep(False)),
+    Workload("bincalc-sweep-array", _setup_bincalc_sweep(True)),
+    Workload("bincalc-ptdump", _setup_ptdump),
+    Workload("bincalc-xlate", _setup_xlate),
+    Workload("bincalc-va-trace", _setup_va_trace),
+    Workload("bincalc-tlbsim", _setup_tlbsim),
+    Workload("bincalc-ptbuild", _setup_ptbuild),
+    Workload("bincalc-sysreg-suggest", _setup_sysreg_suggest),
+    Workload("breaker-wrap-cjk", _setup_wrap),
+    Workload("sc2tc-convert", _setup_sc2tc),
+    Workload("render-latexml", _setup_render),
+    Workload("schema-match", _setup_schema(False)),
+    Workload("schema-compiled", _setup_schema(True)),
+]
+
+
+def _timed_run(cmd, env):
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, env=env,
+                            stdin=subprocess.DEVNULL,
+                            stdout=subprocess.DEVNULL,
+                            stderr=subprocess.DEVNULL)
+
+    _, status, usage = os.wait4(proc.pid, 0)
+    elapsed = time.perf_counter() - start
+
+    proc.returncode = os.waitstatus_to_exitcode(status)
+
+    # ru_maxrss is in KiB on linux
+    return elapsed, usage.ru_maxrss
+
+
+class Bench:
+    def __init__(self, gateway, scripts, module_loader, repeat=5, pattern="*"):
+        self.__gateway = gateway
+        self.__scripts = scripts
+        self.__loader = module_loader
+        self.__repeat = repeat
+        self.__pattern = pattern
+        self.metrics = {}
+
+    def __selected(self, name):
+        return fnmatch.fnmatch(name, self.__pattern)
+
+    def __record(self, name, samples, unit):
+        self.metrics[name] = {
+            "value": statistics.median(samples),
+            "min": min(samples),
+            "unit": unit
+        }
+        print(f"    {name:<40} {statistics.median(samples):>12.4f} {unit}")
+
+    def __bench_start(self, script):
+        cold_name = f"start/{script}/cold"
+        warm_name = f"start/{script}/warm"
+        if not (self.__selected(cold_name) or self.__selected(warm_name)):
+            return
+
+        cmd = [sys.executable, self.__gateway, script, "--", "--help"]
+        env = {**os.environ, "PYTOOL_NO_DAEMON": "1"}
+
+        cold, warm, rss = [], [], []
+        for _ in range(self.__repeat):
+            with tempfile.TemporaryDirectory() as cache:
+                env["PYTOOL_CACHE_DIR"] = cache
+                elapsed, _ = _timed_run(cmd, env)
+                cold.append(elapsed)
+
+                # populated code cache from here on
+                for _ in range(2):
+                    elapsed, maxrss = _timed_run(cmd, env)
+                warm.append(elapsed)
+                rss.append(maxrss)
+
+        self.__record(cold_name, cold, "s")
+        self.__record(warm_name, warm, "s")
+        self.__record(f"rss/{script}", rss, "KiB")
+
+    def __bench_workload(self, workload, tmpdir):
+        name = f"workload/{workload.name}"
+        if not self.__selected(name):
+            return
+
+        run = workload.prepare(BenchEnv(self.__loader, tmpdir))
+        if run is None:
+            # an optional dependency of the workload is missing
+            return
+        run()
+
+        samples = []
+        for _ in range(self.__repeat):
+            start = time.perf_counter()
+            run()
+            samples.append(time.perf_counter() - start)
+
+        self.__record(name, samples, "s")
+
+    def run(self):
+        print("START-UP")
+        for script in self.__scripts:
+            self.__bench_start(script)
+
+        print()
+        print("WORKLOADS")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for workload in WORKLOADS:
+                self.__bench_workload(workload, tmpdir)
+
+        return {
+            "meta": {
+                "python": sys.version.split()[0],
+                "platform": platform.platform(),
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "repeat": self.__repeat
+            },
+            "metrics": self.metrics
+        }
+
+
+def parse_thresholds(specs, default=0.10):
+    """
+        Each spec is either FRACTION, the default allowed slowdown, or
+        PATTERN=FRACTION applying to metrics matching the glob PATTERN.
+    """
+
+    rules = []
+    for spec in specs or []:
+        if "=" in spec:
+            pattern, frac = spec.split("=", 1)
+            rules.append((pattern, float(frac)))
+        else:
+            default = float(spec)
+
+    def lookup(name):
+        for pattern, frac in rules:
+            if fnmatch.fnmatch(name, pattern) or name.startswith(pattern):
+                return frac
+        return default
+
+    return lookup
+
+
+def compare(results, baseline, threshold_of):
+    regressions = []
+
+    print()
+    print("COMPARED TO BASELINE")
+    for name, metric in results["metrics"].items():
+        base = baseline.get("metrics", {}).get(name)
+        if base is None or not base["value"]:
+            continue
+
+        ratio = metric["value"] / base["value"]
+        limit = threshold_of(name)
+        flag = ""
+        if ratio > 1 + limit:
+            flag = f"REGRESSION (> +{limit:.0%})"
+            regressions.append(name)
+
+        print(f"    {name:<40} {ratio - 1:>+8.1%}  {flag}")
+
+    return regressions
+
+
+def save(results, path):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=4)
+
+
+def load(path):
+    with open(path, 'r') as f:
+        return json.load(f)
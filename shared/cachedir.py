@@ -0,0 +1,53 @@
+import os
+
+from pathlib import Path
+
+_created = set()
+
+
+def cache_root():
+    root = os.environ.get("PYTOOL_CACHE_DIR")
+    if root:
+        return Path(root)
+
+    xdg = os.environ.get("XDG_CACHE_HOME")
+    if xdg:
+        return Path(xdg) / "pytools"
+
+    return Path.home() / ".cache" / "pytools"
+
+
+def cache_disabled():
+    return os.environ.get("PYTOOL_NO_CACHE", "") not in ("", "0")
+
+
+def cache_dir(*parts):
+    path = cache_root().joinpath(*parts)
+
+    if path not in _created:
+        path.mkdir(parents=True, exist_ok=True)
+        _created.add(path)
+
+    return path
+
+
+def atomic_write(path, data):
+    """
+        Write `data` to `path` through a temporary file in the same
+        directory, so concurrent readers never observe a partial file.
+    """
+    import tempfile
+
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
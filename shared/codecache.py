@@ -0,0 +1,99 @@
+import os
+import sys
+import zlib
+import struct
+import marshal
+
+from importlib.util import MAGIC_NUMBER
+
+from .cachedir import cache_dir, cache_disabled, atomic_write
+
+# magic, source mtime (ns), source size
+_header = struct.Struct("<4sqq")
+
+
+class CodeCache:
+    """
+        On-disk cache of marshalled code objects for sources that are
+        compiled outside of the standard `.pyc` machinery. An entry is
+        keyed by the absolute source path (recorded in the entry header)
+        and is considered stale once the interpreter magic, source mtime or
+        source size changes.
+    """
+
+    def __init__(self, subdir="bytecode"):
+        self.__subdir = subdir
+        self.__dir = None
+        self.__memo = {}
+
+    def __entry(self, filename):
+        if self.__dir is None:
+            self.__dir = cache_dir(self.__subdir)
+
+        key = zlib.crc32(filename.encode("utf-8", "surrogateescape"))
+        return self.__dir / f"{os.path.basename(filename)}.{key:08x}.bin"
+
+    def __try_load(self, entry, stamp):
+        try:
+            with open(entry, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+
+        if not data.startswith(stamp):
+            return None
+
+        try:
+            return marshal.loads(memoryview(data)[len(stamp):])
+        except (EOFError, ValueError, TypeError):
+            return None
+
+    def __try_store(self, entry, stamp, co):
+        if sys.dont_write_bytecode:
+            return
+
+        try:
+            atomic_write(entry, stamp + marshal.dumps(co))
+        except OSError:
+            pass
+
+    def compile(self, filename):
+        filename = os.path.abspath(filename)
+
+        with open(filename, 'rb') as f:
+            st = os.fstat(f.fileno())
+            stamp = _header.pack(MAGIC_NUMBER, st.st_mtime_ns, st.st_size)
+            stamp += filename.encode("utf-8", "surrogateescape") + b"\0"
+
+            memo = self.__memo.get(filename)
+            if memo is not None and memo[0] == stamp:
+                return memo[1]
+
+            if cache_disabled():
+                return compile(f.read(), filename, 'exec')
+
+            try:
+                entry = self.__entry(filename)
+            except OSError:
+                # no usable cache directory
+                return compile(f.read(), filename, 'exec')
+
+            co = self.__try_load(entry, stamp)
+            if co is None:
+                co = compile(f.read(), filename, 'exec')
+                self.__try_store(entry, stamp, co)
+
+        self.__memo[filename] = (stamp, co)
+        return co
+
+
+_code_cache = CodeCache()
+
+
+def compile_file(filename):
+    # members of a bundle archive come with their bytecode
+    precompiled = getattr(filename, "precompiled", None)
+    if precompiled is not None:
+        return precompiled()
+
+    return _code_cache.compile(str(filename))
@@ -2,3 +2,5 @@ class Context:
     LocalFiles = _localRes_
     WorkingFiles = _cwdRes_
     GlobalValueTable = _gvt_
+    Tracer = _tracer_
+    Cache = _cache_
@@ -0,0 +1,240 @@
+import os
+import sys
+import json
+import signal
+import socket
+import struct
+
+# request: payload length, followed by a json payload (fds ride on the
+#          length header)
+# reply:   a tag byte and a value. 'P' carries the pid of the worker
+#          serving the request, 'X' its exit status
+_req_header = struct.Struct("!I")
+_reply = struct.Struct("!ci")
+
+_forwarded_signals = [
+    signal.SIGINT, signal.SIGTERM, signal.SIGHUP,
+    signal.SIGQUIT, signal.SIGWINCH
+]
+
+
+def socket_path():
+    path = os.environ.get("PYTOOL_SOCK")
+    if path:
+        return path
+
+    runtime = os.environ.get("XDG_RUNTIME_DIR") or "/tmp"
+    return os.path.join(runtime, f"pytools-{os.getuid()}.sock")
+
+
+def _recv_exact(conn, n):
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = conn.recv(n - len(buf))
+        if not chunk:
+            raise EOFError("connection closed")
+        buf += chunk
+    return bytes(buf)
+
+
+def _exit_code(e):
+    code = e.code
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+
+    print(code, file=sys.stderr)
+    return 1
+
+
+class ForkServer:
+    """
+        Pre-initialised parent process listening on a unix socket. Each
+        connection is served by a forked child which adopts the client's
+        stdio, working directory, environment and argv, and reports the
+        exit status back when the handler returns.
+    """
+
+    def __init__(self, path, handler):
+        self.__path = path
+        self.__handler = handler
+        self.__sock = None
+
+    def __reap(self, *args):
+        while True:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+
+    def __terminate(self, *args):
+        raise SystemExit(0)
+
+    def __bind(self):
+        if os.path.exists(self.__path):
+            os.unlink(self.__path)
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        old_mask = os.umask(0o177)
+        try:
+            sock.bind(self.__path)
+        finally:
+            os.umask(old_mask)
+
+        sock.listen(64)
+        return sock
+
+    def serve_forever(self):
+        self.__sock = self.__bind()
+
+        signal.signal(signal.SIGCHLD, self.__reap)
+        signal.signal(signal.SIGTERM, self.__terminate)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+        try:
+            while True:
+                conn, _ = self.__sock.accept()
+
+                pid = os.fork()
+                if pid == 0:
+                    self.__serve_child(conn)
+
+                conn.close()
+        finally:
+            self.__sock.close()
+            try:
+                os.unlink(self.__path)
+            except OSError:
+                pass
+
+    def __adopt_stdio(self, fds):
+        for target, fd in enumerate(fds):
+            os.dup2(fd, target)
+            os.close(fd)
+
+        sys.stdin = open(0, 'r', closefd=False)
+        sys.stdout = open(1, 'w', closefd=False)
+        sys.stderr = open(2, 'w', buffering=1, closefd=False)
+
+    def __serve_child(self, conn):
+        self.__sock.close()
+
+        for sig in [signal.SIGCHLD, signal.SIGTERM, signal.SIGHUP]:
+            signal.signal(sig, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+
+        code = 1
+        try:
+            header, fds, _, _ = socket.recv_fds(conn, _req_header.size, 3)
+            (length, ) = _req_header.unpack(header)
+            request = json.loads(_recv_exact(conn, length))
+
+            self.__adopt_stdio(fds)
+            conn.sendall(_reply.pack(b'P', os.getpid()))
+
+            code = self.__dispatch(request)
+        except SystemExit as e:
+            code = _exit_code(e)
+        except BaseException:
+            import traceback
+            traceback.print_exc()
+        finally:
+            for f in [sys.stdout, sys.stderr]:
+                try:
+                    f.flush()
+                except Exception:
+                    pass
+
+            try:
+                conn.sendall(_reply.pack(b'X', code))
+            except OSError:
+                pass
+
+            os._exit(code)
+
+    def __dispatch(self, request):
+        op = request.get("op", "run")
+
+        if op == "ping":
+            print(f"pytools daemon running (pid {os.getppid()}, {self.__path})")
+            return 0
+
+        if op == "stop":
+            os.kill(os.getppid(), signal.SIGTERM)
+            print("pytools daemon stopped")
+            return 0
+
+        os.chdir(request["cwd"])
+        os.environ.clear()
+        os.environ.update(request["env"])
+
+        try:
+            self.__handler(request["argv"])
+        except SystemExit as e:
+            return _exit_code(e)
+
+        return 0
+
+
+def request(path, op, argv=[]):
+    """
+        Submit a request to the fork server at `path`, lending it our
+        stdio. Returns the exit status of the served request, raises
+        OSError if the server cannot be reached.
+    """
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(path)
+
+    payload = json.dumps({
+        "op": op,
+        "argv": argv,
+        "cwd": os.getcwd(),
+        "env": dict(os.environ)
+    }).encode()
+
+    socket.send_fds(sock, [_req_header.pack(len(payload))], [0, 1, 2])
+    sock.sendall(payload)
+
+    worker = None
+
+    def forward(sig, frame):
+        if worker is not None:
+            os.kill(worker, sig)
+
+    for sig in _forwarded_signals:
+        signal.signal(sig, forward)
+
+    try:
+        while True:
+            tag, val = _reply.unpack(_recv_exact(sock, _reply.size))
+            if tag == b'P':
+                worker = val
+            elif tag == b'X':
+                return val
+    except EOFError:
+        return 1
+    finally:
+        sock.close()
+
+
+def main():
+    # client side, invoked by the pytools wrapper as
+    #       python3 -S forkserver.py GATEWAY SOCKET ARGS...
+    # falls back to a regular gateway run if the server is unreachable
+
+    gateway, path, *argv = sys.argv[1:]
+
+    try:
+        code = request(path, "run", argv)
+    except OSError:
+        os.execv(sys.executable, [sys.executable, gateway, *argv])
+
+    sys.exit(code)
+
+
+if __name__ == "__main__":
+    main()
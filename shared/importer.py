@@ -1,59 +1,207 @@
 import os
 import os.path
+import sys
 
-from importlib.abc import Loader, MetaPathFinder
-from importlib.util import spec_from_file_location
+from importlib.util import spec_from_file_location, LazyLoader
 
-class ExtendableImporter(MetaPathFinder):
-    def __init__(self, common_global, base_path=None):
-        super().__init__()
+from .codecache import compile_file
+
+
+class DirIndex:
+    """
+        Listing of the importable entries of a directory, rebuilt only
+        when the directory mtime changes
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.__mtime = None
+        self.__entries = {}
+
+    def __refresh(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime = None
+
+        if mtime == self.__mtime:
+            return
+
+        entries = {}
+        if mtime is not None:
+            with os.scandir(self.path) as it:
+                for entry in it:
+                    self.__add_entry(entries, entry)
+
+        self.__mtime = mtime
+        self.__entries = entries
+
+    def __add_entry(self, entries, entry):
+        name = entry.name
+
+        if entry.is_dir():
+            init = os.path.join(entry.path, "__init__.py")
+            if os.path.exists(init):
+                entries[name] = (init, [entry.path])
+            return
+
+        if name.endswith(".py"):
+            entries.setdefault(name[:-3], (entry.path, None))
+
+    def lookup(self, name):
+        self.__refresh()
+        return self.__entries.get(name)
+
+
+class ArchiveIndex:
+    """
+        Listing of the importable entries of a directory within a bundle
+        archive, which never changes
+    """
+
+    def __init__(self, directory):
+        self.path = os.path.abspath(directory)
+        self.__entries = {}
+
+        for entry in directory.iterdir():
+            name = entry.name
+            if entry.is_dir():
+                init = entry / "__init__.py"
+                if init.exists():
+                    self.__entries[name] = (init, [os.path.join(self.path, name)])
+            elif name.endswith(".py"):
+                self.__entries[name[:-3]] = (entry, None)
+
+    def lookup(self, name):
+        return self.__entries.get(name)
+
+
+def open_index(path):
+    if not os.path.isdir(path):
+        from .archive import archive_path
+
+        member = archive_path(path)
+        if member is not None and member.is_dir():
+            return ArchiveIndex(member)
 
+    return DirIndex(path)
+
+
+class ExtendableImporter:
+    # implements the MetaPathFinder protocol, deliberately not derived from
+    # importlib.abc which is expensive to import
+    def __init__(self, common_global, base_path=None):
         self._global = common_global
         self.__path  = os.getcwd() if base_path is None else base_path
 
-    def find_spec(self, fullname, path, target=None):
-        if path is None or path == "":
-            path = []
-
-        path.append(self.__path)
-        for p in self.search_paths():
-            path.append(p)
-        
-        if "." in fullname:
-            *parents, name = fullname.split(".")
-        else:
-            resolved = self.resolve(fullname, path, target)
-            if resolved is not None:
-                path, name = resolved
-            else:
-                name = fullname
-
+        self.__indices = {}
+        self.__roots = None
+        self.__aliases = None
+        self.__lazy = None
+
+    def __index(self, path):
+        path = os.path.abspath(path)
+        index = self.__indices.get(path)
+        if index is None:
+            index = open_index(path)
+            self.__indices[path] = index
+        return index
+
+    def __root_indices(self):
+        if self.__roots is None:
+            roots = []
+            for p in [self.__path, *self.search_paths()]:
+                index = self.__index(p)
+                if index not in roots:
+                    roots.append(index)
+            self.__roots = roots
+
+        return self.__roots
+
+    def __alias_entries(self):
+        if self.__aliases is None:
+            aliases = {}
+            for name, target in self.aliases().items():
+                parent, entry = os.path.split(os.path.normpath(target))
+                if entry.endswith(".py"):
+                    entry = entry[:-3]
+
+                found = self.__index(parent).lookup(entry)
+                if found is not None:
+                    aliases[name] = found
+            self.__aliases = aliases
+
+        return self.__aliases
+
+    def __owns(self, package, path):
+        module = sys.modules.get(package)
+        spec = getattr(module, "__spec__", None)
+        if isinstance(getattr(spec, "loader", None), MyLoader):
+            return True
+
+        # packages imported regularly from within our roots (e.g. the
+        # gateway's own `shared`) still have their submodules served here
         for entry in path:
-            if os.path.isdir(os.path.join(entry, name)):
-                filename = os.path.join(entry, name, "__init__.py")
-                submodule_locations = [os.path.join(entry, name)]
-            else:
-                filename = os.path.join(entry, name + ".py")
-                submodule_locations = None
+            entry = os.path.abspath(entry)
+            for index in self.__root_indices():
+                if entry == index.path or entry.startswith(index.path + os.sep):
+                    return True
+
+        return False
+
+    def __make_spec(self, fullname, found):
+        filename, locations = found
+        loader = MyLoader(filename, self._global)
 
-            if not os.path.exists(filename):
-                continue
+        if self.__lazy is None:
+            self.__lazy = set(self.lazy_modules())
 
-            return spec_from_file_location(
-                        fullname, filename,
-                        loader=MyLoader(filename, self._global),
-                        submodule_search_locations=submodule_locations)
+        if fullname in self.__lazy:
+            loader = LazyLoader(loader)
+
+        return spec_from_file_location(
+                    fullname, os.fspath(filename),
+                    loader=loader,
+                    submodule_search_locations=locations)
+
+    def find_spec(self, fullname, path, target=None):
+        parent, _, name = fullname.rpartition(".")
+
+        if parent:
+            # submodules are only ours if their package is
+            if not path or not self.__owns(parent, path):
+                return None
+            indices = [self.__index(p) for p in path]
+        else:
+            found = self.__alias_entries().get(name)
+            if found is not None:
+                return self.__make_spec(fullname, found)
+            indices = self.__root_indices()
+
+        for index in indices:
+            found = index.lookup(name)
+            if found is not None:
+                return self.__make_spec(fullname, found)
 
         return None
 
+    def invalidate_caches(self):
+        self.__indices.clear()
+        self.__roots = None
+        self.__aliases = None
+        self.__lazy = None
+
     def search_paths(self):
         return []
 
-    def resolve(self, fullname, path, target):
-        return None
+    def aliases(self):
+        return {}
+
+    def lazy_modules(self):
+        return []
 
 
-class MyLoader(Loader):
+class MyLoader:
     def __init__(self, filename, common_global):
         self.filename = filename
         self.__g = common_global
@@ -62,11 +210,8 @@ class MyLoader(Loader):
         return None
 
     def exec_module(self, module):
-        with open(self.filename) as f:
-            data = f.read()
+        co = compile_file(self.filename)
 
         v = vars(module)
         v.update(self.__g)
-        co = compile(data, self.filename, mode='exec')
         exec(co, v)
-
@@ -0,0 +1,85 @@
+import re
+
+# emitted by `python -X importtime`, nested imports are reported before
+# their importer and indented by two spaces per level
+_importtime_line = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S.*)$")
+
+
+class ImportNode:
+    def __init__(self, name, self_us, cumulative_us):
+        self.name = name
+        self.self_us = self_us
+        self.cumulative_us = cumulative_us
+        self.children = []
+
+
+class ImportProfile:
+    def __init__(self):
+        self.__pending = {}
+
+    def feed(self, line):
+        """
+            Consume a line of `-X importtime` output, returns False if
+            the line is not part of the report.
+        """
+
+        if not line.startswith("import time:"):
+            return False
+
+        m = _importtime_line.match(line.rstrip("\n"))
+        if not m:
+            # the column header
+            return True
+
+        depth = len(m.group(3)) // 2
+        node = ImportNode(m.group(4), int(m.group(1)), int(m.group(2)))
+        node.children = self.__pending.pop(depth + 1, [])
+        self.__pending.setdefault(depth, []).append(node)
+
+        return True
+
+    def roots(self):
+        return self.__pending.get(0, [])
+
+    def total_us(self):
+        return sum([x.cumulative_us for x in self.roots()])
+
+    def __walk(self, nodes):
+        for node in nodes:
+            yield node
+            yield from self.__walk(node.children)
+
+    def report(self, min_ms=0.5, top=15):
+        lines = []
+        min_us = min_ms * 1000
+
+        def fmt(us):
+            return f"{us / 1000:>9.2f}"
+
+        def emit(nodes, depth):
+            nodes = sorted(nodes, key=lambda x: x.cumulative_us, reverse=True)
+            for node in nodes:
+                if node.cumulative_us < min_us:
+                    continue
+
+                indent = "  " * depth
+                lines.append(f"{fmt(node.cumulative_us)} {fmt(node.self_us)}   "
+                             f"{indent}{node.name}")
+                emit(node.children, depth + 1)
+
+        lines.append("IMPORT TREE (ms)")
+        lines.append(f"{'cumulative':>9} {'self':>9}   module")
+        emit(self.roots(), 0)
+
+        lines.append("")
+        lines.append(f"TOP {top} BY SELF TIME (ms)")
+
+        nodes = sorted(self.__walk(self.roots()),
+                       key=lambda x: x.self_us, reverse=True)
+        for node in nodes[:top]:
+            lines.append(f"{fmt(node.self_us)}   {node.name}")
+
+        lines.append("")
+        lines.append(f"total import time: {self.total_us() / 1000:.2f} ms")
+
+        return "\n".join(lines)
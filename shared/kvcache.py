@@ -0,0 +1,252 @@
+import time
+import pickle
+import hashlib
+import functools
+
+from .cachedir import cache_dir, cache_disabled
+
+# size bound of the store before least recently used entries are evicted
+DEFAULT_MAX_BYTES = 64 * 2**20
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    ns      TEXT NOT NULL,
+    key     TEXT NOT NULL,
+    value   BLOB NOT NULL,
+    size    INTEGER NOT NULL,
+    atime   REAL NOT NULL,
+    PRIMARY KEY (ns, key)
+);
+CREATE INDEX IF NOT EXISTS entries_atime ON entries (atime);
+CREATE TABLE IF NOT EXISTS counters (
+    ns      TEXT PRIMARY KEY,
+    hits    INTEGER NOT NULL DEFAULT 0,
+    misses  INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+_MISSING = object()
+
+
+def key_of(*parts):
+    """
+        Content hash of `parts`, anything picklable
+    """
+
+    data = pickle.dumps(parts, protocol=4)
+    return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+
+class KVCache:
+    """
+        Disk backed key-value store shared by all tools and processes.
+        Values are pickled into an sqlite database; every operation is a
+        transaction, so concurrent invocations never see partial writes.
+        Once the stored values exceed `max_bytes`, the least recently used
+        entries are evicted. Any database failure degrades to a miss, as
+        does a value that no longer unpickles; without a usable cache
+        directory the cache disables itself.
+    """
+
+    def __init__(self, path=None, max_bytes=DEFAULT_MAX_BYTES, enabled=True):
+        self.enabled = enabled
+        self.__path = path
+        self.__max = max_bytes
+        self.__db = None
+        self.__counters = {}
+
+    def __conn(self):
+        if self.__db is None:
+            import sqlite3
+
+            try:
+                path = self.__path or cache_dir() / "kvcache.sqlite3"
+            except OSError:
+                self.enabled = False
+                raise
+
+            db = sqlite3.connect(path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.executescript(_SCHEMA)
+            self.__db = db
+
+        return self.__db
+
+    def __count(self, ns, hit):
+        counter = self.__counters.setdefault(ns, [0, 0])
+        counter[0 if hit else 1] += 1
+
+    def get(self, ns, key, default=None):
+        if not self.enabled:
+            return default
+
+        import sqlite3
+
+        try:
+            db = self.__conn()
+            row = db.execute("SELECT value FROM entries WHERE ns = ? AND key = ?",
+                             (ns, key)).fetchone()
+            if row is not None:
+                db.execute("UPDATE entries SET atime = ? WHERE ns = ? AND key = ?",
+                           (time.time(), ns, key))
+        except (sqlite3.Error, OSError):
+            row = None
+
+        if row is not None:
+            try:
+                value = pickle.loads(row[0])
+            except Exception:
+                # written by an incompatible version, or corrupt
+                self.__drop(ns, key)
+                row = None
+
+        self.__count(ns, row is not None)
+        if row is None:
+            return default
+
+        return value
+
+    def __drop(self, ns, key):
+        import sqlite3
+
+        try:
+            self.__conn().execute("DELETE FROM entries WHERE ns = ? AND key = ?",
+                                  (ns, key))
+        except sqlite3.Error:
+            pass
+
+    def put(self, ns, key, value):
+        if not self.enabled:
+            return
+
+        import sqlite3
+
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.__max:
+            return
+
+        try:
+            db = self.__conn()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                           (ns, key, data, len(data), time.time()))
+                self.__evict(db)
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        except (sqlite3.Error, OSError):
+            pass
+
+    def __evict(self, db):
+        total = db.execute("SELECT total(size) FROM entries").fetchone()[0]
+        excess = total - self.__max
+        if excess <= 0:
+            return
+
+        victims = []
+        for ns, key, size in db.execute(
+                "SELECT ns, key, size FROM entries ORDER BY atime"):
+            victims.append((ns, key))
+            excess -= size
+            if excess <= 0:
+                break
+
+        db.executemany("DELETE FROM entries WHERE ns = ? AND key = ?", victims)
+
+    def memoize(self, ns, key=None, version=0):
+        """
+            Decorator caching the results of a deterministic function under
+            namespace `ns`. By default the arguments themselves are hashed;
+            `key` maps the arguments to what identifies the result instead.
+            Bump `version` whenever the function changes its output.
+        """
+
+        def decorator(fn):
+            if not self.enabled:
+                return fn
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if key is not None:
+                    parts = key(*args, **kwargs)
+                else:
+                    parts = (args, sorted(kwargs.items()))
+
+                k = key_of(version, parts)
+                value = self.get(ns, k, _MISSING)
+                if value is _MISSING:
+                    value = fn(*args, **kwargs)
+                    self.put(ns, k, value)
+                return value
+
+            return wrapper
+
+        return decorator
+
+    def flush(self):
+        """
+            Add the hits and misses of this process to the persistent
+            counters
+        """
+
+        if not self.__counters or self.__db is None:
+            return
+
+        import sqlite3
+
+        try:
+            self.__db.executemany(
+                "INSERT INTO counters VALUES (?, ?, ?) ON CONFLICT (ns) DO " +
+                "UPDATE SET hits = hits + excluded.hits, " +
+                "misses = misses + excluded.misses",
+                [(ns, h, m) for ns, (h, m) in self.__counters.items()])
+        except sqlite3.Error:
+            return
+
+        self.__counters.clear()
+
+    def stats(self):
+        db = self.__conn()
+
+        stats = {}
+        for ns, n, size in db.execute(
+                "SELECT ns, count(*), total(size) FROM entries GROUP BY ns"):
+            stats[ns] = { "entries": n, "bytes": int(size), "hits": 0, "misses": 0 }
+
+        for ns, hits, misses in db.execute("SELECT ns, hits, misses FROM counters"):
+            entry = stats.setdefault(ns, { "entries": 0, "bytes": 0 })
+            entry["hits"] = hits
+            entry["misses"] = misses
+
+        for ns, (hits, misses) in self.__counters.items():
+            entry = stats.setdefault(ns, { "entries": 0, "bytes": 0,
+                                           "hits": 0, "misses": 0 })
+            entry["hits"] += hits
+            entry["misses"] += misses
+
+        return stats
+
+    def clear(self, ns=None):
+        db = self.__conn()
+        if ns is None:
+            db.execute("DELETE FROM entries")
+            db.execute("DELETE FROM counters")
+        else:
+            db.execute("DELETE FROM entries WHERE ns = ?", (ns,))
+            db.execute("DELETE FROM counters WHERE ns = ?", (ns,))
+        db.execute("VACUUM")
+
+
+_default = None
+
+
+def default_cache():
+    global _default
+
+    if _default is None:
+        _default = KVCache(enabled=not cache_disabled())
+
+    return _default
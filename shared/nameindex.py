@@ -0,0 +1,99 @@
+from bisect import bisect_left
+
+
+def _grams(s):
+    # trigrams of `s` padded at both ends, so that short names and the
+    # start and end of names have their own grams
+    s = f"^{s}$"
+    return {s[i:i + 3] for i in range(max(len(s) - 2, 1))}
+
+
+def _inner_grams(s):
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+
+class NameIndex:
+    """
+        Approximate lookup of names, case insensitive. Names sharing
+        trigrams with the query are found from an inverted index and
+        ranked by their trigram similarity (Dice coefficient); names
+        starting with or containing the query come first. Prefix
+        completion is a bisection of the sorted names.
+
+        The index is plain data and is meant to be built once, then kept
+        pickled next to what it names.
+    """
+
+    def __init__(self, names):
+        names = sorted(names, key=lambda x: (x.casefold(), x))
+
+        self.__names = names
+        self.__folded = [x.casefold() for x in names]
+        self.__sizes = []
+        self.__postings = {}
+
+        for i, name in enumerate(self.__folded):
+            grams = _grams(name)
+            self.__sizes.append(len(grams))
+            for g in grams:
+                self.__postings.setdefault(g, []).append(i)
+
+    def __len__(self):
+        return len(self.__names)
+
+    def __prefixed(self, prefix):
+        i = bisect_left(self.__folded, prefix)
+        while i < len(self.__folded) and self.__folded[i].startswith(prefix):
+            yield i
+            i += 1
+
+    def complete(self, prefix):
+        """
+            Names starting with `prefix`, in order
+        """
+
+        return [self.__names[i] for i in self.__prefixed(prefix.casefold())]
+
+    def similar(self, query, n=20, cutoff=0.5):
+        """
+            At most `n` names close to `query`, the best first: the exact
+            match, names starting with it, names containing it, then the
+            others by similarity down to `cutoff`
+        """
+
+        q = query.casefold()
+        grams = _grams(q)
+
+        common = {}
+        for g in grams:
+            for i in self.__postings.get(g, ()):
+                common[i] = common.get(i, 0) + 1
+
+        def score(i):
+            return 2 * common.get(i, 0) / (len(grams) + self.__sizes[i])
+
+        ranked = {}
+        for i in self.__prefixed(q):
+            ranked[i] = (0 if self.__folded[i] == q else 1, -score(i))
+
+        # a substring has every inner trigram of the query, short queries
+        # have none to filter with
+        inner = _inner_grams(q)
+        if inner:
+            candidates = set.intersection(
+                *(set(self.__postings.get(g, ())) for g in inner))
+        else:
+            candidates = range(len(self.__folded))
+
+        for i in candidates:
+            if i not in ranked and q in self.__folded[i]:
+                ranked[i] = (2, -score(i))
+
+        for i in common:
+            if i not in ranked:
+                s = score(i)
+                if s >= cutoff:
+                    ranked[i] = (3, -s)
+
+        best = sorted(ranked, key=lambda i: (ranked[i], i))[:n]
+        return [self.__names[i] for i in best]
@@ -0,0 +1,245 @@
+import os
+import sys
+import time
+import signal
+
+from pathlib import Path
+from collections import Counter
+
+MODES = ("cpu", "mem", "sample")
+
+# sampling period used by the `sample` mode unless told otherwise
+DEFAULT_SAMPLE_INTERVAL = 0.005
+
+
+def parse_modes(spec):
+    modes = [x.strip() for x in spec.split(",") if x.strip()]
+    for mode in modes:
+        if mode not in MODES:
+            raise ValueError(f"unknown profile mode '{mode}', " +
+                             f"expect one of {', '.join(MODES)}")
+    return modes
+
+
+def _log(msg):
+    print(f"[profile] {msg}", file=sys.stderr)
+
+
+def _frame_name(frame):
+    co = frame.f_code
+    return f"{co.co_filename}:{co.co_firstlineno}({co.co_name})"
+
+
+class CpuProfile:
+    def __init__(self, out):
+        import cProfile
+
+        self.__out = out.with_suffix(".pstats")
+        self.__prof = cProfile.Profile()
+
+    def start(self):
+        self.__prof.enable()
+
+    def stop(self):
+        self.__prof.disable()
+
+    def checkpoint(self):
+        self.__prof.dump_stats(self.__out)
+        _log(f"cpu stats so far written to {self.__out}")
+
+    def report(self, top):
+        import pstats
+
+        self.__prof.dump_stats(self.__out)
+
+        stats = pstats.Stats(self.__prof, stream=sys.stderr)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(top)
+
+        _log(f"cpu stats written to {self.__out}, " +
+             f"inspect with `python -m pstats {self.__out}`")
+
+
+class MemProfile:
+    def __init__(self, out):
+        import tracemalloc
+
+        self.__tm = tracemalloc
+        self.__out = out
+        self.__last = None
+        self.__n = 0
+
+    def start(self):
+        self.__tm.start()
+
+    def stop(self):
+        pass
+
+    def __snapshot(self):
+        snapshot = self.__tm.take_snapshot()
+        return snapshot.filter_traces([
+            self.__tm.Filter(False, self.__tm.__file__),
+            self.__tm.Filter(False, "<frozen importlib._bootstrap>"),
+            self.__tm.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ])
+
+    def __usage(self):
+        current, peak = self.__tm.get_traced_memory()
+        return f"traced {current / 2**20:.2f} MiB, peak {peak / 2**20:.2f} MiB"
+
+    def checkpoint(self):
+        snapshot = self.__snapshot()
+
+        self.__n += 1
+        path = self.__out.with_suffix(f".{self.__n}.snapshot")
+        snapshot.dump(str(path))
+
+        _log(f"{self.__usage()}, snapshot written to {path}")
+        if self.__last is not None:
+            for stat in snapshot.compare_to(self.__last, "lineno")[:3]:
+                _log(f"    {stat}")
+
+        self.__last = snapshot
+
+    def report(self, top):
+        snapshot = self.__snapshot()
+        path = self.__out.with_suffix(".snapshot")
+        snapshot.dump(str(path))
+
+        print(f"TOP {top} ALLOCATION SITES ({self.__usage()})", file=sys.stderr)
+        for stat in snapshot.statistics("lineno")[:top]:
+            print(f"    {stat}", file=sys.stderr)
+
+        self.__tm.stop()
+
+        _log(f"memory snapshot written to {path}, " +
+             "load with `tracemalloc.Snapshot.load`")
+
+
+class SampleProfile:
+    """
+        Statistical profiler, the stack of the main thread is recorded
+        every `interval` seconds of CPU time. Blocking on input costs no
+        samples, which suits interactive tools.
+    """
+
+    def __init__(self, out, interval):
+        self.__out = out.with_suffix(".folded")
+        self.__interval = interval or DEFAULT_SAMPLE_INTERVAL
+        self.__stacks = Counter()
+        self.__prev = None
+
+    def __sample(self, signum, frame):
+        stack = []
+        while frame is not None:
+            stack.append(_frame_name(frame))
+            frame = frame.f_back
+
+        self.__stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self.__prev = signal.signal(signal.SIGPROF, self.__sample)
+        signal.setitimer(signal.ITIMER_PROF, self.__interval, self.__interval)
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, self.__prev or signal.SIG_DFL)
+
+    def __write(self):
+        with open(self.__out, 'w') as f:
+            for stack, n in self.__stacks.items():
+                f.write(f"{stack} {n}\n")
+
+    def report(self, top):
+        self.__write()
+
+        total = sum(self.__stacks.values())
+        own = Counter()
+        inclusive = Counter()
+        for stack, n in self.__stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += n
+            for name in set(frames):
+                inclusive[name] += n
+
+        def emit(title, counter):
+            print(title, file=sys.stderr)
+            print(f"    {'samples':>8} {'%':>6}   function", file=sys.stderr)
+            for name, n in counter.most_common(top):
+                print(f"    {n:>8} {n / total:>6.1%}   {name}", file=sys.stderr)
+            print(file=sys.stderr)
+
+        if total:
+            emit(f"TOP {top} BY SELF SAMPLES", own)
+            emit(f"TOP {top} BY INCLUSIVE SAMPLES", inclusive)
+
+        _log(f"{total} samples at {self.__interval * 1000:g} ms, " +
+             f"folded stacks written to {self.__out}")
+
+
+class Profiler:
+    def __init__(self, modes, out, interval=None, top=25):
+        out = Path(out)
+        out.parent.mkdir(parents=True, exist_ok=True)
+
+        self.__top = top
+        self.__interval = interval
+        self.__dumping = False
+        self.__profiles = []
+
+        for mode in modes:
+            if mode == "cpu":
+                self.__profiles.append(CpuProfile(out))
+            elif mode == "mem":
+                self.__profiles.append(MemProfile(out))
+            elif mode == "sample":
+                self.__profiles.append(SampleProfile(out, interval))
+
+    def __checkpoint(self, signum, frame):
+        # keep the checkpoints out of the cpu stats, functions active at
+        # this point are accounted up to here only
+        cpu = [x for x in self.__profiles if isinstance(x, CpuProfile)]
+        for profile in cpu:
+            profile.stop()
+
+        for profile in self.__profiles:
+            profile.checkpoint()
+
+        for profile in cpu:
+            profile.start()
+
+        # re-armed only now, a checkpoint may outlast the interval
+        signal.setitimer(signal.ITIMER_REAL, self.__interval)
+
+    def start(self):
+        # in the sample mode the interval is the sampling period, otherwise
+        # it requests intermediate results of long running tools
+        if self.__interval and "sample" not in self.modes():
+            self.__dumping = True
+            signal.signal(signal.SIGALRM, self.__checkpoint)
+            signal.setitimer(signal.ITIMER_REAL, self.__interval)
+
+        for profile in self.__profiles:
+            profile.start()
+
+    def stop(self):
+        if self.__dumping:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, signal.SIG_DFL)
+
+        for profile in reversed(self.__profiles):
+            profile.stop()
+
+    def modes(self):
+        names = {CpuProfile: "cpu", MemProfile: "mem", SampleProfile: "sample"}
+        return [names[type(x)] for x in self.__profiles]
+
+    def report(self):
+        print(file=sys.stderr)
+        for profile in self.__profiles:
+            profile.report(self.__top)
+            print(file=sys.stderr)
+
+
+def default_output(cache, tool):
+    name = str(tool).replace("::", "-").strip("-").replace(os.sep, "_")
+    return cache / f"{name or 'tool'}-{time.strftime('%Y%m%d-%H%M%S')}"
@@ -1,14 +1,317 @@
+import os
+import json
+import pickle
+
 from pathlib import Path
 
+from .cachedir import cache_dir, cache_disabled, atomic_write
+from .nameindex import NameIndex
+
+# (path, mtime, size) -> decoded object, shared with forked daemon children
+_loaded = {}
+
+# below this decoded json size, the pickle round trip costs more than
+# decoding directly
+_CACHE_MIN_SIZE = 64 * 1024
+
+
+def _json_size(raw):
+    # a gzip stream ends with the size of its content, modulo 2^32
+    if raw[:2] == b"\x1f\x8b" and len(raw) >= 18:
+        return int.from_bytes(raw[-4:], "little")
+    return len(raw)
+
+
+def _decode_json(raw):
+    if raw[:2] == b"\x1f\x8b":
+        import gzip
+        raw = gzip.decompress(raw)
+
+    return json.loads(raw)
+
+
+def load_json(path):
+    """
+        Load a json (optionally gzip compressed) resource. The decoded
+        object is converted once into pickle format and kept in the user
+        cache keyed by the source content hash; subsequent loads skip the
+        decompression and parsing. The returned object may be shared and
+        must not be modified.
+    """
+
+    if isinstance(path, str):
+        path = Path(path)
+
+    # either a Path or an ArchivePath
+    path = path.absolute()
+    st = path.stat()
+    key = (str(path), st.st_mtime_ns, st.st_size)
+
+    if key in _loaded:
+        return _loaded[key]
+
+    raw = path.read_bytes()
+
+    if cache_disabled() or _json_size(raw) < _CACHE_MIN_SIZE:
+        obj = _decode_json(raw)
+        _loaded[key] = obj
+        return obj
+
+    import hashlib
+    digest = hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+    try:
+        entry = cache_dir("resources") / f"{path.name}.{digest}.pickle"
+    except OSError:
+        # no usable cache directory
+        obj = _decode_json(raw)
+        _loaded[key] = obj
+        return obj
+
+    try:
+        with open(entry, 'rb') as f:
+            obj = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        obj = _decode_json(raw)
+        try:
+            atomic_write(entry, pickle.dumps(obj, pickle.HIGHEST_PROTOCOL))
+        except OSError:
+            pass
+
+    _loaded[key] = obj
+    return obj
+
+
+class JsonIndex:
+    """
+        Read-only mapping over the members of a json object resource,
+        stored one pickled record per key in an sqlite database; a lookup
+        reads only its record. The database is opened on first access.
+        `names()` is the NameIndex of the keys, built with the database.
+    """
+
+    def __init__(self, db_path):
+        self.__path = db_path
+        self.__db = None
+        self.__pid = None
+        self.__keys = None
+        self.__names = None
+
+    def __open(self):
+        import sqlite3
+
+        return sqlite3.connect(f"file:{self.__path}?mode=ro", uri=True,
+                               check_same_thread=False)
+
+    def __conn(self):
+        # an sqlite connection must not cross a fork, a forked daemon
+        # child opens its own
+        pid = os.getpid()
+        if self.__db is None or self.__pid != pid:
+            self.__db = self.__open()
+            self.__pid = pid
+        return self.__db
+
+    def check(self):
+        """
+            Raise sqlite3.DatabaseError unless the database is sound. The
+            connection checking it is closed once done.
+        """
+
+        import sqlite3
+
+        db = self.__open()
+        try:
+            row, = db.execute("PRAGMA quick_check").fetchone()
+            if row != "ok":
+                raise sqlite3.DatabaseError(row)
+
+            db.execute("SELECT 1 FROM meta WHERE key = 'names'").fetchone()
+        finally:
+            db.close()
+
+    def get(self, key, default=None):
+        row = self.__conn().execute("SELECT value FROM records WHERE key = ?",
+                                    (key,)).fetchone()
+        if row is None:
+            return default
+        return pickle.loads(row[0])
+
+    def __getitem__(self, key):
+        val = self.get(key, _MISSING)
+        if val is _MISSING:
+            raise KeyError(key)
+        return val
+
+    def __contains__(self, key):
+        return self.__conn().execute("SELECT 1 FROM records WHERE key = ?",
+                                     (key,)).fetchone() is not None
+
+    def keys(self):
+        if self.__keys is None:
+            self.__keys = [k for k, in self.__conn().execute(
+                "SELECT key FROM records ORDER BY seq")]
+        return self.__keys
+
+    def names(self):
+        if self.__names is None:
+            row, = self.__conn().execute(
+                "SELECT value FROM meta WHERE key = 'names'").fetchone()
+            self.__names = pickle.loads(row)
+        return self.__names
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+
+class _DecodedIndex(dict):
+    # what json_index gives without the cache
+
+    def names(self):
+        if not hasattr(self, "_names"):
+            self._names = NameIndex(self.keys())
+        return self._names
+
+
+_MISSING = object()
+
+# bumped whenever the database layout changes
+_INDEX_FORMAT = 2
+
+# (pid, path, mtime, size) -> JsonIndex, those of the daemon are not
+# shared with its forked children
+_indexes = {}
+
+
+def _build_index(entry, obj):
+    import sqlite3
+    import tempfile
+
+    if not isinstance(obj, dict):
+        raise ValueError("only a json object can be indexed")
+
+    # built aside then renamed, so readers never see a partial database
+    fd, tmp = tempfile.mkstemp(dir=entry.parent, prefix=f".{entry.name}.")
+    os.close(fd)
+
+    try:
+        db = sqlite3.connect(tmp)
+        db.execute("CREATE TABLE records (key TEXT PRIMARY KEY, seq INTEGER, " +
+                   "value BLOB) WITHOUT ROWID")
+        db.executemany("INSERT INTO records VALUES (?, ?, ?)",
+                       ((k, i, pickle.dumps(v, pickle.HIGHEST_PROTOCOL))
+                        for i, (k, v) in enumerate(obj.items())))
+        db.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value BLOB)")
+        db.execute("INSERT INTO meta VALUES ('names', ?)",
+                   (pickle.dumps(NameIndex(obj.keys()), pickle.HIGHEST_PROTOCOL), ))
+        db.commit()
+        db.close()
+        os.replace(tmp, entry)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def _decoded_index(raw):
+    obj = _decode_json(raw)
+    if not isinstance(obj, dict):
+        raise ValueError("only a json object can be indexed")
+
+    return _DecodedIndex(obj)
+
+
+def _open_index(entry, raw):
+    import sqlite3
+
+    if not entry.exists():
+        _build_index(entry, _decode_json(raw))
+
+    index = JsonIndex(entry)
+    try:
+        index.check()
+    except sqlite3.DatabaseError:
+        # corrupt or foreign, built again once
+        entry.unlink(missing_ok=True)
+        _build_index(entry, _decode_json(raw))
+
+        index = JsonIndex(entry)
+        index.check()
+
+    return index
+
+
+def json_index(path):
+    """
+        Mapping over the members of a json (optionally gzip compressed)
+        object resource. The resource is decoded once into an indexed
+        store in the user cache, keyed by its content hash, so that later
+        processes neither decode it nor hold it in memory. Falls back to
+        the decoded object when the cache is disabled or unusable.
+    """
+
+    if isinstance(path, str):
+        path = Path(path)
+
+    path = path.absolute()
+    st = path.stat()
+    key = (os.getpid(), str(path), st.st_mtime_ns, st.st_size)
+
+    if key in _indexes:
+        return _indexes[key]
+
+    raw = path.read_bytes()
+
+    if cache_disabled():
+        index = _decoded_index(raw)
+        _indexes[key] = index
+        return index
+
+    import hashlib
+    import sqlite3
+    digest = hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+    try:
+        entry = cache_dir("resources") / f"{path.name}.{digest}.{_INDEX_FORMAT}.sqlite3"
+        index = _open_index(entry, raw)
+    except (OSError, sqlite3.Error):
+        index = _decoded_index(raw)
+
+    _indexes[key] = index
+    return index
+
+
+def _resolve(base):
+    if isinstance(base, Path) or hasattr(base, "precompiled"):
+        path = base
+    else:
+        path = Path(base)
+
+    if isinstance(path, Path) and not path.exists():
+        # possibly within a bundle archive
+        from .archive import archive_path
+
+        return archive_path(path) or path
+
+    return path
+
+
 class ResourceScope:
     def __init__(self, base, *args):
-        if not isinstance(base, Path):
-            base = Path(base)
+        base = _resolve(base)
 
         if base.is_file():
             base = base.parent
 
-        self.__base = base / Path(*args)
+        if args:
+            base = base.joinpath(*args)
+
+        self.__base = base
 
     def locate(self, *args):
         return ResourceScope(self.__base, *args)
@@ -33,3 +336,9 @@ class ResourceScope:
                 parts2.append(p)
 
         return self.__base / Path(*parts2)
+
+    def load_json(self, *index):
+        return load_json(self[index])
+
+    def json_index(self, *index):
+        return json_index(self[index])
@@ -0,0 +1,139 @@
+import os
+import time
+import json
+import functools
+
+from _thread import get_ident
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    def __init__(self, tracer, name, cat, args):
+        self.__tracer = tracer
+        self.__name = name
+        self.__cat = cat
+        self.__args = args
+        self.__start = 0
+
+    def set(self, **args):
+        self.__args.update(args)
+
+    def __enter__(self):
+        self.__start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+
+        if exc_type is not None:
+            self.__args["error"] = exc_type.__name__
+
+        self.__tracer._complete(self.__name, self.__cat, self.__start,
+                                end - self.__start, self.__args)
+        return False
+
+
+class Tracer:
+    """
+        Collects nested spans and counters in the Chrome trace event format,
+        viewable with chrome://tracing or ui.perfetto.dev. A disabled tracer
+        hands out a shared no-op span and leaves decorated functions as is.
+    """
+
+    def __init__(self, enabled=False, process_name=None):
+        self.enabled = enabled
+        self.__events = []
+        self.__pid = os.getpid()
+        self.__epoch = time.perf_counter_ns()
+
+        if enabled and process_name:
+            self.__events.append({
+                "name": "process_name", "ph": "M", "pid": self.__pid,
+                "args": { "name": process_name }
+            })
+
+    def __ts(self, ns):
+        return (ns - self.__epoch) / 1000
+
+    def _complete(self, name, cat, start, dur, args):
+        event = {
+            "name": name, "cat": cat, "ph": "X",
+            "ts": self.__ts(start), "dur": dur / 1000,
+            "pid": self.__pid, "tid": get_ident()
+        }
+        if args:
+            event["args"] = args
+
+        self.__events.append(event)
+
+    def span(self, name, cat="pytool", **args):
+        if not self.enabled:
+            return _NULL_SPAN
+        return Span(self, name, cat, args)
+
+    def counter(self, name, **values):
+        if not self.enabled:
+            return
+
+        self.__events.append({
+            "name": name, "ph": "C",
+            "ts": self.__ts(time.perf_counter_ns()),
+            "pid": self.__pid, "args": values
+        })
+
+    def instant(self, name, cat="pytool", **args):
+        if not self.enabled:
+            return
+
+        self.__events.append({
+            "name": name, "cat": cat, "ph": "i", "s": "t",
+            "ts": self.__ts(time.perf_counter_ns()),
+            "pid": self.__pid, "tid": get_ident(), "args": args
+        })
+
+    def traced(self, name=None, cat="pytool"):
+        def decorator(fn):
+            if not self.enabled:
+                return fn
+
+            span_name = name or fn.__qualname__
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with Span(self, span_name, cat, {}):
+                    return fn(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def events(self):
+        return self.__events
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            json.dump({
+                "traceEvents": self.__events,
+                "displayTimeUnit": "ms"
+            }, f)
+
+
+def trace_output():
+    """
+        Trace file requested through the environment, or None
+    """
+
+    return os.environ.get("PYTOOL_TRACE") or None
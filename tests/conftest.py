@@ -0,0 +1,41 @@
+import os
+import sys
+import importlib
+
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _cache_dir(tmp_path_factory):
+    # keep the code and resource caches of the run out of the user's
+    os.environ["PYTOOL_CACHE_DIR"] = str(tmp_path_factory.mktemp("cache"))
+
+
+@pytest.fixture(scope="session")
+def bincalc(_cache_dir):
+    """
+        Loader of the modules of bincalc by the name it imports them with,
+        through the pytool importer as the bench does
+    """
+
+    import gateway
+
+    script = gateway.resource["bincalc/main.py"]
+    gateway.install_import_hook(script.parent, gateway.tool_globals(script))
+
+    return importlib.import_module
+
+
+@pytest.fixture
+def config(bincalc):
+    """
+        A fresh copy of the configuration of a preset, by name
+    """
+
+    presets = bincalc("config").arch_preset()
+    return lambda name: dict(presets[name]())
@@ -0,0 +1,122 @@
+import pytest
+
+from shared.kvcache import KVCache, key_of
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return KVCache(tmp_path / "kv.sqlite3")
+
+
+def test_round_trip(cache):
+    cache.put("ns", "k", {"a": [1, 2]})
+
+    assert cache.get("ns", "k") == {"a": [1, 2]}
+    assert cache.get("other", "k") is None
+    assert cache.get("ns", "x", 5) == 5
+
+
+def test_shared_store(tmp_path):
+    # another process sees what one put
+    KVCache(tmp_path / "kv.sqlite3").put("ns", "k", 42)
+    assert KVCache(tmp_path / "kv.sqlite3").get("ns", "k") == 42
+
+
+def test_memoize(cache):
+    calls = []
+
+    @cache.memoize("sq")
+    def square(x):
+        calls.append(x)
+        return x * x
+
+    assert [square(3), square(3), square(4), square(3)] == [9, 9, 16, 9]
+    assert calls == [3, 4]
+
+    stats = cache.stats()["sq"]
+    assert (stats["entries"], stats["hits"], stats["misses"]) == (2, 2, 2)
+
+
+def test_memoize_key(cache):
+    calls = []
+
+    @cache.memoize("len", key=lambda s, verbose=False: (s, ))
+    def length(s, verbose=False):
+        calls.append(s)
+        return len(s)
+
+    assert length("abc") == length("abc", verbose=True) == 3
+    assert calls == ["abc"]
+
+
+def test_lru_eviction(tmp_path):
+    import pickle
+
+    size = len(pickle.dumps(b"x" * 100, protocol=pickle.HIGHEST_PROTOCOL))
+    cache = KVCache(tmp_path / "kv.sqlite3", max_bytes=3 * size)
+
+    for k in "abc":
+        cache.put("ns", k, b"x" * 100)
+
+    # a is used again, b is then the least recently used
+    assert cache.get("ns", "a") is not None
+    cache.put("ns", "d", b"x" * 100)
+
+    assert [cache.get("ns", k) is not None for k in "abcd"] == \
+        [True, False, True, True]
+
+    # too large to ever be stored
+    cache.put("ns", "e", b"x" * 1000)
+    assert cache.get("ns", "e") is None
+
+
+def test_disabled(tmp_path):
+    cache = KVCache(tmp_path / "kv.sqlite3", enabled=False)
+    cache.put("ns", "k", 1)
+
+    assert cache.get("ns", "k") is None
+    assert cache.memoize("ns")(len) is len
+
+
+def test_clear(cache):
+    cache.put("a", "k", 1)
+    cache.put("b", "k", 2)
+
+    cache.clear("a")
+    assert cache.get("a", "k") is None
+    assert cache.get("b", "k") == 2
+
+    cache.clear()
+    assert cache.get("b", "k") is None
+
+
+def test_key_of():
+    assert key_of(1, "a") == key_of(1, "a")
+    assert key_of(1, "a") != key_of("a", 1)
+
+
+def test_bad_value(tmp_path):
+    import sqlite3
+
+    cache = KVCache(tmp_path / "kv.sqlite3")
+    cache.put("ns", "k", 1)
+
+    db = sqlite3.connect(tmp_path / "kv.sqlite3")
+    db.execute("UPDATE entries SET value = ?", (b"not a pickle", ))
+    db.commit()
+
+    # a miss, and the entry is gone
+    assert cache.get("ns", "k", 5) == 5
+    assert cache.stats()["ns"]["entries"] == 0
+
+
+def test_unusable_directory(tmp_path, monkeypatch):
+    (tmp_path / "file").write_bytes(b"")
+    monkeypatch.setenv("PYTOOL_CACHE_DIR", str(tmp_path / "file" / "cache"))
+
+    cache = KVCache()
+    assert cache.get("ns", "k", 5) == 5
+    assert not cache.enabled
+
+    cache.put("ns", "k", 1)
+    assert cache.get("ns", "k") is None
@@ -0,0 +1,52 @@
+from shared.nameindex import NameIndex
+
+NAMES = ["TTBR0_EL1", "TTBR0_EL2", "TTBR1_EL1", "TCR_EL1", "SCTLR_EL1",
+         "SCTLR_EL2", "ACTLR_EL1", "FEAT_VHE", "FEAT_FP", "FEAT_LPA2", "ttbr_x"]
+
+
+def test_complete():
+    index = NameIndex(NAMES)
+
+    assert len(index) == len(NAMES)
+    assert index.complete("TTBR0") == ["TTBR0_EL1", "TTBR0_EL2"]
+    assert index.complete("ttbr") == ["TTBR0_EL1", "TTBR0_EL2", "TTBR1_EL1", "ttbr_x"]
+    assert index.complete("X") == []
+    assert index.complete("") == sorted(NAMES, key=lambda x: (x.casefold(), x))
+
+
+def test_similar_order():
+    index = NameIndex(NAMES)
+
+    # the exact match, then names starting with it, then containing it
+    assert index.similar("SCTLR") == ["SCTLR_EL1", "SCTLR_EL2"]
+    assert index.similar("CTLR") == ["ACTLR_EL1", "SCTLR_EL1", "SCTLR_EL2"]
+
+    # the others by similarity
+    similar = index.similar("sctlr_el1")
+    assert similar[0] == "SCTLR_EL1"
+    assert set(similar[1:3]) == {"SCTLR_EL2", "ACTLR_EL1"}
+
+
+def test_similar_typo():
+    index = NameIndex(NAMES)
+
+    assert index.similar("TTBR0_EL3")[:2] == ["TTBR0_EL1", "TTBR0_EL2"]
+    assert index.similar("TCR_EL") == ["TCR_EL1"]
+    assert index.similar("ZZZZZZ") == []
+
+
+def test_similar_bounded():
+    index = NameIndex(NAMES)
+
+    assert len(index.similar("EL", n=3)) == 3
+    # the closest of the names starting with the query, the shortest
+    assert index.similar("TTBR", n=1) == ["ttbr_x"]
+
+
+def test_similar_features(bincalc):
+    arm64_sysfeat = bincalc("sysregs.arm64_sysfeat")
+    db = arm64_sysfeat._load_sysfeat_db()
+
+    # not every name sharing the FEAT_ prefix
+    assert arm64_sysfeat._get_feature(db, "FEAT_VH") == ["FEAT_VHE"]
+    assert arm64_sysfeat._get_feature(db, "FEAT_LPA3")[:2] == ["FEAT_LPA", "FEAT_LPA2"]
@@ -0,0 +1,103 @@
+import pytest
+
+
+@pytest.fixture
+def parser(bincalc):
+    parser = bincalc("parser")
+    parser.expr_cache.clear()
+    return parser
+
+
+def literals(parser, expr):
+    return list(parser.parse_expr(expr)[1].values())
+
+
+def test_template_shared(parser):
+    co1, lit1 = parser.parse_expr("1 + 2")
+    co2, lit2 = parser.parse_expr("3 + 0x40")
+
+    assert co1 is co2
+    assert list(lit1.values()) == [1, 2]
+    assert list(lit2.values()) == [3, 0x40]
+
+    assert parser.expr_cache.stats() == {
+        "texts": 2, "templates": 1,
+        "text_hits": 0, "template_hits": 1, "misses": 1
+    }
+
+
+def test_text_hit(parser):
+    first = parser.parse_expr("1 + 2")
+
+    # the same expression, up to the blanks
+    assert parser.parse_expr("  1   +  2 ") is first
+    assert parser.expr_cache.text_hits == 1
+    assert parser.expr_cache.misses == 1
+
+
+def test_leading_blanks(parser):
+    # compiled from the normalized text, the cache is cold
+    assert literals(parser, "  1 + 2") == [1, 2]
+    assert literals(parser, "\t'a' ") == []
+
+
+def test_blanks_in_strings(parser):
+    assert parser.normalize_expr("'a  b'") == "'a  b'"
+    assert parser.normalize_expr(" 1   + 2 ") == "1 + 2"
+
+
+def test_record_slots(parser):
+    co1, lit1 = parser.parse_expr("A0 + 1")
+    co2, lit2 = parser.parse_expr("A12 + 7")
+
+    assert co1 is co2
+    assert list(lit1.values()) == [0, 1]
+    assert list(lit2.values()) == [12, 7]
+
+    # a record is not a number
+    co3, _ = parser.parse_expr("3 + 1")
+    assert co3 is not co1
+
+
+def test_callee_not_slotted(parser):
+    # the name of the command stays a name, its arguments are slotted
+    assert literals(parser, "A3, 1") == [1]
+    assert literals(parser, "A3, A1, 2") == [1, 2]
+
+    co1, _ = parser.parse_expr("A3, 1")
+    co2, _ = parser.parse_expr("A4, 1")
+    assert co1 is not co2
+
+
+def test_syntax_error(parser, bincalc):
+    with pytest.raises(bincalc("utils").BinCalcException, match="syntax error"):
+        parser.parse_expr("1 +")
+
+
+def test_bounded(bincalc):
+    cache = bincalc("parser").ExprCache(text_size=2, template_size=1)
+
+    for i in range(3):
+        cache.put_text(str(i), i)
+        cache.put_template(str(i), i)
+
+    assert cache.get_text("0") is None
+    assert cache.get_text("2") == 2
+    assert cache.get_template("1") is None
+    assert cache.get_template("2") == 2
+    assert cache.stats()["texts"] == 2
+    assert cache.stats()["templates"] == 1
+
+
+def test_eval(bincalc, parser):
+    calc = bincalc("calc").BinaryCalculator()
+
+    # every line after the first reuses its template
+    assert calc.eval("1 + 2") == "0x3"
+    assert calc.eval("5 + 7") == "0xc"
+    assert calc.eval("A0 + A1") == "0xf"
+    assert calc.eval("A1 + A0") == "0xf"
+    assert calc.eval("A2 + 0x10") == "0x1f"
+
+    with pytest.raises(bincalc("utils").BinCalcException, match="A3"):
+        calc.eval("A3, 1")
@@ -0,0 +1,103 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+PRESETS = [
+    "arm64_le_va48_4k", "arm64_le_va48_16k", "arm64_le_va48_64k",
+    "arm64_le_va48_pa52_4k", "arm64_le_va48_pa52_16k",
+    "arm64_le_va48_pa52_64k", "x86_64_LA48", "x86_64_LA57",
+]
+
+
+def build(bincalc, config, tmp_path, mappings, base):
+    ptbuild = bincalc("addrtrans.ptbuild")
+    walker = bincalc("addrtrans.walker")
+    addrtrans = bincalc("addrtrans")
+
+    builder = ptbuild.TableBuilder(config)
+    for i, (va, size, pa) in enumerate(mappings):
+        builder.add(ptbuild.Mapping(va, size, pa, (0, {}), f"line {i + 1}"))
+
+    img, root, stats = builder.build(base)
+    path = ptbuild.write_image(img, tmp_path / "pt.bin", config)
+
+    image = walker.PhysImage(path, base, config)
+    w = walker.Walker(image, root, config,
+                      lambda l: addrtrans.pte_decoder(l, config))
+    return builder, w, stats
+
+
+def probes(mappings):
+    # first, last and inner bytes of each range, with the PA expected
+    for va, size, pa in mappings:
+        for off in (0, 8, size // 2 + 24, size - 1):
+            yield va + off, pa + off
+
+
+@pytest.mark.parametrize("preset", PRESETS)
+def test_round_trip(bincalc, config, tmp_path, preset):
+    c = config(preset)
+    BinConfig = bincalc("config").BinConfig
+
+    gran = 1 << BinConfig.MmuPgGran[c]
+    pabits = BinConfig.MmuPABits[c]
+
+    # pages, a range taking the largest leaves, and tables high in the
+    # PA space, beyond 48 bits if there is one
+    high = (1 << pabits) - (1 << 30)
+    mappings = [
+        (0x10000 * gran, 3 * gran, 0x80000 * gran),
+        (1 << 39, 1 << 31, 1 << 33),
+        ((1 << 47) - 5 * gran, 5 * gran, high - (1 << 29)),
+    ]
+
+    builder, w, stats = build(bincalc, c, tmp_path, mappings, high)
+
+    for va, pa in probes(mappings):
+        tr = w.translate(va)
+        assert tr.fault is None, (hex(va), tr.fault)
+        assert tr.pa == pa
+
+    va, pa = zip(*probes(mappings))
+    batch = w.translate_many(np.array(va, dtype=np.uint64))
+    assert batch.pa.tolist() == list(pa)
+    assert not batch.fault.any()
+
+    unmapped = [0, (1 << 39) + (1 << 31), (1 << 47) - 6 * gran]
+    for va in unmapped:
+        assert w.translate(va).fault is not None
+
+    batch = w.translate_many(np.array(unmapped, dtype=np.uint64))
+    assert batch.fault.all()
+    assert (batch.pa == bincalc("addrtrans.walker").FAULT_PA).all()
+
+    # the mapped ranges come back merged as they were added
+    ranges = sorted((r.va, r.size, r.pa) for r in w.mappings())
+    assert ranges == sorted(mappings)
+
+
+@pytest.mark.parametrize("preset", ["arm64_le_va48_4k", "arm64_le_va48_pa52_4k"])
+def test_level0_block(bincalc, config, tmp_path, preset):
+    c = config(preset)
+
+    lpa2 = preset.endswith("pa52_4k")
+    size = 1 << 39
+    mappings = [(size, size, 2 * size)]
+
+    builder, w, stats = build(bincalc, c, tmp_path, mappings, 1 << 30)
+
+    # 512G blocks only come with the 52 bits OA of LPA2
+    leaf = w.translate(size + 0x1234)
+    assert leaf.pa == 2 * size + 0x1234
+    assert leaf.steps[-1].level == (0 if lpa2 else 1)
+
+    leaves = { level: n for level, _, n in stats }
+    assert leaves[0] == (1 if lpa2 else 0)
+
+
+def test_overlap(bincalc, config, tmp_path):
+    c = config("x86_64_LA48")
+    utils = bincalc("utils")
+
+    with pytest.raises(utils.BinCalcException, match="overlap"):
+        build(bincalc, c, tmp_path, [(0, 0x2000, 0), (0x1000, 0x1000, 0)], 0)
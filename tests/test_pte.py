@@ -0,0 +1,183 @@
+import random
+
+import pytest
+
+# (level, type bits) of a page, a block and tables of each arch
+ENTRIES = {
+    "arm64": [(3, 0b11), (2, 0b01), (1, 0b11), (0, 0b11)],
+    "x86_64": [(3, 0x1), (2, 0x81), (1, 0x1), (0, 0x1)],
+}
+
+PRESETS = [
+    "arm64_le_va48_4k", "arm64_le_va48_16k", "arm64_le_va48_64k",
+    "arm64_le_va48_pa52_4k", "arm64_le_va48_pa52_16k",
+    "arm64_le_va48_pa52_64k", "x86_64_LA48", "x86_64_LA57",
+]
+
+
+def decoders(bincalc, c):
+    # every (level, PteDecoder) of the translation scheme of `c`
+    pte_utils = bincalc("addrtrans.pte_utils")
+    BinConfig = bincalc("config").BinConfig
+
+    arch = bincalc("addrtrans." + BinConfig.Arch[c])
+    for level in range(4):
+        p = pte_utils.mmu_params(c, level)
+        for fmt in (arch.leaf_format(level, p), arch.table_format(level, p)):
+            if fmt is not None:
+                yield level, fmt.decoder(p)
+
+
+def decode(bincalc, preset, level, raw):
+    c = bincalc("config").arch_preset()[preset]()
+    return bincalc("addrtrans").pte_decoder(level, c).decode(raw)
+
+
+@pytest.mark.parametrize("preset", PRESETS)
+def test_fields(bincalc, config, preset):
+    c = config(preset)
+    addrtrans = bincalc("addrtrans")
+    rng = random.Random(preset)
+
+    BinConfig = bincalc("config").BinConfig
+    for level, raw in ENTRIES[BinConfig.Arch[c]]:
+        dec = addrtrans.pte_decoder(level, c).decode(raw).decoder
+
+        # every field of the layout reads back alone
+        for name, h, l in dec.fields:
+            val = rng.getrandbits(h - l + 1)
+            rec = dec.decode(raw & ~(((1 << (h - l + 1)) - 1) << l) | val << l)
+            assert rec[name] == val, (dec.type_name, level, name)
+
+
+@pytest.mark.parametrize("preset", PRESETS)
+def test_fields_round_trip(bincalc, config, preset):
+    rng = random.Random(preset)
+
+    for level, dec in decoders(bincalc, config(preset)):
+        for name, h, l in dec.fields:
+            val = rng.getrandbits(h - l + 1)
+            rec = dec.decode(dec.encode_fields({ name: val }))
+            assert rec[name] == val, (dec.type_name, level, name)
+
+
+@pytest.mark.parametrize("preset", PRESETS)
+def test_oa_round_trip(bincalc, config, preset):
+    np = pytest.importorskip("numpy")
+
+    c = config(preset)
+    BinConfig = bincalc("config").BinConfig
+    pabits = BinConfig.MmuPABits[c]
+
+    rng = random.Random(preset)
+    for level, dec in decoders(bincalc, c):
+        low = dec.oa_parts[0][2]
+        oa = [rng.getrandbits(pabits - low) << low for _ in range(64)]
+        oa += [((1 << pabits) - 1) >> low << low]
+
+        raw = dec.encode_many(np.array(oa, dtype=np.uint64), 0)
+        assert dec.oa_many(raw).tolist() == oa
+        assert [dec.decode(int(x)).oa for x in raw] == oa
+
+        # nothing of the OA is left out of its mask
+        assert not int(raw[-1]) & ~dec.oa_raw_mask & ~dec.format.type_bits
+
+        with pytest.raises(bincalc("utils").BinCalcException):
+            dec.encode_fields({ dec.names[0]: 1 << 64 })
+
+
+def test_decoder_shared(bincalc, config):
+    c = config("arm64_le_va48_4k")
+    pte_decoder = bincalc("addrtrans").pte_decoder
+
+    assert pte_decoder(3, c) is pte_decoder(3, dict(c))
+    assert pte_decoder(3, c) is not pte_decoder(2, c)
+
+    with pytest.raises(bincalc("utils").BinCalcException):
+        pte_decoder(4, c)
+
+
+def test_arm64(bincalc):
+    # a page, AF set
+    rec = decode(bincalc, "arm64_le_va48_4k", 3, 0x123456789000 | 1 << 10 | 0b11)
+    assert rec.decoder.type_name == "Page Descriptor"
+    assert rec.oa == 0x123456789000
+    assert rec["AF"] == 1
+
+    # 0b01 is reserved at level 3, a block above it
+    assert decode(bincalc, "arm64_le_va48_4k", 3, 0x1000 | 0b01) is None
+    assert decode(bincalc, "arm64_le_va48_4k", 3, 0x1000) is None
+
+    rec = decode(bincalc, "arm64_le_va48_4k", 2, 0x40200000 | 0b01)
+    assert rec.decoder.type_name == "Block Descriptor"
+    assert rec.oa == 0x40200000
+
+    # blocks of 16K granule level 2 are 32M, 64K ones 512M
+    rec = decode(bincalc, "arm64_le_va48_16k", 2, 0x43ffc000 | 0b01)
+    assert rec.oa == 0x42000000
+    rec = decode(bincalc, "arm64_le_va48_64k", 2, 0x7fff0000 | 0b01)
+    assert rec.oa == 0x60000000
+
+    # OA[51:48] in bits 15:12 of 64K granule pages
+    rec = decode(bincalc, "arm64_le_va48_pa52_64k", 3, 0xabcd0000 | 0x5 << 12 | 0b11)
+    assert rec.oa == 0x5 << 48 | 0xabcd0000
+
+
+def test_x86(bincalc):
+    rec = decode(bincalc, "x86_64_LA48", 3, 0x12345000 | 1)
+    assert rec.decoder.type_name == "Base Page"
+    assert rec.oa == 0x12345000
+
+    # PS makes a 2M page at level 2, never at level 0
+    huge = decode(bincalc, "x86_64_LA48", 2, 0x40200000 | 0x81)
+    table = decode(bincalc, "x86_64_LA48", 0, 0x40200000 | 0x81)
+    assert huge.decoder.type_name == "Huge Page"
+    assert table.decoder.type_name == "Table Page"
+    assert huge.oa == 0x40200000
+
+    # not present
+    assert decode(bincalc, "x86_64_LA48", 3, 0x12345000) is None
+
+
+def test_arm64_table_address_bits(bincalc):
+    # OA[47:16] and TA[15:12] holding address bits 51:48
+    rec = decode(bincalc, "arm64_le_va48_pa52_64k", 1,
+                 0xabcd00010000 | 0xf << 12 | 0b11)
+    assert rec.oa == 0xfabcd00010000
+
+    # OA[49:12] and TA[9:8] holding address bits 51:50
+    rec = decode(bincalc, "arm64_le_va48_pa52_4k", 1,
+                 1 << 49 | 0x3 << 8 | 0x1000 | 0b11)
+    assert rec.oa == 0x3 << 50 | 1 << 49 | 0x1000
+
+    rec = decode(bincalc, "arm64_le_va48_4k", 1, 0xffff_ffff_f000 | 0b11)
+    assert rec.oa == 0xffff_ffff_f000
+
+
+def test_x86_address_bits(bincalc):
+    rec = decode(bincalc, "x86_64_LA57", 3, 1 << 51 | 0x1000 | 1)
+    assert rec.oa == 1 << 51 | 0x1000
+
+    # the bits above the 48 bits PA are not part of it
+    rec = decode(bincalc, "x86_64_LA48", 1, 1 << 51 | 1 << 47 | 0x1000 | 7)
+    assert rec.oa == 1 << 47 | 0x1000
+
+
+@pytest.mark.parametrize("preset, levels", [
+    ("arm64_le_va48_4k", (1, 2, 3)),
+    ("arm64_le_va48_pa52_4k", (0, 1, 2, 3)),
+    ("arm64_le_va48_16k", (2, 3)),
+    ("arm64_le_va48_pa52_16k", (1, 2, 3)),
+    ("arm64_le_va48_64k", (2, 3)),
+    ("arm64_le_va48_pa52_64k", (1, 2, 3)),
+    ("x86_64_LA48", (1, 2, 3)),
+])
+def test_leaf_levels(bincalc, config, preset, levels):
+    c = config(preset)
+    pte_utils = bincalc("addrtrans.pte_utils")
+    BinConfig = bincalc("config").BinConfig
+
+    arch = bincalc("addrtrans." + BinConfig.Arch[c])
+    leaves = tuple(l for l in range(4)
+                   if arch.leaf_format(l, pte_utils.mmu_params(c, l)))
+    assert leaves == levels
@@ -0,0 +1,163 @@
+import gzip
+import json
+
+import pytest
+
+from shared import resource
+from shared.cachedir import cache_dir
+
+RECORDS = { "SCTLR_EL1": { "name": "SCTLR_EL1", "fields": [1, 2] },
+            "TCR_EL1": { "name": "TCR_EL1" },
+            "ESR_EL1": None }
+
+
+def write_gz(path, obj):
+    path.write_bytes(gzip.compress(json.dumps(obj).encode()))
+    return path
+
+
+def test_load_json_cached(tmp_path, monkeypatch):
+    # far below the threshold compressed, above it decoded
+    big = { f"k{i}": "x" * 64 for i in range(2000) }
+    path = write_gz(tmp_path / "big.json.gz", big)
+    assert path.stat().st_size < resource._CACHE_MIN_SIZE
+
+    assert resource.load_json(path) == big
+    assert len(list(cache_dir("resources").glob("big.json.gz.*.pickle"))) == 1
+
+    # a later process loads the pickle, without decoding
+    resource._loaded.clear()
+    monkeypatch.setattr(resource, "_decode_json", None)
+    assert resource.load_json(path) == big
+
+
+def test_load_json_small(tmp_path):
+    path = write_gz(tmp_path / "small.json.gz", RECORDS)
+
+    assert resource.load_json(path) == RECORDS
+    assert resource.load_json(path) is resource.load_json(str(path))
+    assert not list(cache_dir("resources").glob("small.json.gz.*"))
+
+
+def test_load_json_plain(tmp_path):
+    path = tmp_path / "plain.json"
+    path.write_text(json.dumps(RECORDS))
+
+    assert resource.load_json(path) == RECORDS
+
+
+def test_load_json_resource():
+    from conftest import ROOT
+
+    charmap = resource.load_json(ROOT / "littools" / "stcharmap.json.gz")
+    assert charmap
+    assert list(cache_dir("resources").glob("stcharmap.json.gz.*.pickle"))
+
+
+def test_load_json_unusable_cache(tmp_path, monkeypatch):
+    (tmp_path / "file").write_bytes(b"")
+    monkeypatch.setenv("PYTOOL_CACHE_DIR", str(tmp_path / "file" / "cache"))
+
+    big = { f"k{i}": "x" * 64 for i in range(2000) }
+    path = write_gz(tmp_path / "big.json.gz", big)
+    assert resource.load_json(path) == big
+
+
+def test_json_index(tmp_path):
+    path = write_gz(tmp_path / "regs.json.gz", RECORDS)
+    index = resource.json_index(path)
+
+    assert isinstance(index, resource.JsonIndex)
+    assert list(index) == list(RECORDS)
+    assert len(index) == 3
+
+    assert index["SCTLR_EL1"] == RECORDS["SCTLR_EL1"]
+    assert index.get("TCR_EL1") == { "name": "TCR_EL1" }
+    assert "ESR_EL1" in index and index["ESR_EL1"] is None
+
+    assert "FOO" not in index
+    assert index.get("FOO", 1) == 1
+    with pytest.raises(KeyError):
+        index["FOO"]
+
+    # the names are indexed with the records
+    assert index.names().complete("t") == ["TCR_EL1"]
+    assert index.names().similar("SCTLR_EL2")[0] == "SCTLR_EL1"
+
+    # one store per content, opened once per process
+    assert resource.json_index(str(path)) is index
+    assert len(list(cache_dir("resources").glob("regs.json.gz.*.sqlite3"))) == 1
+
+
+def test_json_index_uncached(tmp_path, monkeypatch):
+    monkeypatch.setenv("PYTOOL_NO_CACHE", "1")
+
+    path = write_gz(tmp_path / "regs.json.gz", RECORDS)
+    index = resource.json_index(path)
+
+    assert index == RECORDS
+    assert index.names().complete("T") == ["TCR_EL1"]
+
+
+def test_json_index_not_object(tmp_path):
+    path = write_gz(tmp_path / "list.json.gz", [1, 2])
+
+    with pytest.raises(ValueError):
+        resource.json_index(path)
+
+
+@pytest.mark.parametrize("garbage", [b"", b"not a database" * 100])
+def test_json_index_corrupt(tmp_path, garbage):
+    path = write_gz(tmp_path / "regs.json.gz", RECORDS)
+    resource.json_index(path)
+
+    # the store of another process, broken in the cache
+    store, = cache_dir("resources").glob("regs.json.gz.*.sqlite3")
+    store.write_bytes(garbage)
+    resource._indexes.clear()
+
+    index = resource.json_index(path)
+    assert isinstance(index, resource.JsonIndex)
+    assert index["TCR_EL1"] == { "name": "TCR_EL1" }
+
+
+def test_json_index_unusable_cache(tmp_path, monkeypatch):
+    # a cache directory that can not be created
+    (tmp_path / "file").write_bytes(b"")
+    monkeypatch.setenv("PYTOOL_CACHE_DIR", str(tmp_path / "file" / "cache"))
+
+    path = write_gz(tmp_path / "regs.json.gz", RECORDS)
+    index = resource.json_index(path)
+
+    assert not isinstance(index, resource.JsonIndex)
+    assert index["SCTLR_EL1"] == RECORDS["SCTLR_EL1"]
+    assert index.names().complete("T") == ["TCR_EL1"]
+
+
+def test_json_index_no_connection_left(tmp_path):
+    path = write_gz(tmp_path / "regs.json.gz", RECORDS)
+    index = resource.json_index(path)
+
+    # the check of the store closed its connection
+    assert index._JsonIndex__db is None
+
+
+def test_json_index_fork(tmp_path):
+    import os
+
+    path = write_gz(tmp_path / "regs.json.gz", RECORDS)
+    index = resource.json_index(path)
+    assert index["TCR_EL1"] == { "name": "TCR_EL1" }
+    parent_db = index._JsonIndex__db
+
+    pid = os.fork()
+    if pid == 0:
+        # neither the index nor the connection of the parent
+        ok = (resource.json_index(path) is not index and
+              index["SCTLR_EL1"] == RECORDS["SCTLR_EL1"] and
+              index._JsonIndex__db is not parent_db)
+        os._exit(0 if ok else 1)
+
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert index._JsonIndex__db is parent_db
@@ -0,0 +1,75 @@
+import ast
+import typing
+
+import pytest
+
+VALUES = [
+    None, 0, 1, 48, -3, 1.5, True, "", "a", "48", "dec", "oct", int, str,
+    [], [1], [1, "a"], [1, 2], ["x"], [1, "a", 3], [None, 3], [1, "a", None],
+    (), (1, "a"), (1, 2, 3), {"a": 1},
+]
+
+for expr in ["pte, A3, 3", "hex, (0x1 << 48) - 1", "va, f(0x1000) + A0",
+             "set, 'arch:va_bits', 39", "sysreg, 'TTBR0_EL1'", "f(1, x=2)"]:
+    VALUES += ast.walk(ast.parse(expr, mode='eval'))
+
+
+def schemas(m):
+    Schema, Optional = m.Schema, m.Optional
+    ObjectSchema, UnionSchema = m.ObjectSchema, m.UnionSchema
+    PartialList, ElementAt = m.PartialList, m.ElementAt
+
+    return [
+        Schema(int),
+        Schema(48),
+        Schema("dec"),
+        Schema(typing.Any),
+        Schema([int, str, Optional(Schema(int))]),
+        Schema([typing.Any, int]),
+        Schema([int, None, int]),
+        Schema((int, str)),
+        Schema([]),
+        Optional(int),
+        Optional(Schema([int])),
+        UnionSchema("hex", "bin", "dec"),
+        UnionSchema(int, Schema([int, str])),
+        ElementAt(1, str),
+        ElementAt(5, int),
+        PartialList(ElementAt(0, int), ElementAt(1, Optional(str))),
+        ObjectSchema(ast.Tuple, elts=PartialList(ElementAt(0, ast.Name))),
+        ObjectSchema(ast.Call, func=ast.Name),
+        ObjectSchema(ast.Name, id=str),
+        ObjectSchema(ast.Constant, value=UnionSchema(int, float)),
+    ]
+
+
+@pytest.fixture(scope="module")
+def schmea(bincalc):
+    return bincalc("lib.schmea")
+
+
+def test_compiled_equivalent(schmea):
+    for i, schema in enumerate(schemas(schmea)):
+        compiled = schema.compile()
+        for v in VALUES:
+            assert compiled(v) == schema.match(v), (i, v)
+
+
+def test_compiled_once(schmea):
+    schema = schmea.Schema([int, str])
+    assert schema.compile() is schema.compile()
+
+
+def test_known(schmea):
+    Schema, Optional = schmea.Schema, schmea.Optional
+
+    s = Schema([int, str, Optional(Schema(int))])
+    assert [s.compile()(v) for v in ([1, "a"], [1, "a", 2], [1, 2], ["x"])] == \
+        [True, True, False, False]
+
+    s = schmea.ObjectSchema(ast.Name, id=str).compile()
+    assert s(ast.Name("A0")) and not s(ast.Constant(1))
+
+    # the short value has None in the missing places
+    assert Schema([int, Optional(int)]).compile()([1])
+    assert not Schema([int, int]).compile()([1])
@@ -0,0 +1,120 @@
+import pytest
+
+ENC = ("op0", "op1", "CRn", "CRm", "op2")
+
+
+@pytest.fixture
+def templates(bincalc):
+    NameTemplates = bincalc("sysregs.templates").NameTemplates
+    return NameTemplates([
+        "DBGBCR<n>_EL1",
+        "S3_<op1>_<Cn>_<Cm>_<op2>",
+        "ICC_AP0R<n>_EL1, ICV_AP0R<n>_EL1",
+        "SCTLR_EL1",
+    ])
+
+
+@pytest.fixture(scope="module")
+def sysreg_db(bincalc):
+    arm64_sysreg = bincalc("sysregs.arm64_sysreg")
+    NameTemplates = bincalc("sysregs.templates").NameTemplates
+
+    db = arm64_sysreg._load_sysreg_db()
+    templates = NameTemplates(db.keys())
+
+    return lambda name: arm64_sysreg._get_register(db, lambda: templates, name)
+
+
+def test_templates_match(templates):
+    assert len(templates) == 4
+
+    assert templates.match("DBGBCR5_EL1") == ("DBGBCR<n>_EL1", { "n": 5 })
+    assert templates.match("DBGBCR0_EL1") == ("DBGBCR<n>_EL1", { "n": 0 })
+    assert templates.match("S3_0_C15_C2_0") == \
+        ("S3_<op1>_<Cn>_<Cm>_<op2>", { "op1": 0, "Cn": 15, "Cm": 2, "op2": 0 })
+    assert templates.match("S3_1_11_C0_7") == \
+        ("S3_<op1>_<Cn>_<Cm>_<op2>", { "op1": 1, "Cn": 11, "Cm": 0, "op2": 7 })
+
+    # either of the instructions an entry names
+    key = "ICC_AP0R<n>_EL1, ICV_AP0R<n>_EL1"
+    assert templates.match("ICC_AP0R3_EL1") == (key, { "n": 3 })
+    assert templates.match("ICV_AP0R1_EL1") == (key, { "n": 1 })
+
+
+@pytest.mark.parametrize("name", [
+    "DBGBCR05_EL1", "DBGBCR_EL1", "DBGBCRx_EL1", "DBGBCR5_EL2",
+    "S3_0_CC1_C0_0", "S3_00_C1_C0_0", "SCTLR_EL1", "S3_0_C1_C0",
+])
+def test_templates_no_match(templates, name):
+    assert templates.match(name) is None
+
+
+def test_templates_empty(bincalc):
+    NameTemplates = bincalc("sysregs.templates").NameTemplates
+    assert NameTemplates(["SCTLR_EL1"]).match("SCTLR_EL1") is None
+
+
+@pytest.mark.parametrize("name, key, enc", [
+    ("DBGBCR5_EL1", "DBGBCR<n>_EL1", (2, 0, 0, 5, 5)),
+    ("DBGWCR15_EL1", "DBGWCR<n>_EL1", (2, 0, 0, 15, 7)),
+    ("PMEVCNTR30_EL0", "PMEVCNTR<n>_EL0", (3, 3, 14, 11, 6)),
+    ("PMEVTYPER9_EL0", "PMEVTYPER<n>_EL0", (3, 3, 14, 13, 1)),
+    ("S3_0_C15_C2_0", "S3_<op1>_<Cn>_<Cm>_<op2>", (3, 0, 15, 2, 0)),
+])
+def test_instance_encoding(sysreg_db, name, key, enc):
+    reg, binding, fields = sysreg_db(name)
+
+    assert reg["name"] == key
+    assert tuple(fields[k] for k in ENC) == enc
+
+
+def test_missing_encodings(bincalc):
+    arm64_sysreg = bincalc("sysregs.arm64_sysreg")
+    db = arm64_sysreg._load_sysreg_db()
+
+    def instances(enc):
+        # the encodings of the registers <n> gives
+        found = set()
+        for n in range(32):
+            fields = arm64_sysreg._instance_encoding(enc, { "n": n })
+            if fields is not None and all(isinstance(fields[k], int) for k in ENC):
+                found.add(tuple(fields[k] for k in ENC))
+        return found
+
+    taken = set()
+    for name in db.keys():
+        if db[name].get("enc") and "<op" not in name and "<C" not in name:
+            taken |= instances(db[name]["enc"])
+
+    for name, (sibling, fields) in arm64_sysreg._missing_enc.items():
+        assert not db[name].get("enc") and db[sibling]["enc"]
+
+        # every instance is a free encoding
+        found = instances(arm64_sysreg._encoding_of(db, db[name]))
+        assert len(found) > 1 and not found & taken
+
+
+@pytest.mark.parametrize("name", [
+    "S3_0_C1_C0_0", "S3_9_C99_C2_9", "S3_0_C16_C2_0",
+    "DBGBCR99_EL1", "DBGBCR16_EL1", "DBGBCR05_EL1", "PMEVCNTR31_EL0",
+])
+def test_no_such_instance(sysreg_db, name):
+    # names outside of the encoding get the suggestions
+    suggestions, binding, enc = sysreg_db(name)
+
+    assert isinstance(suggestions, list)
+    assert binding is None and enc is None
+
+
+def test_plain_register(sysreg_db):
+    reg, binding, enc = sysreg_db("SCTLR_EL1")
+
+    assert reg["name"] == "SCTLR_EL1"
+    assert binding == {} and enc is None
+
+
+def test_suggestions(sysreg_db):
+    suggestions, binding, enc = sysreg_db("SCTLR_EL4")
+
+    assert "SCTLR_EL1" in suggestions
+    assert binding is None and enc is None
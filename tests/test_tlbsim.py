@@ -0,0 +1,75 @@
+from collections import OrderedDict
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+
+def reference_lru(keys, sets, ways):
+    # one OrderedDict per set, the least recently used first
+    content = [OrderedDict() for _ in range(sets)]
+
+    hits = []
+    for key in keys:
+        s = content[key % sets]
+        hits.append(key in s)
+        s[key] = None
+        s.move_to_end(key)
+        if len(s) > ways:
+            s.popitem(last=False)
+
+    return hits, content
+
+
+@pytest.mark.parametrize("sets, ways", [(1, 1), (1, 4), (4, 2), (16, 4), (3, 12)])
+@pytest.mark.parametrize("span", [8, 64, 1000])
+def test_lru_hits(bincalc, sets, ways, span):
+    tlbsim = bincalc("addrtrans.tlbsim")
+
+    rng = np.random.default_rng(sets * 1000 + ways * 10 + span)
+    keys = rng.integers(0, span, 4000).astype(np.uint64)
+
+    hit, content = tlbsim.lru_hits(keys, sets, ways)
+    expect, ref = reference_lru(keys.tolist(), sets, ways)
+
+    assert hit.tolist() == expect
+
+    # the content left holds what the cache holds
+    left = [set() for _ in range(sets)]
+    for key in content.tolist():
+        left[key % sets].add(key)
+    assert left == [set(s) for s in ref]
+
+
+def test_lru_hits_runs(bincalc):
+    tlbsim = bincalc("addrtrans.tlbsim")
+
+    keys = np.array([1, 1, 2, 2, 2, 3, 1, 4, 1, 2], dtype=np.uint64)
+    hit, _ = tlbsim.lru_hits(keys, 1, 2)
+
+    assert hit.tolist() == [False, True, False, True, True,
+                            False, False, False, True, False]
+
+
+def test_lru_cache_chunks(bincalc):
+    tlbsim = bincalc("addrtrans.tlbsim")
+
+    rng = np.random.default_rng(5)
+    keys = rng.integers(0, 200, 3000).astype(np.uint64)
+
+    cache = tlbsim.LruCache("l1", 64, 4)
+    hit = np.concatenate([cache.access(chunk)
+                          for chunk in np.array_split(keys, 7)])
+
+    expect, _ = reference_lru(keys.tolist(), 16, 4)
+    assert hit.tolist() == expect
+    assert cache.lookups == len(keys)
+    assert cache.hits == sum(expect)
+
+
+def test_lru_cache_geometry(bincalc):
+    tlbsim = bincalc("addrtrans.tlbsim")
+    utils = bincalc("utils")
+
+    with pytest.raises(utils.BinCalcException):
+        tlbsim.LruCache("l1", 10, 4)
@@ -0,0 +1,146 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+
+@pytest.fixture
+def trace_of(bincalc, config):
+    VaTrace = bincalc("addrtrans.vatrace").VaTrace
+
+    def trace_of(preset, *chunks):
+        trace = VaTrace(config(preset))
+        for va in chunks:
+            trace.add(np.array(va, dtype=np.uint64))
+        return trace
+
+    return trace_of
+
+
+def test_pages(trace_of):
+    va = [0x1000, 0x1fff, 0x2000, 0x403000, 0x1000]
+    trace = trace_of("arm64_le_va48_4k", va[:2], va[2:])
+
+    assert trace.count == 5
+    assert trace.pages.tolist() == [0x1, 0x2, 0x403]
+
+
+def test_levels(trace_of):
+    va = [0x1000, 0x2000, 0x200000, 0x40000000, 1 << 39]
+    trace = trace_of("x86_64_LA48", va)
+
+    # (level, tables, entries, max entries of a table)
+    assert trace.level_stats() == [
+        (0, 1, 2, 2), (1, 2, 3, 2), (2, 3, 4, 2), (3, 4, 5, 2)
+    ]
+
+
+@pytest.mark.parametrize("preset, levels", [
+    ("arm64_le_va48_4k", [0, 1, 2, 3]),
+    ("arm64_le_va48_16k", [0, 1, 2, 3]),
+    ("arm64_le_va48_64k", [1, 2, 3]),
+    ("x86_64_LA57", [-1, 0, 1, 2, 3]),
+])
+def test_walk_levels(trace_of, preset, levels):
+    trace = trace_of(preset, [0x1000])
+    assert [x[0] for x in trace.level_stats()] == levels
+
+    # a single page, one table and entry at every level
+    assert {x[1:] for x in trace.level_stats()} == {(1, 1, 1)}
+
+
+def test_granules(trace_of):
+    # the first three 4K pages share a 16K and a 64K page; a leaf table
+    # maps 2M of 4K pages, 32M of 16K ones and 512M of 64K ones
+    trace = trace_of("arm64_le_va48_4k", [0x1000, 0x2000, 0x3000, 0x10000000])
+
+    assert trace.granule_stats() == [(12, 4, 2), (14, 2, 2), (16, 2, 1)]
+
+
+def test_chunks(trace_of):
+    rng = np.random.default_rng(1)
+    va = rng.integers(0, 1 << 40, 5000, dtype=np.uint64)
+
+    whole = trace_of("x86_64_LA48", va)
+    parts = trace_of("x86_64_LA48", *np.array_split(va, 9))
+
+    assert parts.count == whole.count
+    assert parts.pages.tolist() == whole.pages.tolist()
+    assert parts.granule_stats() == whole.granule_stats()
+
+
+@pytest.mark.parametrize("preset, va", [
+    ("arm64_le_va48_4k", 0x0001000000001000),
+    ("x86_64_LA48", 0x0000800000001000),
+])
+def test_non_canonical(bincalc, trace_of, preset, va):
+    utils = bincalc("utils")
+
+    with pytest.raises(utils.BinCalcException, match=f"{va:#x}"):
+        trace_of(preset, [0x1000, va])
+
+
+def test_arm64_upper_half(trace_of):
+    # the same page offsets in both halves, walked from different roots
+    trace = trace_of("arm64_le_va48_4k", [0x1000, 0xffff000000001000,
+                                          0xffff000000002000])
+
+    assert [x.tolist() for x in trace.halves()] == [[0x1], [0x1, 0x2]]
+    assert trace.level_stats() == [
+        (0, 2, 2, 1), (1, 2, 2, 1), (2, 2, 2, 1), (3, 2, 3, 2)
+    ]
+    assert trace.granule_stats() == [(12, 3, 2), (14, 2, 2), (16, 2, 2)]
+
+
+def test_x86_upper_half(trace_of):
+    # kernel VAs are in the upper entries of the same root
+    trace = trace_of("x86_64_LA48", [0x1000, 0xffff800000001000])
+
+    assert len(trace.halves()) == 1
+    assert trace.level_stats()[0] == (0, 1, 2, 2)
+
+
+@pytest.mark.parametrize("suffix", [".txt", ".bin", ".npy"])
+def test_stream_values(bincalc, config, tmp_path, suffix):
+    vector = bincalc("vector")
+    bincalc("state").global_state().config.update(config("x86_64_LA48"))
+
+    rng = np.random.default_rng(2)
+    va = rng.integers(0, 1 << 63, 1000, dtype=np.uint64)
+
+    path = tmp_path / f"trace{suffix}"
+    if suffix == ".txt":
+        path.write_text("\n".join(hex(x) if i % 2 else f"{x}, "
+                                  for i, x in enumerate(va.tolist())))
+    elif suffix == ".bin":
+        va.astype("<u8").tofile(path)
+    else:
+        np.save(path, va)
+
+    chunks = list(vector.stream_values(path, count=64))
+    assert max(len(x) for x in chunks) <= 64 * (2 if suffix == ".txt" else 1)
+    assert np.concatenate(chunks).tolist() == va.tolist()
+
+
+def test_stream_blanks(bincalc, tmp_path):
+    vector = bincalc("vector")
+
+    # blocks are cut at tabs and carriage returns too, not read whole
+    va = list(range(0x1000, 0x1000 + 300))
+    path = tmp_path / "trace.txt"
+    path.write_text("\t".join(map(str, va[:150])) + "\r\n" +
+                    "\r".join(map(hex, va[150:])))
+
+    chunks = list(vector.stream_values(path, count=4))
+    assert max(len(x) for x in chunks) < 20
+    assert np.concatenate(chunks).tolist() == va
+
+
+def test_stream_bad_text(bincalc, tmp_path):
+    utils = bincalc("utils")
+    vector = bincalc("vector")
+
+    path = tmp_path / "trace.txt"
+    path.write_text("0x1000 nope")
+
+    with pytest.raises(utils.BinCalcException, match="unable to load"):
+        list(vector.stream_values(path))
@@ -0,0 +1,178 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+BASE = 0x40000000
+PAGE = 0x1000
+
+# (table, type bits, page, block) entries of each arch
+KINDS = {
+    "arm64_le_va48_4k": (0b11, 0b11 | 1 << 10, 0b01 | 1 << 10),
+    "x86_64_LA48": (0x7, 0x1, 0x81),
+}
+
+
+def image(preset, tmp_path):
+    """
+        Tables at BASE of the 4 levels of a 4K granule scheme: 4 pages at
+        VA 0x80000000 and a 2M leaf at VA 0x80200000, the L1 entry of VA
+        0xc0000000 pointing outside of the image. The upper half of the
+        root maps the same table as its first entry
+    """
+
+    table, page, block = KINDS[preset]
+
+    img = np.zeros(4 * 512, dtype=np.uint64)
+    img[0] = BASE + PAGE | table
+    img[256] = BASE + PAGE | table
+    img[512 + 2] = BASE + 2 * PAGE | table
+    img[512 + 3] = 0x7f000000 | table
+    img[1024] = BASE + 3 * PAGE | table
+    img[1024 + 1] = 0xa0000000 | block
+    for i in range(4):
+        img[1536 + i] = 0x90000000 + i * PAGE | page
+
+    path = tmp_path / "pt.bin"
+    img.astype("<u8").tofile(path)
+    return path
+
+
+@pytest.fixture
+def walker_of(bincalc, config, tmp_path):
+    w = bincalc("addrtrans.walker")
+    addrtrans = bincalc("addrtrans")
+
+    def walker_of(preset, root1=None):
+        c = config(preset)
+        img = w.PhysImage(image(preset, tmp_path), BASE, c)
+        return w.Walker(img, BASE, c, lambda l: addrtrans.pte_decoder(l, c), root1)
+
+    return walker_of
+
+
+@pytest.fixture(params=list(KINDS))
+def walker(request, walker_of):
+    return walker_of(request.param)
+
+
+MAPPED = {
+    0x80000000: 0x90000000,
+    0x80003fff: 0x90003fff,
+    0x80001234: 0x90001234,
+    0x80200000: 0xa0000000,
+    0x803fffff: 0xa01fffff,
+}
+
+UNMAPPED = [0, 0x80004000, 0x80400000, 0xc0000000, 1 << 40]
+
+
+def test_translate(walker):
+    assert walker.levels == [0, 1, 2, 3]
+
+    for va, pa in MAPPED.items():
+        tr = walker.translate(va)
+        assert tr.fault is None
+        assert tr.pa == pa
+
+    tr = walker.translate(0x80001234)
+    assert [st.level for st in tr.steps] == [3]
+    assert tr.cached
+
+    for va in UNMAPPED:
+        tr = walker.translate(va)
+        assert tr.pa is None and tr.fault
+
+    assert "outside of image" in walker.translate(0xc0000000).fault
+
+
+def test_translate_many(bincalc, walker):
+    w = bincalc("addrtrans.walker")
+
+    va = list(MAPPED) + UNMAPPED
+    tr = walker.translate_many(np.array(va, dtype=np.uint64))
+
+    assert tr.pa.tolist() == list(MAPPED.values()) + [w.FAULT_PA] * len(UNMAPPED)
+    assert tr.fault.tolist() == [False] * len(MAPPED) + [True] * len(UNMAPPED)
+    assert tr.level.tolist() == [3, 3, 3, 2, 2] + [w.FAULT_LEVEL] * len(UNMAPPED)
+
+    # the leaf entries themselves
+    leaf = walker.translate(0x80001234).steps[-1].raw
+    assert int(tr.pte[2]) == leaf
+
+
+@pytest.mark.parametrize("preset, upper", [
+    # the upper half entries of the x86 root map kernel VAs, those of
+    # arm64 the top of the lower half
+    ("x86_64_LA48", 0xffff800000000000),
+    ("arm64_le_va48_4k", 0x800000000000),
+])
+def test_mappings(walker_of, preset, upper):
+    walker = walker_of(preset)
+    ranges = [(r.va, r.pa, r.size, r.level) for r in walker.mappings()]
+
+    # the pages are adjacent, the 2M leaf is of another level
+    assert ranges == [
+        (0x80000000, 0x90000000, 4 * PAGE, 3),
+        (0x80200000, 0xa0000000, 2 << 20, 2),
+        (upper + 0x80000000, 0x90000000, 4 * PAGE, 3),
+        (upper + 0x80200000, 0xa0000000, 2 << 20, 2),
+    ]
+
+
+def test_mappings_ttbr1(walker_of):
+    walker = walker_of("arm64_le_va48_4k", root1=BASE)
+    ranges = [(r.va, r.pa) for r in walker.mappings()]
+
+    assert ranges[4:] == [
+        (0xffff000080000000, 0x90000000),
+        (0xffff000080200000, 0xa0000000),
+        (0xffff800080000000, 0x90000000),
+        (0xffff800080200000, 0xa0000000),
+    ]
+
+
+def test_x86_upper_half(walker_of):
+    walker = walker_of("x86_64_LA48")
+
+    assert walker.translate(0xffff800080001234).pa == 0x90001234
+
+    # bit 47 without the bits above it
+    tr = walker.translate(0x800080001234)
+    assert tr.pa is None and "non-canonical" in tr.fault
+
+    tr = walker.translate_many(np.array([0xffff800080001234, 0x800080001234,
+                                         0x80001234], dtype=np.uint64))
+    assert tr.fault.tolist() == [False, True, False]
+    assert tr.pa.tolist()[::2] == [0x90001234, 0x90001234]
+
+
+def test_arm64_upper_half(bincalc, walker_of):
+    FAULT_PA = bincalc("addrtrans.walker").FAULT_PA
+    va = [0xffff000080001234, 0x80001234, 0x0001000080001234]
+
+    # without TTBR1, kernel VAs are not walked as user ones
+    walker = walker_of("arm64_le_va48_4k")
+    assert "TTBR1" in walker.translate(va[0]).fault
+    assert "non-canonical" in walker.translate(va[2]).fault
+
+    tr = walker.translate_many(np.array(va, dtype=np.uint64))
+    assert tr.pa.tolist() == [FAULT_PA, 0x90001234, FAULT_PA]
+
+    # through TTBR1, once walked and once from the walk cache
+    walker = walker_of("arm64_le_va48_4k", root1=BASE)
+    for _ in range(2):
+        assert walker.translate(va[0]).pa == 0x90001234
+
+        tr = walker.translate_many(np.array(va, dtype=np.uint64))
+        assert tr.pa.tolist() == [0x90001234, 0x90001234, FAULT_PA]
+
+
+def test_size_str(bincalc):
+    size_str = bincalc("addrtrans.walker").size_str
+
+    assert size_str(4096) == "4K"
+    assert size_str(2 << 20) == "2M"
+    assert size_str(1 << 30) == "1G"
+    assert size_str(4100) == "4K+4"
+    assert size_str(1050636 << 10) == "1G+2M+12K"
+    assert size_str(0) == "0"